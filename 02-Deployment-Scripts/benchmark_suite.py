@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite - Reproducible timings for the log-processing hot paths
+Runs each benchmark against a synthetic_cowrie.py dataset (or a real log)
+and writes a JSON report, so runs on different commits and machines can be
+compared with --compare. Benchmarks whose optional dependencies (scapy,
+folium) are not installed are reported as skipped.
+
+Usage:
+    python3 benchmark_suite.py --events 1000000 --json bench.json
+    python3 benchmark_suite.py --data cowrie.json --only parse_json --only analyze_all_logs
+    python3 benchmark_suite.py --json new.json --compare bench.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+import synthetic_cowrie
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AWS_DIR = os.path.join(HERE, "..", "04-AWS-Infrastructure")
+SUITE_VERSION = 1
+DEFAULT_EVENTS = 1000000
+DEFAULT_SAMPLE = 200000
+REGRESSION_THRESHOLD = 0.10
+
+BENCHMARKS = {}
+
+
+class Skip(Exception):
+    """Raised by a benchmark's setup when it can't run here (missing optional dependency)"""
+
+
+def benchmark(name, unit="events"):
+    """
+    Register setup(dataset) -> run, where run() does the timed work and
+    returns the number of units processed. Imports and input preparation
+    belong in setup so they stay out of the timings.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, unit)
+        return setup
+    return register
+
+
+class Dataset:
+    """The log under test plus an in-memory sample of its first events"""
+
+    def __init__(self, path, sample_size, generated=None):
+        self.path = path
+        self.sample_size = sample_size
+        self.generated = generated
+        self._sample = None
+
+    @property
+    def sample(self):
+        if self._sample is None:
+            self._sample = []
+            with open(self.path, "rb") as f:
+                for line in f:
+                    self._sample.append(json.loads(line))
+                    if len(self._sample) >= self.sample_size:
+                        break
+        return self._sample
+
+    def describe(self):
+        info = {"path": os.path.abspath(self.path), "bytes": os.path.getsize(self.path)}
+        if self.generated:
+            info["synthetic"] = self.generated
+        return info
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Hide the progress output of the scripts under test"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _optional(module):
+    try:
+        return __import__(module)
+    except ImportError as e:
+        raise Skip(f"requires {e.name}")
+
+
+@benchmark("parse_json")
+def bench_parse_json(data):
+    def run():
+        loads = json.loads
+        count = 0
+        with open(data.path, "rb") as f:
+            for line in f:
+                loads(line)
+                count += 1
+        return count
+    return run
+
+
+@benchmark("parse_event_records")
+def bench_parse_event_records(data):
+    from event_records import iter_events
+    return lambda: sum(1 for _ in iter_events([data.path]))
+
+
+@benchmark("scan_prefiltered", unit="matches")
+def bench_scan_prefiltered(data):
+    from log_scan import Predicate, scan
+    # bytes are searched, only the few matching lines are decoded
+    predicate = Predicate(eventids=["cowrie.session.file_download"])
+    return lambda: sum(1 for _ in scan([data.path], predicate))
+
+
+@benchmark("analyze_all_logs")
+def bench_analyze_all_logs(data):
+    from final_project_stats import FinalStatsGenerator
+    with _quiet():
+        generator = FinalStatsGenerator()
+
+    def run():
+        with _quiet():
+            return generator.analyze_all_logs([data.path])["total_events"]
+    return run
+
+
+@benchmark("classify_command", unit="commands")
+def bench_classify_command(data):
+    # The handler module reads its settings at import; nothing is sent anywhere
+    os.environ.setdefault("DISCORD_WEBHOOK", "https://discord.invalid/benchmark")
+    os.environ.setdefault("S3_BUCKET", "benchmark")
+    if AWS_DIR not in sys.path:
+        sys.path.insert(0, AWS_DIR)
+    _optional("requests")
+    from lambda_enrichment_handler import classify_command
+    commands = [e["input"] for e in data.sample if "input" in e]
+
+    def run():
+        for command in commands:
+            classify_command(command)
+        return len(commands)
+    return run
+
+
+@benchmark("json_to_pcap")
+def bench_json_to_pcap(data):
+    _optional("scapy")
+    from logs2pcap import json_to_pcap, PCAP_EVENTIDS
+    from log_scan import Predicate, scan
+    events = sum(1 for _ in scan([data.path], Predicate(eventids=PCAP_EVENTIDS)))
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp, _quiet():
+            json_to_pcap(data.path, os.path.join(tmp, "bench.pcap"))
+        return events
+    return run
+
+
+@benchmark("telemetry_enrich_event")
+def bench_telemetry_enrich_event(data):
+    from telemetry_enrichment import TelemetryEnricher
+    sample = data.sample
+
+    def run():
+        enricher = TelemetryEnricher()
+        for event in sample:
+            enricher.enrich_event(event)
+        return len(sample)
+    return run
+
+
+@benchmark("heatmap_aggregation")
+def bench_heatmap_aggregation(data):
+    _optional("folium")
+    import generate_repo_heatmap
+    generate_repo_heatmap.LOG_FILE = data.path
+
+    def run():
+        ip_counts = generate_repo_heatmap.count_attacker_ips(generate_repo_heatmap.iter_log_events())
+        return sum(ip_counts.values())
+    return run
+
+
+def run_benchmark(name, data, repeat):
+    setup, unit = BENCHMARKS[name]
+    try:
+        run = setup(data)
+    except Skip as e:
+        return {"status": "skipped", "reason": str(e)}
+    runs = []
+    units = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        units = run()
+        runs.append(time.perf_counter() - started)
+    median = statistics.median(runs)
+    return {
+        "status": "ok",
+        "unit": unit,
+        "units": units,
+        "runs_s": [round(r, 4) for r in runs],
+        "best_s": round(min(runs), 4),
+        "median_s": round(median, 4),
+        "per_second": round(units / median, 1) if median else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def default_data_path(events, seed):
+    return os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "bench",
+                        f"synthetic-{events}-seed{seed}.json")
+
+
+def prepare_dataset(args):
+    if args.data:
+        return Dataset(args.data, args.sample)
+    path = default_data_path(args.events, args.seed)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f"Generating {args.events:,} synthetic events -> {path}", file=sys.stderr)
+        synthetic_cowrie.generate_file(path + ".tmp", args.events, seed=args.seed)
+        os.replace(path + ".tmp", path)
+    return Dataset(path, args.sample, generated={"events": args.events, "seed": args.seed})
+
+
+def compare(report, baseline, threshold):
+    """Print median changes against a baseline report; returns names that got slower"""
+    regressions = []
+    print(f"\n{'Benchmark':<24} {'baseline s':>11} {'now s':>11} {'change':>9}")
+    print("-" * 58)
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name, {})
+        if result.get("status") != "ok" or before.get("status") != "ok":
+            continue
+        change = result["median_s"] / before["median_s"] - 1 if before["median_s"] else 0.0
+        flag = "  SLOWER" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<24} {before['median_s']:>11} {result['median_s']:>11} {change:>+8.1%}{flag}")
+    if baseline.get("dataset", {}).get("bytes") != report["dataset"]["bytes"]:
+        print("Note: baseline was measured on a different dataset")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Cowrie log-processing hot paths')
+    parser.add_argument('--events', type=int, default=DEFAULT_EVENTS,
+                        help=f'Synthetic dataset size (default: {DEFAULT_EVENTS:,}; cached in ~/.cache/patriotpot/bench)')
+    parser.add_argument('--seed', type=int, default=1, help='Synthetic dataset seed (default: 1)')
+    parser.add_argument('--data', help='Benchmark this Cowrie JSON log instead of synthetic data')
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE,
+                        help=f'Events held in memory for per-event benchmarks (default: {DEFAULT_SAMPLE:,})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the median is reported (default: 3)')
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='Run only this benchmark (repeatable)')
+    parser.add_argument('--json', dest='json_out', help='Write the report as JSON to this file')
+    parser.add_argument('--compare', help='Baseline report to compare against; exits 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f'Median slowdown counted as a regression (default: {REGRESSION_THRESHOLD})')
+    args = parser.parse_args()
+
+    data = prepare_dataset(args)
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "dataset": data.describe(),
+        "config": {"repeat": args.repeat, "sample": args.sample},
+        "results": {},
+    }
+
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...", file=sys.stderr)
+        report["results"][name] = run_benchmark(name, data, args.repeat)
+
+    print(f"\n{'Benchmark':<24} {'median s':>10} {'best s':>10} {'units':>12} {'per second':>14}")
+    print("-" * 74)
+    for name, row in report["results"].items():
+        if row["status"] != "ok":
+            print(f"{name:<24} {'skipped: ' + row['reason']}")
+            continue
+        print(f"{name:<24} {row['median_s']:>10} {row['best_s']:>10} {row['units']:>12,} "
+              f"{row['per_second']:>12,.0f}/s")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Campaign Clusters - Group sessions running near-identical command scripts
+Botnets replay the same script from thousands of IPs with small changes
+(payload host, password, file names). Each session's commands are
+normalized (URLs, IPs, numbers and key/base64 blobs become placeholders) and
+cut into word 3-gram shingles; sessions with the same normalized script
+share one entry. Each distinct script gets a 128-value MinHash signature
+(computed in numpy batches), and LSH banding finds candidate pairs without
+comparing every script to every other; pairs whose estimated Jaccard
+similarity reaches the threshold are joined into a campaign (union-find).
+
+State (scripts, signatures, campaign links, log offsets and sessions still
+open) is kept in a directory, so each run only reads new log data and only
+signs and links new scripts.
+
+Usage:
+    python3 campaign_clusters.py ingest /opt/cowrie/var/log/cowrie/
+    python3 campaign_clusters.py report --top 20
+    python3 campaign_clusters.py report --log /opt/cowrie/var/log/cowrie/ --json > campaigns.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import hashlib
+import argparse
+from functools import lru_cache
+from itertools import chain
+from collections import defaultdict
+
+import numpy as np
+
+from log_scan import open_log
+from log_time_index import log_files
+from honeypot_sql import DEFAULT_LOG_DIR, _epoch
+from stream_sketches import HyperLogLog
+import pipeline_profile
+
+STATE_VERSION = 1
+NUM_PERM = 128
+SHINGLE = 3
+THRESHOLD = 0.6
+MINHASH_SEED = 0x5eed
+BATCH_SHINGLES = 1 << 15   # shingles hashed per numpy batch (128 x 32k x 8 bytes = 32 MB)
+PAIR_BATCH = 1 << 16
+MAX_COMMANDS = 200         # per session; interactive sessions can run on for hours
+EXAMPLE_COMMANDS = 30      # commands kept to show a script
+SESSION_TIMEOUT = 3600     # seconds of event time before a session without a close event is counted
+SMALL_SET = 64             # source IPs counted exactly up to this many per script, then by HyperLogLog
+HLL_P = 12
+
+_URL_RE = re.compile(r'\b(?:https?|ftp|tftp)://[^\s;|&\'"`]+', re.I)
+_IP_RE = re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b')
+_BLOB_RE = re.compile(r'(?=[A-Za-z0-9+/=]*\d)[A-Za-z0-9+/=]{24,}')
+_NUM_RE = re.compile(r'\b\d+\b')
+_SEP_RE = re.compile(r'\s*(&&|\|\||[;|&])\s*')
+
+
+def default_state_path():
+    return os.getenv("PATRIOTPOT_CAMPAIGNS", os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "campaigns"))
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize(command):
+    """Command -> tokens, with the parts bots vary per run replaced by placeholders"""
+    command = _URL_RE.sub(' URL ', command)
+    command = _IP_RE.sub(' IP ', command)
+    command = _BLOB_RE.sub(' BLOB ', command)
+    command = _NUM_RE.sub('N', command)
+    return tuple(_SEP_RE.sub(r' \1 ', command).split())
+
+
+def script_tokens(commands):
+    """Normalized tokens of a whole session, commands separated by ';'"""
+    tokens = []
+    for command in commands:
+        words = normalize(command)
+        if words:
+            if tokens:
+                tokens.append(';')
+            tokens.extend(words)
+    return tokens
+
+
+def shingles(tokens, k=SHINGLE):
+    """Set of 32-bit hashes (CRC-32; the MinHash permutations do the mixing) of the word k-grams of tokens"""
+    if len(tokens) <= k:
+        return {zlib.crc32(' '.join(tokens).encode('utf-8', 'surrogatepass'))}
+    return {zlib.crc32(' '.join(tokens[i:i + k]).encode('utf-8', 'surrogatepass')) for i in range(len(tokens) - k + 1)}
+
+
+def lsh_rows(num_perm, threshold):
+    """
+    Rows per LSH band: the most that still make a pair at the threshold a
+    candidate with 95% probability (more rows, fewer false candidates)
+    """
+    best = 1
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows == 0 and 1 - (1 - threshold ** rows) ** (num_perm // rows) >= 0.95:
+            best = rows
+    return best
+
+
+class IpCount:
+    """Distinct source IPs: exact up to SMALL_SET, then a HyperLogLog"""
+    __slots__ = ('ips', 'hll')
+
+    def __init__(self):
+        self.ips = set()
+        self.hll = None
+
+    def add(self, ip):
+        if self.hll is not None:
+            self.hll.add(ip)
+            return
+        self.ips.add(ip)
+        if len(self.ips) > SMALL_SET:
+            self._upgrade()
+
+    def _upgrade(self):
+        self.hll = HyperLogLog(HLL_P)
+        for ip in self.ips:
+            self.hll.add(ip)
+        self.ips = None
+
+    def update(self, other):
+        if other.hll is None:
+            for ip in other.ips:
+                self.add(ip)
+            return
+        if self.hll is None:
+            self._upgrade()
+        self.hll.merge(other.hll)
+
+    def __len__(self):
+        return len(self.hll) if self.hll is not None else len(self.ips)
+
+    def to_json(self):
+        return self.hll.to_dict() if self.hll is not None else sorted(self.ips)
+
+    @classmethod
+    def from_json(cls, data):
+        count = cls()
+        if isinstance(data, dict):
+            count.hll, count.ips = HyperLogLog.from_dict(data), None
+        else:
+            count.ips = set(data)
+        return count
+
+
+class Script:
+    """One distinct normalized command script and the sessions that ran it"""
+    __slots__ = ('key', 'sessions', 'first', 'last', 'ips', 'commands')
+
+    def __init__(self, key, commands):
+        self.key = key
+        self.sessions = 0
+        self.first = self.last = None
+        self.ips = IpCount()
+        self.commands = [c[:200] for c in commands[:EXAMPLE_COMMANDS]]
+
+    def add(self, src_ip, first, last):
+        self.sessions += 1
+        if src_ip:
+            self.ips.add(src_ip)
+        if first is not None and (self.first is None or first < self.first):
+            self.first = first
+        if last is not None and (self.last is None or last > self.last):
+            self.last = last
+
+    def to_json(self):
+        return [self.key, self.sessions, self.first, self.last, self.ips.to_json(), self.commands]
+
+    @classmethod
+    def from_json(cls, row):
+        script = cls(row[0], row[5])
+        script.sessions, script.first, script.last = row[1], row[2], row[3]
+        script.ips = IpCount.from_json(row[4])
+        return script
+
+
+class CampaignIndex:
+    """Distinct scripts with MinHash signatures, linked into campaigns"""
+
+    def __init__(self, path=None, num_perm=NUM_PERM, shingle=SHINGLE, threshold=THRESHOLD):
+        self.path = path
+        self.num_perm, self.shingle, self.threshold = num_perm, shingle, threshold
+        self.scripts = []
+        self.by_key = {}
+        self.signatures = np.empty((0, num_perm), np.uint32)
+        self.parent = np.empty(0, np.int64)
+        self.sources = {}   # first-line digest -> [path, offset]
+        self.pending = {}   # session -> [src_ip, first_ts, last_ts, [commands]]
+        self.newest = None
+        self._tokens = {}   # script id -> tokens, until it is signed
+        if path:
+            self._load()
+        rng = np.random.default_rng(MINHASH_SEED)
+        self._a = (rng.integers(0, 1 << 63, (self.num_perm, 1), dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, (self.num_perm, 1), dtype=np.uint64)
+        self.rows = lsh_rows(self.num_perm, self.threshold)
+        self._band_mult = rng.integers(0, 1 << 63, self.rows, dtype=np.uint64) | np.uint64(1)
+
+    # -- state --------------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        try:
+            with open(self._file('campaigns.json')) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get('version') != STATE_VERSION:
+            return
+        self.num_perm, self.shingle, self.threshold = data['num_perm'], data['shingle'], data['threshold']
+        self.scripts = [Script.from_json(row) for row in data['scripts']]
+        self.by_key = {script.key: i for i, script in enumerate(self.scripts)}
+        self.sources, self.pending, self.newest = data['sources'], data['pending'], data['newest']
+        signatures = np.load(self._file('signatures.npy'))
+        parent = np.load(self._file('parent.npy'))
+        if len(signatures) != len(self.scripts) or len(parent) != len(self.scripts):
+            raise ValueError(f"{self.path}: campaign state is inconsistent; delete it and ingest again")
+        self.signatures, self.parent = signatures, parent
+
+    def save(self):
+        self.cluster()
+        os.makedirs(self.path, exist_ok=True)
+        for name, array in (('signatures.npy', self.signatures), ('parent.npy', self.parent)):
+            with open(self._file(name + '.tmp'), 'wb') as f:
+                np.save(f, array)
+        with open(self._file('campaigns.json.tmp'), 'w') as f:
+            json.dump({'version': STATE_VERSION, 'num_perm': self.num_perm, 'shingle': self.shingle,
+                       'threshold': self.threshold, 'sources': self.sources, 'pending': self.pending,
+                       'newest': self.newest, 'scripts': [script.to_json() for script in self.scripts]}, f)
+        for name in ('signatures.npy', 'parent.npy', 'campaigns.json'):
+            os.replace(self._file(name + '.tmp'), self._file(name))
+
+    # -- sessions -----------------------------------------------------------
+
+    def add_session(self, commands, src_ip=None, first=None, last=None):
+        """Count one session's commands; returns its script id (None for no commands)"""
+        tokens = script_tokens(commands)
+        if not tokens:
+            return None
+        key = hashlib.blake2b('\x1f'.join(tokens).encode('utf-8', 'surrogatepass'), digest_size=12).hexdigest()
+        sid = self.by_key.get(key)
+        if sid is None:
+            sid = self.by_key[key] = len(self.scripts)
+            self.scripts.append(Script(key, commands))
+            self._tokens[sid] = tokens
+        self.scripts[sid].add(src_ip, first, last)
+        return sid
+
+    def add_event(self, event):
+        eventid = event.get('eventid')
+        session = event.get('session')
+        ts = _epoch(event.get('timestamp'))
+        if ts is not None and (self.newest is None or ts > self.newest):
+            self.newest = ts
+        if eventid == 'cowrie.command.input' and event.get('input'):
+            entry = self.pending.get(session)
+            if entry is None:
+                entry = self.pending[session] = [event.get('src_ip'), ts, ts, []]
+            if len(entry[3]) < MAX_COMMANDS:
+                entry[3].append(event['input'])
+            entry[2] = ts if ts is not None else entry[2]
+        elif eventid == 'cowrie.session.closed':
+            entry = self.pending.pop(session, None)
+            if entry:
+                self.add_session(entry[3], entry[0], entry[1], entry[2])
+
+    def expire(self, timeout=SESSION_TIMEOUT):
+        """Count sessions that went quiet without a close event (lost or rotated logs)"""
+        if self.newest is None:
+            return
+        stale = [s for s, entry in self.pending.items() if entry[2] is None or entry[2] < self.newest - timeout]
+        for session in stale:
+            entry = self.pending.pop(session)
+            self.add_session(entry[3], entry[0], entry[1], entry[2])
+
+    def ingest_file(self, path):
+        """Read the unread part of one log; returns the number of events used"""
+        with open_log(path) as f:
+            first = f.readline()
+            if not first.endswith(b'\n'):
+                return 0
+            digest = hashlib.sha1(first).hexdigest()
+            offset = start = self.sources.get(digest, [path, 0])[1]
+            f.seek(offset)
+            used = 0
+            loads = pipeline_profile.wrap("decode", json.loads)
+            add = pipeline_profile.wrap("aggregate", self.add_event)
+            for line in pipeline_profile.wrap_iter("read", f):
+                if not line.endswith(b'\n'):
+                    break  # partial line still being written
+                offset += len(line)
+                if b'cowrie.command.input' not in line and b'cowrie.session.closed' not in line:
+                    continue
+                try:
+                    event = loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict):
+                    add(event)
+                    used += 1
+            self.sources[digest] = [path, offset]
+        pipeline_profile.count(events=used, bytes=offset - start)
+        return used
+
+    def ingest(self, paths=None, verbose=False):
+        """Incrementally read Cowrie logs (files or log directories); returns events used"""
+        total = 0
+        for path in log_files(paths or [DEFAULT_LOG_DIR]):
+            try:
+                count = self.ingest_file(path)
+            except OSError as e:
+                print(f"Warning: could not read {path}: {e}", file=sys.stderr)
+                continue
+            total += count
+            if verbose and count:
+                print(f"{path}: {count:,} command/close events")
+        self.expire()
+        return total
+
+    # -- clustering ---------------------------------------------------------
+
+    def minhash(self, shingle_sets):
+        """(len(shingle_sets), num_perm) uint32 signatures, hashed in numpy batches"""
+        out = np.empty((len(shingle_sets), self.num_perm), np.uint32)
+        i = 0
+        while i < len(shingle_sets):
+            j, total = i, 0
+            while j < len(shingle_sets) and (j == i or total + len(shingle_sets[j]) <= BATCH_SHINGLES):
+                total += len(shingle_sets[j])
+                j += 1
+            batch = shingle_sets[i:j]
+            hashes = np.fromiter(chain.from_iterable(batch), np.uint64, total)
+            starts = np.cumsum([0] + [len(s) for s in batch[:-1]])
+            # multiply-shift hashing: one (a * x + b) >> 32 per permutation
+            values = (self._a * hashes + self._b) >> np.uint64(32)
+            out[i:j] = np.minimum.reduceat(values, starts, axis=1).T
+            i = j
+        return out
+
+    def _find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def cluster(self):
+        """Sign the scripts added since the last call and link them into campaigns"""
+        start = len(self.signatures)
+        n = len(self.scripts)
+        if start == n:
+            return 0
+        sets = [shingles(self._tokens.pop(sid), self.shingle) for sid in range(start, n)]
+        self.signatures = np.vstack([self.signatures, self.minhash(sets)])
+        self.parent = np.concatenate([self.parent, np.arange(start, n, dtype=np.int64)])
+
+        # LSH: within each band, scripts with equal band values share a bucket.
+        # Sorting by bucket puts old scripts ahead of new ones (stable sort by
+        # id); each new script is compared with the first and the previous
+        # script of its bucket, so old-old pairs are never looked at again.
+        pairs = []
+        ids = np.arange(n)
+        for band in range(self.num_perm // self.rows):
+            values = self.signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys = (values * self._band_mult).sum(axis=1)
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            run_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+            first = order[np.maximum.accumulate(np.where(run_start, ids, 0))]
+            previous = np.r_[order[:1], order[:-1]]
+            new = ~run_start & (order >= start)
+            pairs.append(np.stack([order[new], first[new]], axis=1))
+            pairs.append(np.stack([order[new], previous[new]], axis=1))
+        pairs = np.concatenate(pairs)
+        codes = np.unique(pairs.min(axis=1) * n + pairs.max(axis=1))
+        pairs = np.stack([codes // n, codes % n], axis=1)
+
+        linked = 0
+        for i in range(0, len(pairs), PAIR_BATCH):
+            chunk = pairs[i:i + PAIR_BATCH]
+            same = (self.signatures[chunk[:, 0]] == self.signatures[chunk[:, 1]]).sum(axis=1)
+            for a, b in chunk[same >= self.threshold * self.num_perm]:
+                ra, rb = self._find(a), self._find(b)
+                if ra != rb:
+                    # the older script names the campaign, so ids stay stable across runs
+                    self.parent[max(ra, rb)] = min(ra, rb)
+                    linked += 1
+        return linked
+
+    def roots(self):
+        """Campaign id (its oldest script) of every script"""
+        self.cluster()
+        parent = self.parent
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        self.parent = parent
+        return parent
+
+    def campaigns(self, min_sessions=1):
+        """Campaign dicts, largest first"""
+        from behavioral_analytics import BehavioralAnalytics
+
+        members = defaultdict(list)
+        for sid, root in enumerate(self.roots().tolist()):
+            members[root].append(sid)
+        analytics = BehavioralAnalytics()
+        results = []
+        for root, sids in members.items():
+            scripts = [self.scripts[sid] for sid in sids]
+            sessions = sum(s.sessions for s in scripts)
+            if sessions < min_sessions:
+                continue
+            ips = IpCount()
+            for script in scripts:
+                ips.update(script.ips)
+            representative = max(scripts, key=lambda s: s.sessions)
+            firsts = [s.first for s in scripts if s.first is not None]
+            lasts = [s.last for s in scripts if s.last is not None]
+            results.append({
+                'campaign': f"c{root}", 'sessions': sessions, 'variants': len(scripts), 'src_ips': len(ips),
+                'first_seen': min(firsts, default=None), 'last_seen': max(lasts, default=None),
+                'threat_level': analytics.analyze_session(representative.commands)['threat_level'],
+                'script': representative.commands,
+            })
+        results.sort(key=lambda c: (-c['sessions'], c['campaign']))
+        return results
+
+
+def _iso(ts):
+    return time.strftime('%Y-%m-%d %H:%M', time.gmtime(ts)) if ts is not None else '-'
+
+
+def print_report(campaigns, top, script_lines=3):
+    sessions = sum(c['sessions'] for c in campaigns)
+    print(f"{len(campaigns):,} campaigns, {sessions:,} sessions with commands\n")
+    for c in campaigns[:top]:
+        print(f"{c['campaign']}: {c['sessions']:,} sessions, {c['src_ips']:,} IPs, {c['variants']:,} variants, "
+              f"{_iso(c['first_seen'])} .. {_iso(c['last_seen'])}, threat {c['threat_level']}")
+        for command in c['script'][:script_lines]:
+            print(f"    $ {command[:120]}")
+        if len(c['script']) > script_lines:
+            print(f"    ... {len(c['script']) - script_lines} more commands")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cluster sessions into attack campaigns by command-script similarity')
+    parser.add_argument('--state', default=None, help=f'State directory (default: $PATRIOTPOT_CAMPAIGNS or {default_state_path()})')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Jaccard similarity that joins two scripts, for a new state (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help='Read new sessions from Cowrie logs')
+    p.add_argument('paths', nargs='*', help=f'Log files or directories (default: {DEFAULT_LOG_DIR})')
+
+    p = sub.add_parser('report', help='List campaigns, largest first')
+    p.add_argument('--log', nargs='*', metavar='PATH', help='Ingest these logs first (default log dir if no paths)')
+    p.add_argument('--top', type=int, default=20, help='Campaigns to print (default: %(default)s)')
+    p.add_argument('--min-sessions', type=int, default=2, help='Hide smaller campaigns (default: %(default)s)')
+    p.add_argument('--json', action='store_true', help='Print every campaign as JSON instead')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "campaign_clusters"):
+        index = CampaignIndex(args.state or default_state_path(), threshold=args.threshold)
+        started = time.time()
+        if args.command == 'ingest' or args.log is not None:
+            count = index.ingest(args.paths if args.command == 'ingest' else args.log, verbose=args.command == 'ingest')
+            before = len(index.signatures)
+            linked = index.cluster()
+            index.save()
+            print(f"Read {count:,} events: {len(index.scripts) - before:,} new scripts "
+                  f"({len(index.scripts):,} total), {linked:,} new links, "
+                  f"{len(index.pending):,} sessions still open, {time.time() - started:.1f}s", file=sys.stderr)
+        if args.command == 'report':
+            campaigns = index.campaigns(args.min_sessions)
+            if args.json:
+                print(json.dumps(campaigns, indent=2))
+            else:
+                print_report(campaigns, args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,16 @@
 import pandas as pd
-import json
 import matplotlib.pyplot as plt
+from event_records import EventColumns
 
 # --- CONFIGURATION ---
 log_file = 'cowrie.json' 
 split_date = '2025-10-15'
 # ---------------------
 
-data = []
-with open(log_file, 'r') as f:
-    for line in f:
-        try:
-            data.append(json.loads(line))
-        except:
-            continue
-
-df = pd.DataFrame(data)
-df['timestamp'] = pd.to_datetime(df['timestamp'])
+# Compact columns (interned strings, epoch timestamps) instead of a list of
+# dicts, so the full history fits in memory on the honeypot instance
+events = EventColumns.from_logs([log_file])
+df = events.to_dataframe(['eventid', 'src_ip', 'session'])
 
 before_df = df[df['timestamp'] < split_date]
 after_df = df[df['timestamp'] >= split_date]
@@ -5,12 +5,18 @@ echo "🗺️ DEPLOYING SHODAN HEATMAP GENERATOR..."
 
 # Install dependencies
 echo "📦 Installing dependencies..."
-sudo pip3 install folium requests
+sudo pip3 install folium requests numpy
 
 # Deploy script
 echo "📁 Deploying heatmap generator..."
-sudo cp shodan_heatmap_generator.py /opt/cowrie/
-sudo chown cowrie:cowrie /opt/cowrie/shodan_heatmap_generator.py
+# The generator plus every local module it imports (directly or transitively)
+HEATMAP_FILES=(shodan_heatmap_generator.py geo_grid.py heatmap_image.py world_land.png
+    threat_intel.py pipeline_telemetry.py pipeline_profile.py secrets_loader.py
+    log_time_index.py log_scan.py)
+sudo cp "${HEATMAP_FILES[@]}" /opt/cowrie/
+for f in "${HEATMAP_FILES[@]}"; do
+    sudo chown cowrie:cowrie "/opt/cowrie/$f"
+done
 sudo chmod +x /opt/cowrie/shodan_heatmap_generator.py
 
 # Create cron job for midnight execution
@@ -33,6 +39,7 @@ echo ""
 echo "🔑 IMPORTANT: Set your Shodan API key:"
 echo "   export SHODAN_API_KEY='your_key_here'"
 echo "   Or add to /opt/cowrie/.env"
+echo "   Optional: HEATMAP_MAX_IPS=N maps only the N busiest attackers (default: all)"
 echo ""
 echo "📊 View logs: tail -f /opt/cowrie/var/log/heatmap.log"
-echo "🗺️ Heatmaps saved to: /tmp/attacker_heatmap_*.html"
+echo "🗺️ Heatmaps saved to: /tmp/attacker_heatmap_*.html and .png (the PNG is posted to Discord)"
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Event Dedup - Bounded-memory duplicate removal for merged log sources
+Combined multi-host exports, re-pulled rotations and overlapping S3 archives
+repeat events. Each event is reduced to a 64-bit hash of (timestamp,
+session, eventid) and checked against one of:
+
+    exact    every key in an open-addressing array of 64-bit ints
+             (12-24 bytes per event, against ~250 for a set of tuples)
+    window   only keys from the last `window` seconds of event time; for
+             time-ordered streams (a k-way merge of sensors), where copies
+             arrive close together, memory follows the event rate, not the
+             history
+    bloom    a Bloom filter sized for `capacity` events, for very large
+             histories; a false positive drops a unique event with
+             probability `error_rate`
+
+    dedup = make_dedup('window', window=3600)
+    for event in dedup.filter(events):
+        ...
+"""
+
+import math
+from array import array
+
+from stream_sketches import hash64
+from log_time_index import ts_to_epoch
+
+MODES = ('exact', 'window', 'bloom', 'off')
+DEFAULT_WINDOW = 3600
+DEFAULT_CAPACITY = 10_000_000
+DEFAULT_ERROR_RATE = 0.001
+
+
+def event_key(event):
+    """64-bit key of an event (a decoded dict or an event_records.Event)"""
+    return hash64(f"{event.get('timestamp')}\x1f{event.get('session')}\x1f{event.get('eventid')}")
+
+
+def _event_epoch(event):
+    ts = getattr(event, 'ts', None)
+    if ts is not None:
+        return ts
+    timestamp = event.get('timestamp')
+    try:
+        return ts_to_epoch(timestamp) if timestamp else None
+    except (TypeError, ValueError):
+        return None
+
+
+class HashSet64:
+    """Set of 64-bit ints in a linear-probing array('Q') kept at most 2/3 full"""
+
+    def __init__(self, capacity=1024):
+        self._alloc(1 << max(4, (capacity * 3 // 2).bit_length()))
+        self._len = 0
+
+    def _alloc(self, size):
+        self._table = array('Q', [0]) * size
+        self._mask = size - 1
+
+    def add(self, key):
+        """Insert key (uniformly hashed); True if it was not present"""
+        key = key or 1  # 0 marks an empty slot
+        table, mask = self._table, self._mask
+        i = key & mask
+        while True:
+            slot = table[i]
+            if slot == 0:
+                break
+            if slot == key:
+                return False
+            i = (i + 1) & mask
+        table[i] = key
+        self._len += 1
+        if self._len * 3 > len(table) * 2:
+            self._grow()
+        return True
+
+    def __contains__(self, key):
+        key = key or 1
+        table, mask = self._table, self._mask
+        i = key & mask
+        while True:
+            slot = table[i]
+            if slot == key:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self._table
+        self._alloc(len(old) * 2)
+        table, mask = self._table, self._mask
+        for key in old:
+            if key:
+                i = key & mask
+                while table[i]:
+                    i = (i + 1) & mask
+                table[i] = key
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self):
+        return self._table.itemsize * len(self._table)
+
+
+class _Dedup:
+    def __init__(self):
+        self.events = 0
+        self.duplicates = 0
+
+    def seen(self, event):
+        """True if event is a duplicate; otherwise remembers it"""
+        self.events += 1
+        if self._seen(event_key(event), event):
+            self.duplicates += 1
+            return True
+        return False
+
+    def filter(self, events):
+        """events without the duplicates"""
+        seen = self.seen
+        for event in events:
+            if not seen(event):
+                yield event
+
+
+class ExactDedup(_Dedup):
+    """Exact duplicate removal over the whole history"""
+
+    def __init__(self, capacity=1024):
+        super().__init__()
+        self.keys = HashSet64(capacity)
+
+    def _seen(self, key, event):
+        return not self.keys.add(key)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes
+
+
+class WindowDedup(_Dedup):
+    """
+    Exact within a window of event time. Keys live in per-window
+    generations; the current and previous ones are kept, so a copy up to one
+    window late is still caught. Events older than that (or without a
+    timestamp) are passed through.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        super().__init__()
+        self.window = window
+        self.generations = {}  # epoch // window -> HashSet64
+        self.newest = None
+
+    def _seen(self, key, event):
+        epoch = _event_epoch(event)
+        if epoch is None:
+            return False
+        generation = int(epoch // self.window)
+        if self.newest is None or generation > self.newest:
+            self.newest = generation
+            for old in [g for g in self.generations if g < generation - 1]:
+                del self.generations[old]
+        elif generation < self.newest - 1:
+            return False
+        for keys in self.generations.values():
+            if key in keys:
+                return True
+        keys = self.generations.get(generation)
+        if keys is None:
+            keys = self.generations[generation] = HashSet64()
+        keys.add(key)
+        return False
+
+    @property
+    def nbytes(self):
+        return sum(keys.nbytes for keys in self.generations.values())
+
+
+class BloomDedup(_Dedup):
+    """Approximate duplicate removal in fixed memory (~1.8 bytes per event at 0.1%)"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        super().__init__()
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+
+    def _seen(self, key, event):
+        # double hashing: bit i is h1 + i * h2
+        h1, h2 = key & 0xffffffff, (key >> 32) | 1
+        bits, array_ = self.bits, self.array
+        present = True
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % bits
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not array_[byte] & mask:
+                present = False
+                array_[byte] |= mask
+        return present
+
+    @property
+    def nbytes(self):
+        return len(self.array)
+
+
+def make_dedup(mode='exact', window=DEFAULT_WINDOW, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+    """Dedup stage for mode (one of MODES; 'off' returns None)"""
+    if mode == 'exact':
+        return ExactDedup()
+    if mode == 'window':
+        return WindowDedup(window)
+    if mode == 'bloom':
+        return BloomDedup(capacity, error_rate)
+    if mode == 'off':
+        return None
+    raise ValueError(f"Unknown dedup mode: {mode}")
+
+
+def add_arguments(parser, default='exact'):
+    group = parser.add_argument_group('de-duplication')
+    group.add_argument('--dedup', choices=MODES, default=default,
+                       help='Drop events repeated across overlapping sources (default: %(default)s)')
+    group.add_argument('--dedup-window', type=float, default=DEFAULT_WINDOW, metavar='SECONDS',
+                       help='Event-time window for --dedup window (default: %(default)g)')
+    group.add_argument('--dedup-capacity', type=int, default=DEFAULT_CAPACITY, metavar='N',
+                       help='Expected events for --dedup bloom (default: %(default)s)')
+
+
+def from_args(args):
+    return make_dedup(args.dedup, window=args.dedup_window, capacity=args.dedup_capacity)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Event Records - Compact in-memory representations of Cowrie events
+Slotted Event and Session records with interned strings and integer epoch
+timestamps, plus EventColumns, an array-backed container for whole log
+histories. A decoded cowrie.json line costs ~1 KB as a dict; an Event is
+~150 bytes and a row in EventColumns about 40.
+
+Event.get() mirrors dict.get() for the keys the analysis scripts read, so
+code written against json.loads() output accepts these records unchanged.
+"""
+
+import sys
+import time
+from array import array
+from collections import Counter
+
+from log_time_index import ts_to_epoch
+
+_intern = sys.intern
+
+
+def _str(value):
+    return _intern(value) if isinstance(value, str) else None
+
+
+def _int(value):
+    return value if isinstance(value, int) else None
+
+
+def epoch_to_ts(epoch):
+    """Cowrie-style ISO timestamp (second precision) from epoch seconds"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch)) if epoch is not None else None
+
+
+_last_second = [None, None]
+
+
+def _second_prefix(epoch):
+    """'YYYY-MM-DDTHH:MM:SS' for epoch; consecutive events mostly share a second"""
+    if _last_second[0] != epoch:
+        _last_second[:] = epoch, time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch))
+    return _last_second[1]
+
+
+class Event:
+    """One Cowrie event with only the fields the analyses use"""
+
+    __slots__ = ('ts', 'eventid', 'src_ip', 'src_port', 'dst_port', 'session', 'username',
+                 'password', 'input', 'url', 'outfile', 'shasum', 'version', 'country', 'usec')
+
+    def __init__(self, ts=None, eventid=None, src_ip=None, src_port=None, dst_port=None, session=None,
+                 username=None, password=None, input=None, url=None, outfile=None, shasum=None,
+                 version=None, country=None, usec=None):
+        self.ts = ts
+        self.eventid = eventid
+        self.src_ip = src_ip
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.session = session
+        self.username = username
+        self.password = password
+        self.input = input
+        self.url = url
+        self.outfile = outfile
+        self.shasum = shasum
+        self.version = version
+        self.country = country
+        self.usec = usec  # sub-second part of the timestamp, in microseconds
+
+    @classmethod
+    def from_dict(cls, event):
+        """Build from a decoded JSON event (strings interned, timestamp as epoch)"""
+        try:
+            timestamp = event['timestamp']
+            ts = ts_to_epoch(timestamp)
+            usec = int(timestamp[20:26].ljust(6, '0')) if timestamp[19:20] == '.' else None
+        except (KeyError, TypeError, ValueError, IndexError):
+            ts = usec = None
+        geoip = event.get('geoip')
+        country = event.get('country') or (geoip.get('country_name') if isinstance(geoip, dict) else None)
+        return cls(ts, _str(event.get('eventid')), _str(event.get('src_ip')), _int(event.get('src_port')),
+                   _int(event.get('dst_port')), _str(event.get('session')), _str(event.get('username')),
+                   _str(event.get('password')), _str(event.get('input')), _str(event.get('url')),
+                   _str(event.get('outfile')), _str(event.get('shasum')), _str(event.get('version')),
+                   _str(country), usec)
+
+    @property
+    def timestamp(self):
+        if self.ts is None:
+            return None
+        if self.usec is None:
+            return _second_prefix(self.ts) + 'Z'
+        return f"{_second_prefix(self.ts)}.{self.usec:06d}Z"
+
+    def get(self, key, default=None):
+        """dict.get() over the record's fields ('timestamp' is rebuilt from ts)"""
+        if key in _FIELDS:
+            value = getattr(self, key)
+        elif key == 'timestamp':
+            value = self.timestamp
+        else:
+            value = None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def to_dict(self):
+        out = {name: getattr(self, name) for name in self.__slots__[1:-1] if getattr(self, name) is not None}
+        if self.ts is not None:
+            out['timestamp'] = self.timestamp
+        return out
+
+    def __repr__(self):
+        return f"Event({self.timestamp} {self.eventid} {self.src_ip} {self.session})"
+
+
+_FIELDS = frozenset(Event.__slots__)
+
+
+class Session:
+    """Everything one session did, built from its events"""
+
+    __slots__ = ('session', 'src_ip', 'start', 'end', 'event_count', 'logins', 'commands',
+                 'downloads', 'client_version')
+
+    def __init__(self, session, src_ip=None):
+        self.session = session
+        self.src_ip = src_ip
+        self.start = None
+        self.end = None
+        self.event_count = 0
+        self.logins = []      # (username, password, success)
+        self.commands = []    # command strings, in order (behavioral_analytics.analyze_session input)
+        self.downloads = []   # URLs
+        self.client_version = None
+
+    def add(self, event):
+        ts = event.ts
+        if ts is not None:
+            self.start = ts if self.start is None or ts < self.start else self.start
+            self.end = ts if self.end is None or ts > self.end else self.end
+        self.event_count += 1
+        self.src_ip = self.src_ip or event.src_ip
+        eventid = event.eventid
+        if eventid == 'cowrie.login.success' or eventid == 'cowrie.login.failed':
+            self.logins.append((event.username, event.password, eventid == 'cowrie.login.success'))
+        elif eventid == 'cowrie.command.input' and event.input is not None:
+            self.commands.append(event.input)
+        elif eventid == 'cowrie.session.file_download' and event.url is not None:
+            self.downloads.append(event.url)
+        elif eventid == 'cowrie.client.version':
+            self.client_version = event.version
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.start is not None else None
+
+    def __repr__(self):
+        return (f"Session({self.session} {self.src_ip} events={self.event_count} "
+                f"logins={len(self.logins)} commands={len(self.commands)})")
+
+
+def group_sessions(events):
+    """{session id: Session} from an iterable of Event records"""
+    sessions = {}
+    for event in events:
+        sid = event.session
+        if sid is None:
+            continue
+        record = sessions.get(sid)
+        if record is None:
+            record = sessions[sid] = Session(sid, event.src_ip)
+        record.add(event)
+    return sessions
+
+
+def iter_events(paths, predicate=None):
+    """
+    Event records from log files, Cowrie log directories or binary spools
+    (event_spool). JSON logs are prefiltered by predicate (see log_scan);
+    spooled events are checked with predicate.matches().
+    """
+    from log_scan import scan
+    from event_spool import SPOOL_SUFFIX, read_events
+    for path in paths:
+        if path.endswith(SPOOL_SUFFIX):
+            for event in read_events(path):
+                if predicate is None or (predicate.in_range(event.ts) and predicate.matches(event)):
+                    yield event
+        else:
+            for event in scan([path], predicate):
+                yield Event.from_dict(event)
+
+
+class StringTable:
+    """Each distinct string stored once; code 0 is None"""
+
+    def __init__(self):
+        self.strings = [None]
+        self.codes = {None: 0}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings) - 1
+
+
+class EventColumns:
+    """
+    Column-oriented event set: timestamps in an array('q'), every string
+    column as array('I') codes into one shared StringTable.
+
+    Rows come back as Event records; value_counts() and to_dataframe()
+    work on the codes directly without materialising rows.
+    """
+
+    COLUMNS = ('eventid', 'src_ip', 'session', 'username', 'password', 'input', 'url', 'version', 'country')
+
+    def __init__(self):
+        self.ts = array('q')
+        self.columns = {name: array('I') for name in self.COLUMNS}
+        self.strings = StringTable()
+
+    def append(self, event):
+        """Add an Event (or a decoded JSON dict)"""
+        if isinstance(event, dict):
+            event = Event.from_dict(event)
+        self.ts.append(event.ts if event.ts is not None else -1)
+        code = self.strings.code
+        for name, column in self.columns.items():
+            column.append(code(getattr(event, name)))
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+        return self
+
+    @classmethod
+    def from_logs(cls, paths, predicate=None):
+        return cls().extend(iter_events(paths, predicate))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, i):
+        strings = self.strings.strings
+        ts = self.ts[i]
+        return Event(ts=ts if ts >= 0 else None,
+                     **{name: strings[column[i]] for name, column in self.columns.items()})
+
+    def __iter__(self):
+        for i in range(len(self.ts)):
+            yield self[i]
+
+    def column(self, name):
+        """Decoded values of one column ('ts' gives epoch seconds)"""
+        if name == 'ts':
+            return list(self.ts)
+        strings = self.strings.strings
+        return [strings[c] for c in self.columns[name]]
+
+    def value_counts(self, name, where=None):
+        """
+        Counter of value -> rows for one column, counted on codes.
+        where: optional {column: value} filter, e.g. {'eventid': 'cowrie.login.success'}
+        """
+        codes = self.columns[name]
+        if where:
+            filters = [(self.columns[col], self.strings.codes.get(value, -1)) for col, value in where.items()]
+            counts = Counter(c for i, c in enumerate(codes) if all(col[i] == want for col, want in filters))
+        else:
+            counts = Counter(codes)
+        counts.pop(0, None)
+        strings = self.strings.strings
+        return Counter({strings[c]: n for c, n in counts.items()})
+
+    def sessions(self):
+        return group_sessions(self)
+
+    def memory_bytes(self):
+        """Approximate size of the arrays plus the string table"""
+        total = self.ts.itemsize * len(self.ts)
+        total += sum(col.itemsize * len(col) for col in self.columns.values())
+        total += sum(sys.getsizeof(s) for s in self.strings.strings[1:])
+        return total
+
+    def to_dataframe(self, columns=None):
+        """pandas DataFrame with categorical string columns and a UTC 'timestamp' column"""
+        import numpy as np
+        import pandas as pd
+
+        categories = pd.Index(self.strings.strings[1:], dtype=object)
+        data = {}
+        ts = pd.to_datetime(np.frombuffer(self.ts, dtype=np.int64), unit='s', utc=True)
+        data['timestamp'] = ts.where(np.frombuffer(self.ts, dtype=np.int64) >= 0)
+        for name in columns or self.COLUMNS:
+            codes = np.frombuffer(self.columns[name], dtype=np.uint32).astype(np.int64) - 1
+            data[name] = pd.Categorical.from_codes(codes, categories=categories).remove_unused_categories()
+        return pd.DataFrame(data)
+
+
+if __name__ == "__main__":
+    import json
+    import resource
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 event_records.py <cowrie.json> [--dicts]")
+        sys.exit(1)
+
+    start = time.time()
+    if '--dicts' in sys.argv:
+        with open(sys.argv[1], 'rb') as f:
+            held = [json.loads(line) for line in f]
+    else:
+        held = EventColumns.from_logs([sys.argv[1]])
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{len(held):,} events held as {type(held).__name__} in {time.time() - start:.1f}s, peak RSS {rss:.0f} MB")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Event Spool - Compact binary intermediate format for Cowrie events
+Convert cowrie.json once, then let stats, heatmap, PCAP export and replay
+read fixed-layout records instead of re-parsing JSON text every run.
+
+File layout (little-endian):
+    header   b'PPSPOOL' + u8 version, u32 schema length, schema JSON
+             (list of [field, struct code] in record order)
+    chunks   u32 strings length, u32 records length, u32 record count,
+             strings block (u32 count, then u32 length + UTF-8 bytes each,
+             appended to the file-wide string table), records block
+    record   u16 record length, then the schema fields; strings are codes
+             into the string table (0 = missing), ports 0 = missing,
+             ts INT64_MIN = missing, usec -1 = missing
+
+Readers map fields by name, so spools written with extra fields still read.
+
+Usage:
+    python3 event_spool.py convert /opt/cowrie/var/log/cowrie/ -o history.ppspool
+    python3 event_spool.py info history.ppspool
+    python3 event_spool.py cat history.ppspool | head
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+
+from event_records import Event, EventColumns, StringTable
+import pipeline_profile
+
+SPOOL_SUFFIX = '.ppspool'
+MAGIC = b'PPSPOOL'
+SPOOL_VERSION = 1
+CHUNK_RECORDS = 65536
+TS_MISSING = -(1 << 63)
+
+# Record layout for this version: [field, struct code]
+SCHEMA = [['ts', 'q'], ['usec', 'i'], ['src_port', 'H'], ['dst_port', 'H']] + \
+         [[name, 'I'] for name in ('eventid', 'src_ip', 'session', 'username', 'password', 'input',
+                                   'url', 'outfile', 'shasum', 'version', 'country')]
+
+_U32 = struct.Struct('<I')
+_CHUNK = struct.Struct('<III')
+
+
+def _record_struct(schema):
+    return struct.Struct('<H' + ''.join(code for _, code in schema))
+
+
+class SpoolWriter:
+    """Append Event records (or decoded dicts) to a new spool file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path + '.tmp', 'wb')
+        self.record = _record_struct(SCHEMA)
+        self.strings = StringTable()
+        self.new_strings = []
+        self.records = bytearray()
+        self.pending = 0
+        self.count = 0
+        schema = json.dumps(SCHEMA).encode('utf-8')
+        self.f.write(MAGIC + bytes([SPOOL_VERSION]) + _U32.pack(len(schema)) + schema)
+
+    def _code(self, value):
+        code = self.strings.codes.get(value)
+        if code is None:
+            code = self.strings.code(value)
+            self.new_strings.append(value)
+        return code
+
+    def write(self, event):
+        if isinstance(event, dict):
+            event = Event.from_dict(event)
+        code = self._code
+        self.records += self.record.pack(
+            self.record.size, event.ts if event.ts is not None else TS_MISSING,
+            event.usec if event.usec is not None else -1, event.src_port or 0, event.dst_port or 0,
+            code(event.eventid), code(event.src_ip), code(event.session), code(event.username),
+            code(event.password), code(event.input), code(event.url), code(event.outfile),
+            code(event.shasum), code(event.version), code(event.country))
+        self.pending += 1
+        if self.pending >= CHUNK_RECORDS:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        strings = bytearray(_U32.pack(len(self.new_strings)))
+        for value in self.new_strings:
+            raw = value.encode('utf-8', 'surrogatepass')
+            strings += _U32.pack(len(raw)) + raw
+        self.f.write(_CHUNK.pack(len(strings), len(self.records), self.pending))
+        self.f.write(strings)
+        self.f.write(self.records)
+        self.count += self.pending
+        self.new_strings, self.records, self.pending = [], bytearray(), 0
+
+    def close(self):
+        self._flush()
+        self.f.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+            os.remove(self.path + '.tmp')
+
+
+class SpoolReader:
+    """Sequential reader; yields each chunk's rows as tuples in schema order"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        head = self.f.read(len(MAGIC) + 1 + _U32.size)
+        if len(head) < len(MAGIC) + 1 + _U32.size or head[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not an event spool")
+        self.version = head[len(MAGIC)]
+        if self.version > SPOOL_VERSION:
+            raise ValueError(f"{path}: spool version {self.version} is newer than this reader ({SPOOL_VERSION})")
+        (schema_len,) = _U32.unpack_from(head, len(MAGIC) + 1)
+        self.schema = json.loads(self.f.read(schema_len))
+        self.fields = [name for name, _ in self.schema]
+        self.record = _record_struct(self.schema)
+        self.strings = StringTable()
+
+    def _read_strings(self, block):
+        (count,) = _U32.unpack_from(block, 0)
+        pos = _U32.size
+        table = self.strings
+        for _ in range(count):
+            (length,) = _U32.unpack_from(block, pos)
+            pos += _U32.size
+            value = sys.intern(block[pos:pos + length].decode('utf-8', 'surrogatepass'))
+            pos += length
+            table.codes[value] = len(table.strings)
+            table.strings.append(value)
+
+    def chunks(self):
+        """Row tuples per chunk (record length prefix dropped)"""
+        read = self.f.read
+        while True:
+            header = read(_CHUNK.size)
+            if len(header) < _CHUNK.size:
+                return
+            strings_len, records_len, count = _CHUNK.unpack(header)
+            self._read_strings(read(strings_len))
+            block = read(records_len)
+            if records_len == count * self.record.size:
+                # Every record has the layout we know: unpack the block in one go
+                yield self.record.iter_unpack(block)
+            else:
+                yield self._variable(block)
+
+    def _variable(self, block):
+        pos = 0
+        size = self.record.size
+        while pos < len(block):
+            (length,) = struct.unpack_from('<H', block, pos)
+            if length >= size:
+                yield self.record.unpack_from(block, pos)
+            pos += length
+
+    def events(self):
+        strings = self.strings.strings
+        if self.schema == SCHEMA:
+            # Current layout: positional construction, no per-row dicts
+            for rows in self.chunks():
+                for (_, ts, usec, sport, dport, eventid, src_ip, session, username, password, command,
+                     url, outfile, shasum, version, country) in rows:
+                    yield Event(None if ts == TS_MISSING else ts, strings[eventid], strings[src_ip],
+                                sport or None, dport or None, strings[session], strings[username],
+                                strings[password], strings[command], strings[url], strings[outfile],
+                                strings[shasum], strings[version], strings[country],
+                                None if usec < 0 else usec)
+            return
+        index = {name: i + 1 for i, name in enumerate(self.fields)}
+        string_fields = [(name, index[name]) for name, code in self.schema if code == 'I' and name in Event.__slots__]
+        ts_i, usec_i = index.get('ts'), index.get('usec')
+        sport_i, dport_i = index.get('src_port'), index.get('dst_port')
+        for rows in self.chunks():
+            for row in rows:
+                event = Event(**{name: strings[row[i]] for name, i in string_fields})
+                if ts_i is not None and row[ts_i] != TS_MISSING:
+                    event.ts = row[ts_i]
+                if usec_i is not None and row[usec_i] >= 0:
+                    event.usec = row[usec_i]
+                if sport_i is not None and row[sport_i]:
+                    event.src_port = row[sport_i]
+                if dport_i is not None and row[dport_i]:
+                    event.dst_port = row[dport_i]
+                yield event
+
+    def columns(self):
+        """Whole spool as EventColumns, sharing this spool's string table"""
+        cols = EventColumns()
+        cols.strings = self.strings
+        index = {name: i + 1 for i, name in enumerate(self.fields)}
+        ts_i = index.get('ts')
+        wanted = [(cols.columns[name], index[name]) for name in cols.COLUMNS if name in index]
+        for rows in self.chunks():
+            rows = list(rows)
+            if not rows:
+                continue
+            transposed = list(zip(*rows))
+            if ts_i is not None:
+                cols.ts.extend(-1 if t == TS_MISSING else t for t in transposed[ts_i])
+            else:
+                cols.ts.extend([-1] * len(rows))
+            for column, i in wanted:
+                column.extend(transposed[i])
+            for name, column in cols.columns.items():
+                if name not in index:
+                    column.extend([0] * len(rows))
+        return cols
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_events(path):
+    """Event records from a spool, in the order they were written"""
+    with SpoolReader(path) as reader:
+        yield from reader.events()
+
+
+def read_columns(path):
+    with SpoolReader(path) as reader:
+        return reader.columns()
+
+
+def convert(paths, out_path, predicate=None):
+    """Write every event from Cowrie logs (files/directories) to one spool; returns the count"""
+    from event_records import iter_events
+    with SpoolWriter(out_path) as writer:
+        write = pipeline_profile.wrap("write", writer.write)
+        for event in iter_events(paths, predicate):
+            write(event)
+    pipeline_profile.count(events=writer.count)
+    return writer.count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Binary spool format for Cowrie events')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    conv = sub.add_parser('convert', help='Convert Cowrie JSON logs to a spool')
+    conv.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    conv.add_argument('-o', '--output', required=True, help=f'Spool file to write (*{SPOOL_SUFFIX})')
+
+    info = sub.add_parser('info', help='Show spool size, schema and event count')
+    info.add_argument('path')
+
+    cat = sub.add_parser('cat', help='Print spooled events as JSON lines')
+    cat.add_argument('path')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "event_spool"):
+        if args.command == 'convert':
+            if not args.output.endswith(SPOOL_SUFFIX):
+                parser.error(f"output file name must end in {SPOOL_SUFFIX} so tools recognise it")
+            started = time.time()
+            count = convert(args.paths, args.output)
+            print(f"{count:,} events -> {args.output} ({os.path.getsize(args.output):,} bytes) "
+                  f"in {time.time() - started:.1f}s")
+        elif args.command == 'info':
+            started = time.time()
+            with SpoolReader(args.path) as reader:
+                count = sum(1 for rows in reader.chunks() for _ in rows)
+                print(f"version {reader.version}, {count:,} events, {len(reader.strings):,} distinct strings, "
+                      f"{os.path.getsize(args.path):,} bytes, read in {time.time() - started:.2f}s")
+                print("schema: " + ", ".join(f"{name}:{code}" for name, code in reader.schema))
+        else:
+            out = sys.stdout
+            for event in read_events(args.path):
+                out.write(json.dumps(event.to_dict()) + '\n')
+
+
+if __name__ == "__main__":
+    main()
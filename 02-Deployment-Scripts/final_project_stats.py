@@ -5,16 +5,43 @@ Generates comprehensive top 10 statistics from all 75 days and posts to Discord
 """
 
 import json
-import requests
 import os
-from datetime import datetime, timedelta
+import argparse
+from datetime import datetime, timedelta, timezone
 from collections import Counter, defaultdict
 
+# requests and honeypot_sql are imported where used, so report-only runs start fast
+from stream_sketches import HyperLogLog, SpaceSaving, sketch_from_dict
+from event_spool import SPOOL_SUFFIX, read_events
+from log_scan import Predicate, open_log, scan
+from log_time_index import parse_time
+import ip_prefixes
+import pipeline_telemetry as telemetry
+import pipeline_profile
+
+# Tables that become Space-Saving summaries in sketch mode
+TOP_TABLES = ['usernames', 'passwords', 'commands', 'source_ips', 'countries',
+              'top_attack_combos', 'ssh_versions', 'attack_methods']
+# Top tables answered by honeypot_sql named queries in --db mode
+DB_TOP_QUERIES = {'source_ips': 'top_ips', 'usernames': 'top_usernames', 'passwords': 'top_passwords',
+                  'commands': 'top_commands', 'top_attack_combos': 'top_combos',
+                  'ssh_versions': 'top_ssh_versions', 'countries': 'top_countries'}
+TOTALS = ['total_events', 'successful_logins', 'failed_logins', 'commands_executed',
+          'file_downloads', 'sessions']
+
 class FinalStatsGenerator:
-    def __init__(self):
+    def __init__(self, sketch=False, sketch_capacity=1000, prefix_lengths=ip_prefixes.DEFAULT_LENGTHS,
+                 prefix6_lengths=ip_prefixes.DEFAULT_LENGTHS6, asn_table=None):
         self.discord_webhook = None
         self.load_discord_config()
         self.cowrie_log = '/opt/cowrie/var/log/cowrie/cowrie.json'
+        # Sketch mode: fixed memory (HyperLogLog + Space-Saving) instead of exact sets/Counters
+        self.sketch = sketch
+        self.sketch_capacity = sketch_capacity
+        # Network rollups (see ip_prefixes); an ASN table is a loaded ip_prefixes.PrefixTable
+        self.prefix_lengths = tuple(prefix_lengths)
+        self.prefix6_lengths = tuple(prefix6_lengths)
+        self.asn_table = asn_table
         
     def load_discord_config(self):
         """Load Discord webhook from config"""
@@ -41,88 +68,97 @@ class FinalStatsGenerator:
         if self.discord_webhook:
             print("✅ Loaded Discord webhook from environment")
     
-    def analyze_all_logs(self):
-        """Analyze all logs and generate comprehensive statistics"""
+    def new_stats(self):
+        """Empty statistics accumulator (exact or sketch mode)"""
+        if self.sketch:
+            table = lambda: SpaceSaving(self.sketch_capacity)
+            distinct = HyperLogLog
+        else:
+            table = Counter
+            distinct = set
+        
         stats = {
             'total_events': 0,
-            'unique_ips': set(),
+            'unique_ips': distinct(),
             'login_attempts': 0,
             'successful_logins': 0,
             'failed_logins': 0,
             'commands_executed': 0,
             'file_downloads': 0,
             'sessions': 0,
-            'usernames': Counter(),
-            'passwords': Counter(),
-            'commands': Counter(),
-            'source_ips': Counter(),
-            'countries': Counter(),
+            'usernames': table(),
+            'passwords': table(),
+            'commands': table(),
+            'source_ips': table(),
+            'countries': table(),
             'first_event': None,
             'last_event': None,
-            'top_attack_combos': Counter(),
-            'ssh_versions': Counter(),
-            'attack_methods': Counter()
+            'top_attack_combos': table(),
+            'ssh_versions': table(),
+            'attack_methods': table()
         }
+        if self.sketch:
+            stats['unique_sessions'] = HyperLogLog()
+        stats['networks'] = self.new_networks(table)
+        return stats
+    
+    def new_networks(self, table=Counter):
+        """Per-network/ASN accumulator, or None when no rollup is configured"""
+        if not self.prefix_lengths and not self.prefix6_lengths and self.asn_table is None:
+            return None
+        return ip_prefixes.PrefixAggregator(self.prefix_lengths, self.prefix6_lengths, self.asn_table,
+                                            table=table, track_ips=not self.sketch)
+    
+    def analyze_all_logs(self, log_files=None, predicate=None):
+        """Analyze all logs and generate comprehensive statistics (only events matching predicate, if given)"""
+        stats = self.new_stats()
+        log_files = log_files or [self.cowrie_log]
         
-        print(f"📊 Analyzing logs from {self.cowrie_log}...")
+        for log_file in log_files:
+            before = stats['total_events']
+            with telemetry.span("read", file=log_file):
+                ok = self.analyze_log(log_file, stats, predicate)
+            telemetry.EVENTS.add(stats['total_events'] - before, {"stage": "stats"})
+            pipeline_profile.count(events=stats['total_events'] - before,
+                                   bytes=os.path.getsize(log_file) if ok and log_file != '-' else 0)
+            if not ok:
+                return None
         
+        return self.finish_stats(stats)
+    
+    def analyze_log(self, log_file, stats, predicate=None):
+        """Accumulate one log file into stats, returns False on error"""
+        print(f"📊 Analyzing logs from {log_file}...")
+        # Stage hooks for --profile (the plain callables when not profiling)
+        add_event = pipeline_profile.wrap("aggregate", self.add_event)
+        
+        if log_file.endswith(SPOOL_SUFFIX):
+            # Pre-converted binary spool: no JSON parsing at all
+            try:
+                for event in pipeline_profile.wrap_iter("read", read_events(log_file)):
+                    if predicate is None or (predicate.in_range(event.ts) and predicate.matches(event)):
+                        add_event(stats, event)
+            except (OSError, ValueError) as e:
+                print(f"❌ Error reading spool {log_file}: {e}")
+                return False
+            return True
+        
+        if predicate is not None:
+            # Time window: only lines carrying the date prefix / in range are decoded (see log_scan)
+            if log_file != '-' and not os.path.exists(log_file):
+                print(f"❌ Log file not found: {log_file}")
+                return False
+            for event in scan([log_file], predicate):
+                add_event(stats, event)
+            return True
+        
+        loads = pipeline_profile.wrap("decode", json.loads)
         try:
-            with open(self.cowrie_log, 'r') as f:
-                for line_num, line in enumerate(f, 1):
+            with open_log(log_file) as f:
+                for line_num, line in enumerate(pipeline_profile.wrap_iter("read", f), 1):
                     try:
-                        event = json.loads(line.strip())
-                        stats['total_events'] += 1
-                        
-                        # Track timestamps
-                        timestamp = event.get('timestamp', '')
-                        if timestamp:
-                            if not stats['first_event']:
-                                stats['first_event'] = timestamp
-                            stats['last_event'] = timestamp
-                        
-                        # Track IPs
-                        src_ip = event.get('src_ip')
-                        if src_ip:
-                            stats['unique_ips'].add(src_ip)
-                            stats['source_ips'][src_ip] += 1
-                        
-                        # Track event types
-                        event_id = event.get('eventid', '')
-                        
-                        if event_id == 'cowrie.login.success':
-                            stats['successful_logins'] += 1
-                            username = event.get('username', 'unknown')
-                            password = event.get('password', 'unknown')
-                            stats['usernames'][username] += 1
-                            stats['passwords'][password] += 1
-                            stats['top_attack_combos'][f"{username}:{password}"] += 1
-                        
-                        elif event_id == 'cowrie.login.failed':
-                            stats['failed_logins'] += 1
-                            username = event.get('username', 'unknown')
-                            password = event.get('password', 'unknown')
-                            stats['usernames'][username] += 1
-                            stats['passwords'][password] += 1
-                        
-                        elif event_id == 'cowrie.command.input':
-                            stats['commands_executed'] += 1
-                            command = event.get('input', 'unknown')
-                            stats['commands'][command] += 1
-                        
-                        elif event_id == 'cowrie.session.file_download':
-                            stats['file_downloads'] += 1
-                        
-                        elif event_id == 'cowrie.session.connect':
-                            stats['sessions'] += 1
-                        
-                        elif event_id == 'cowrie.client.version':
-                            ssh_version = event.get('version', 'unknown')
-                            stats['ssh_versions'][ssh_version] += 1
-                        
-                        # Track country if available
-                        country = event.get('country', event.get('geoip', {}).get('country_name'))
-                        if country:
-                            stats['countries'][country] += 1
+                        event = loads(line.strip())
+                        add_event(stats, event)
                         
                     except json.JSONDecodeError:
                         continue
@@ -130,18 +166,170 @@ class FinalStatsGenerator:
                         continue
         
         except FileNotFoundError:
-            print(f"❌ Log file not found: {self.cowrie_log}")
-            return None
+            print(f"❌ Log file not found: {log_file}")
+            return False
         except Exception as e:
             print(f"❌ Error analyzing logs: {e}")
-            return None
+            return False
+        
+        return True
+    
+    def add_event(self, stats, event):
+        """Accumulate one event (a decoded dict or an event_records.Event)"""
+        sessions = stats.get('unique_sessions')
+        networks = stats.get('networks')
         
+        stats['total_events'] += 1
+        
+        # Track timestamps
+        timestamp = event.get('timestamp', '')
+        if timestamp:
+            if not stats['first_event']:
+                stats['first_event'] = timestamp
+            stats['last_event'] = timestamp
+        
+        # Track IPs
+        src_ip = event.get('src_ip')
+        if src_ip:
+            stats['unique_ips'].add(src_ip)
+            stats['source_ips'][src_ip] += 1
+            if networks is not None:
+                networks.add(src_ip)
+        
+        if sessions is not None and event.get('session'):
+            sessions.add(event['session'])
+        
+        # Track event types
+        event_id = event.get('eventid', '')
+        
+        if event_id == 'cowrie.login.success':
+            stats['successful_logins'] += 1
+            username = event.get('username', 'unknown')
+            password = event.get('password', 'unknown')
+            stats['usernames'][username] += 1
+            stats['passwords'][password] += 1
+            stats['top_attack_combos'][f"{username}:{password}"] += 1
+        
+        elif event_id == 'cowrie.login.failed':
+            stats['failed_logins'] += 1
+            username = event.get('username', 'unknown')
+            password = event.get('password', 'unknown')
+            stats['usernames'][username] += 1
+            stats['passwords'][password] += 1
+        
+        elif event_id == 'cowrie.command.input':
+            stats['commands_executed'] += 1
+            command = event.get('input', 'unknown')
+            stats['commands'][command] += 1
+        
+        elif event_id == 'cowrie.session.file_download':
+            stats['file_downloads'] += 1
+        
+        elif event_id == 'cowrie.session.connect':
+            stats['sessions'] += 1
+        
+        elif event_id == 'cowrie.client.version':
+            ssh_version = event.get('version', 'unknown')
+            stats['ssh_versions'][ssh_version] += 1
+        
+        # Track country if available
+        country = event.get('country', event.get('geoip', {}).get('country_name'))
+        if country:
+            stats['countries'][country] += 1
+    
+    def finish_stats(self, stats):
+        """Turn accumulated sets/sketches into the reported numbers"""
+        if self.sketch:
+            # Keep the sketches so they can be saved and merged later
+            stats['ip_sketch'] = stats['unique_ips']
+            stats['session_sketch'] = stats['unique_sessions']
+            stats['unique_sessions'] = len(stats['session_sketch'])
         stats['unique_ips'] = len(stats['unique_ips'])
         stats['login_attempts'] = stats['successful_logins'] + stats['failed_logins']
         
         print(f"✅ Analyzed {stats['total_events']:,} events")
         return stats
     
+    def save_sketch(self, stats, path):
+        """Serialize sketch-mode stats so other files or sensors can be merged in"""
+        data = {key: stats[key] for key in TOTALS + ['first_event', 'last_event']}
+        data['ip_sketch'] = stats['ip_sketch'].to_dict()
+        data['session_sketch'] = stats['session_sketch'].to_dict()
+        for key in TOP_TABLES:
+            data[key] = stats[key].to_dict()
+        if stats.get('networks') is not None:
+            networks = stats['networks']
+            data['networks'] = {rollup: networks.events[rollup].to_dict() for rollup in networks.rollups}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        print(f"💾 Saved sketch to {path} ({os.path.getsize(path):,} bytes)")
+    
+    def load_sketch(self, path):
+        """Load stats saved by save_sketch()"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        stats = {key: data[key] for key in TOTALS + ['first_event', 'last_event']}
+        stats['unique_ips'] = sketch_from_dict(data['ip_sketch'])
+        stats['unique_sessions'] = sketch_from_dict(data['session_sketch'])
+        for key in TOP_TABLES:
+            stats[key] = sketch_from_dict(data[key])
+        stats['networks'] = None
+        if data.get('networks'):
+            stats['networks'] = ip_prefixes.PrefixAggregator.from_tables(
+                {rollup: sketch_from_dict(table) for rollup, table in data['networks'].items()})
+        return stats
+    
+    def merge_sketches(self, paths):
+        """Merge saved sketches from several files/sensors into one report"""
+        merged = None
+        without_networks = []
+        for path in paths:
+            stats = self.load_sketch(path)
+            if stats['networks'] is None:
+                without_networks.append(path)
+            if merged is None:
+                merged = stats
+                continue
+            for key in TOTALS:
+                merged[key] += stats[key]
+            firsts = [t for t in (merged['first_event'], stats['first_event']) if t]
+            lasts = [t for t in (merged['last_event'], stats['last_event']) if t]
+            merged['first_event'] = min(firsts) if firsts else None
+            merged['last_event'] = max(lasts) if lasts else None
+            for key in ['unique_ips', 'unique_sessions'] + TOP_TABLES:
+                merged[key].merge(stats[key])
+            if stats['networks'] is not None:
+                if merged['networks'] is None:
+                    merged['networks'] = stats['networks']
+                else:
+                    merged['networks'].merge(stats['networks'])
+        if without_networks and len(without_networks) == len(paths):
+            print("⚠️  No network rollups saved in these sketches; the report has no network tables")
+        elif without_networks:
+            print(f"⚠️  Network rollups cover {len(paths) - len(without_networks)} of {len(paths)} sketches "
+                  f"(none saved in {', '.join(without_networks)})")
+        return self.finish_stats(merged)
+    
+    def analyze_database(self, db_path=None, log_files=None):
+        """Statistics from the honeypot_sql database, loading any new log lines first"""
+        import honeypot_sql
+        conn = honeypot_sql.connect(db_path)
+        print(f"📊 Loading new events into {db_path or honeypot_sql.default_db_path()}...")
+        honeypot_sql.load(conn, log_files or [self.cowrie_log])
+        
+        columns, rows = honeypot_sql.run_query(conn, 'summary')
+        stats = dict(zip(columns, rows[0]))
+        for key, query in DB_TOP_QUERIES.items():
+            stats[key] = Counter(dict(honeypot_sql.run_query(conn, query)[1]))
+        stats['networks'] = self.new_networks()
+        if stats['networks'] is not None:
+            stats['networks'].update(dict(conn.execute(
+                "SELECT src_ip, count(*) FROM events WHERE src_ip IS NOT NULL GROUP BY src_ip")))
+        conn.close()
+        
+        print(f"✅ Analyzed {stats['total_events']:,} events")
+        return stats
+    
     def calculate_project_duration(self, first_event, last_event):
         """Calculate project duration in days"""
         try:
@@ -183,7 +371,15 @@ class FinalStatsGenerator:
   - Failed: {stats['failed_logins']:,}
 • Commands Executed: **{stats['commands_executed']:,}**
 • File Downloads: **{stats['file_downloads']:,}**
-
+"""
+        if 'ip_sketch' in stats:
+            message += f"""
+**📐 SKETCH MODE (approximate)**
+• Distinct IPs / sessions: ±{stats['ip_sketch'].relative_error:.1%} (1σ)
+• Distinct Session IDs: **~{stats['unique_sessions']:,}**
+• Top-10 counts are upper bounds; exact ranking guaranteed: {'yes' if all(stats[k].guaranteed_top(10) for k in TOP_TABLES if stats[k]) else 'no'}
+"""
+        message += """
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
         return message
@@ -200,6 +396,16 @@ class FinalStatsGenerator:
             msg += "```"
             messages.append(msg)
         
+        # Top 10 Attacker Networks, per prefix length and ASN
+        networks = stats.get('networks')
+        for rollup in networks.rollups if networks else []:
+            if networks.events[rollup]:
+                title = "ASNs" if rollup == ip_prefixes.ASN_ROLLUP else f"NETWORKS ({rollup})"
+                msg = f"**🌐 TOP 10 ATTACKER {title}**\n```\n"
+                msg += ip_prefixes.format_rollup(networks, rollup) + "\n"
+                msg += "```"
+                messages.append(msg)
+        
         # Top 10 Usernames
         if stats['usernames']:
             msg = "**👤 TOP 10 USERNAMES TRIED**\n```\n"
@@ -262,14 +468,16 @@ class FinalStatsGenerator:
             print(message)
             return False
         
+        import requests
         try:
             data = {"content": message}
-            response = requests.post(
-                self.discord_webhook,
-                json=data,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
+            with telemetry.span("notify"), pipeline_profile.stage("write"):
+                response = requests.post(
+                    self.discord_webhook,
+                    json=data,
+                    headers={"Content-Type": "application/json"},
+                    timeout=10
+                )
             
             if response.status_code in [200, 204]:
                 print(f"✅ Sent to Discord ({len(message)} chars)")
@@ -281,27 +489,41 @@ class FinalStatsGenerator:
             print(f"❌ Error sending to Discord: {e}")
             return False
     
-    def generate_and_post(self):
-        """Generate statistics and post to Discord"""
+    def generate_and_post(self, log_files=None, merge_sketches=None, save_sketch=None, db=None,
+                          predicate=None, post=True):
+        """Generate statistics and post to Discord (post=False only prints them)"""
         print("\n" + "="*60)
         print("🍯 PATRIOTPOT - FINAL PROJECT STATISTICS")
         print("="*60 + "\n")
         
-        # Analyze logs
-        stats = self.analyze_all_logs()
+        # Analyze logs (or merge previously saved sketches, or query the SQL store)
+        if merge_sketches:
+            stats = self.merge_sketches(merge_sketches)
+        elif db is not None:
+            stats = self.analyze_database(db or None, log_files)
+        else:
+            stats = self.analyze_all_logs(log_files, predicate)
         if not stats:
             print("❌ Failed to analyze logs")
             return False
         
+        if save_sketch:
+            with pipeline_profile.stage("write"):
+                self.save_sketch(stats, save_sketch)
+        
         # Format messages
-        summary_msg = self.format_top10_message(stats)
-        top10_msgs = self.format_top10_lists(stats)
+        with pipeline_profile.stage("format"):
+            summary_msg = self.format_top10_message(stats)
+            top10_msgs = self.format_top10_lists(stats)
         
         # Print to console
         print("\n" + summary_msg)
         for msg in top10_msgs:
             print("\n" + msg)
         
+        if not post:
+            return True
+        
         # Send to Discord
         print("\n" + "="*60)
         print("📤 Posting to Discord...")
@@ -334,9 +556,46 @@ Log archives and PCAP files are being prepared for download.
         print("\n✅ Statistics generation and Discord posting complete!")
         return True
 
-def main():
-    generator = FinalStatsGenerator()
-    generator.generate_and_post()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate final project statistics and post to Discord')
+    parser.add_argument('--log', nargs='+',
+                        help="Cowrie JSON log file(s), event spools (*.ppspool) or '-' for stdin, e.g. from log_merge "
+                             '(default: /opt/cowrie/var/log/cowrie/cowrie.json)')
+    parser.add_argument('--sketch', action='store_true',
+                        help='Fixed-memory mode: HyperLogLog distinct counts and Space-Saving top-10 tables')
+    parser.add_argument('--sketch-capacity', type=int, default=1000,
+                        help='Items tracked per top-10 table in sketch mode (default: 1000)')
+    parser.add_argument('--save-sketch', help='Save sketch-mode results to this file (implies --sketch)')
+    parser.add_argument('--merge-sketch', nargs='+',
+                        help='Report on saved sketches from several files/sensors instead of reading logs')
+    parser.add_argument('--db', nargs='?', const='', metavar='PATH',
+                        help='Report from the honeypot_sql database, loading new log lines first '
+                             '(default path: $HONEYPOT_DB or ~/.cache/patriotpot/events.sqlite)')
+    parser.add_argument('--today', action='store_true', help="Only today's events (UTC)")
+    parser.add_argument('--since', help='Only events from this time on: 7d, 12h, ISO time or epoch')
+    parser.add_argument('--until', help='Only events before this time: ISO time or epoch')
+    parser.add_argument('--no-post', action='store_true', help='Print the report without posting to Discord')
+    ip_prefixes.add_arguments(parser)
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    telemetry.setup("honeypot-final-stats")
+    
+    predicate = None
+    if args.today or args.since or args.until:
+        if args.db is not None or args.merge_sketch:
+            parser.error("--today/--since/--until filter log files, not --db or --merge-sketch")
+        predicate = Predicate(start=parse_time(args.since), end=parse_time(args.until),
+                              date_prefix=datetime.now(timezone.utc).strftime('%Y-%m-%d') if args.today else None)
+    
+    with pipeline_profile.profiled(args, "final_project_stats"):
+        generator = FinalStatsGenerator(sketch=bool(args.sketch or args.save_sketch or args.merge_sketch),
+                                        sketch_capacity=args.sketch_capacity,
+                                        prefix_lengths=ip_prefixes.parse_lengths(args.prefix_lengths),
+                                        prefix6_lengths=ip_prefixes.parse_lengths(args.prefix6_lengths),
+                                        asn_table=ip_prefixes.asn_table_from_args(args))
+        generator.generate_and_post(log_files=args.log, merge_sketches=args.merge_sketch,
+                                    save_sketch=args.save_sketch, db=args.db,
+                                    predicate=predicate, post=not args.no_post)
 
 if __name__ == "__main__":
     main()
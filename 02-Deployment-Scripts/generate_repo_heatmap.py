@@ -1,74 +1,73 @@
 import json
 import folium
-from folium.plugins import HeatMap
-import requests
-import os
+import argparse
 from collections import Counter
 
-# OpenTelemetry Imports
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.sdk.resources import Resource
-
-# Setup Tracing
-resource = Resource(attributes={
-    "service.name": "honeypot-heatmap-generator"
-})
-trace.set_tracer_provider(TracerProvider(resource=resource))
-tracer = trace.get_tracer(__name__)
-otlp_exporter = OTLPSpanExporter(endpoint="http://localhost:4317", insecure=True)
-trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(otlp_exporter))
-
-RequestsInstrumentor().instrument()
+from threat_intel import EnrichmentService, ResultCache, default_cache_path, geolocation
+from event_spool import SPOOL_SUFFIX, read_events
+from log_scan import open_log
+import pipeline_telemetry as telemetry
+import pipeline_profile
+import event_dedup
+from geo_grid import GridAggregator, add_to_map
+from ip_prefixes import network_of
 
 # Configuration
-SHODAN_API_KEY = os.getenv("SHODAN_API_KEY", "YOUR_SHODAN_API_KEY")
 LOG_FILE = "combined.json"
 OUTPUT_FILE = "attacker_heatmap.html"
+PNG_FILE = None
+TOP_IPS = 200
+NETWORK_PREFIX = 0
+
+def iter_log_events():
+    """Events from LOG_FILE: JSON lines ('-' for stdin, e.g. from log_merge), or a binary spool written by event_spool.py"""
+    if LOG_FILE.endswith(SPOOL_SUFFIX):
+        yield from read_events(LOG_FILE)
+        return
+    with open_log(LOG_FILE) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except:
+                continue
 
-def get_geolocation(ip):
-    """Get geolocation from Shodan API"""
-    try:
-        url = f"https://api.shodan.io/shodan/host/{ip}?key={SHODAN_API_KEY}"
-        response = requests.get(url, timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('latitude'), data.get('longitude')
-    except Exception as e:
-        print(f"Error geolocating {ip}: {e}")
-    return None, None
+def count_attacker_ips(events, dedup=None):
+    """Events per source IP, used to weight the heatmap"""
+    ip_counts = Counter()
+    if dedup is not None:
+        # Deduplicate based on timestamp, session, and eventid (hashed keys, see event_dedup)
+        events = dedup.filter(events)
+    for data in events:
+        if 'src_ip' in data:
+            ip_counts[data['src_ip']] += 1
+    return ip_counts
 
-def generate_heatmap():
-    with tracer.start_as_current_span("generate_heatmap"):
+def group_by_network(ip_counts, length):
+    """Events per /length network (/48 for IPv6), each located by its busiest IP"""
+    counts, located_by = Counter(), {}
+    for ip, count in ip_counts.most_common():
+        network = network_of(ip, length) or ip
+        counts[network] += count
+        located_by.setdefault(network, ip)
+    return counts, located_by
+
+def generate_heatmap(dedup=None):
+    with telemetry.span("generate_heatmap"):
         print(f"Reading {LOG_FILE}...")
-        ips = []
-        unique_events = set()
         try:
-            with open(LOG_FILE, 'r') as f:
-                for line in f:
-                    try:
-                        data = json.loads(line)
-                        # Deduplicate based on timestamp, session, and eventid
-                        event_key = (data.get('timestamp'), data.get('session'), data.get('eventid'))
-                        if event_key in unique_events:
-                            continue
-                        unique_events.add(event_key)
-                        
-                        if 'src_ip' in data:
-                            ips.append(data['src_ip'])
-                    except:
-                        continue
+            with telemetry.span("read", file=LOG_FILE):
+                ip_counts = count_attacker_ips(pipeline_profile.wrap_iter("read", iter_log_events()), dedup)
         except FileNotFoundError:
             print(f"File {LOG_FILE} not found.")
             return
+        telemetry.EVENTS.add(sum(ip_counts.values()), {"stage": "heatmap"})
+        pipeline_profile.count(events=sum(ip_counts.values()))
 
         # Count IPs to weight the heatmap
-        ip_counts = Counter(ips)
         unique_ips = list(ip_counts.keys())
-        print(f"Found {len(unique_ips)} unique IPs from {len(ips)} total events.")
+        print(f"Found {len(unique_ips)} unique IPs from {sum(ip_counts.values())} total events.")
+        if dedup is not None and dedup.duplicates:
+            print(f"Skipped {dedup.duplicates} duplicate events ({dedup.nbytes / 1024 / 1024:.1f} MB of keys).")
 
         # Limit to top 500 IPs to save API calls and time if needed, or do all if feasible.
         # 500 IPs * 1 sec/req = 8 mins. Let's do top 100 for speed in this demo, or user can run full.
@@ -76,32 +75,72 @@ def generate_heatmap():
         # But I have a token limit and time limit.
         # Let's try to cache geolocations if possible, or just do top 200 most frequent attackers.
         
-        top_ips = [ip for ip, count in ip_counts.most_common(200)]
+        # With --network-prefix, a scanning farm spread over a /24 is one
+        # weighted point instead of hundreds of small ones (and one lookup)
+        weights, located_by = ip_counts, None
+        if NETWORK_PREFIX:
+            weights, located_by = group_by_network(ip_counts, NETWORK_PREFIX)
+            print(f"Grouped into {len(weights)} /{NETWORK_PREFIX} networks.")
+        top = [key for key, count in weights.most_common(TOP_IPS or None)]
+        top_ips = [located_by[key] for key in top] if located_by else top
         
-        heat_data = []
         print(f"Geolocating top {len(top_ips)} attackers...")
         
-        for i, ip in enumerate(top_ips):
-            lat, lon = get_geolocation(ip)
-            if lat and lon:
-                # Weight by frequency
-                weight = ip_counts[ip]
-                # Normalize weight slightly so single massive attackers don't drown everything
-                # or just use raw count. HeatMap handles it well.
-                heat_data.append([lat, lon, weight])
-            if i % 10 == 0:
-                print(f"Processed {i}/{len(top_ips)}...")
+        # Shodan (falling back to IPinfo) through the shared enrichment service and cache
+        enrichment = EnrichmentService(providers=["shodan", "ipinfo"], cache=ResultCache(default_cache_path()))
+        with pipeline_profile.stage("enrich"):
+            results = enrichment.enrich_many(
+                top_ips, progress=lambda done, total: print(f"Processed {done}/{total} lookups...") if done % 10 == 0 else None
+            )
+        # Sum attackers into geohash cells so the map size follows the number
+        # of cells, not attackers; weighted by event count
+        grid = GridAggregator()
+        points = []
+        with pipeline_profile.stage("aggregate"):
+            for key, ip in zip(top, top_ips):
+                result = results[ip]
+                lat, lon = geolocation(result)
+                if lat is not None and lon is not None:
+                    country = (result.get("shodan") or result.get("ipinfo") or {}).get("country")
+                    grid.add(lat, lon, weight=weights[key], label=country)
+                    points.append((lat, lon, weights[key]))
 
-        print(f"Generating heatmap with {len(heat_data)} points...")
+        print(f"Generating heatmap with {grid.points} attackers in {len(grid)} cells...")
         
         # Create map with dark theme for "impressive" look
         m = folium.Map(location=[20, 0], zoom_start=2, tiles='CartoDB dark_matter')
         
-        # Add HeatMap
-        HeatMap(heat_data, radius=15, blur=20, max_zoom=1).add_to(m)
+        # Heat layers switched by zoom level, plus clustered per-cell markers
+        add_to_map(grid, m)
         
-        m.save(OUTPUT_FILE)
+        with pipeline_profile.stage("write"):
+            m.save(OUTPUT_FILE)
         print(f"Heatmap saved to {OUTPUT_FILE}")
+        
+        if PNG_FILE:
+            import heatmap_image
+            with pipeline_profile.stage("render"):
+                heatmap_image.render(points, PNG_FILE)
+            print(f"Heatmap image saved to {PNG_FILE}")
+
+def main(argv=None):
+    global LOG_FILE, OUTPUT_FILE, PNG_FILE, TOP_IPS, NETWORK_PREFIX
+    parser = argparse.ArgumentParser(description='Geolocate the most active attacker IPs and render a heatmap')
+    parser.add_argument('--log', default=LOG_FILE, help=f"Cowrie JSON log, event spool or '-' for stdin (default: {LOG_FILE})")
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f'HTML map to write (default: {OUTPUT_FILE})')
+    parser.add_argument('--png', help='Also render a static PNG heatmap (no browser or map tiles needed)')
+    parser.add_argument('--top', type=int, default=TOP_IPS, help=f'Attacker IPs to geolocate, 0 for all (default: {TOP_IPS})')
+    parser.add_argument('--network-prefix', type=int, default=NETWORK_PREFIX, metavar='LEN',
+                        help='Weight and geolocate per IPv4 /LEN network (IPv6 /48) instead of per IP, e.g. 24')
+    event_dedup.add_arguments(parser)
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    LOG_FILE, OUTPUT_FILE, PNG_FILE, TOP_IPS = args.log, args.output, args.png, args.top
+    NETWORK_PREFIX = args.network_prefix
+    # Traces go to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+    telemetry.setup("honeypot-heatmap-generator")
+    with pipeline_profile.profiled(args, "generate_repo_heatmap"):
+        generate_heatmap(event_dedup.from_args(args))
 
 if __name__ == "__main__":
-    generate_heatmap()
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Geo Grid - Geohash-binned attacker locations for small, fast maps
+Attacker points are summed into geohash cells at a few precisions
+instead of being written to the map one by one, so the HTML grows with
+the number of occupied cells (a few thousand at most) rather than with
+the number of attackers.
+
+GridAggregator.add() takes one point at a time in O(1) memory per cell;
+add_to_map() draws a heat layer per precision, switched by zoom level,
+and a clustered marker layer with one marker and popup per ~156 km cell.
+
+    grid = GridAggregator()
+    for ip, (lat, lon) in locations.items():
+        grid.add(lat, lon, weight=ip_counts[ip], label=country[ip])
+    add_to_map(grid, folium.Map(...))
+"""
+
+import math
+import html
+from collections import Counter
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# (geohash precision, min zoom, max zoom): cells of ~1250, ~156 and ~39 km
+LEVELS = ((2, 0, 3), (3, 4, 6), (4, 7, 18))
+MARKER_PRECISION = 3
+MAX_PRECISION = 6
+TOP_LABELS = 3
+
+
+# 8-bit value -> its bits spread to the even positions of 16 bits
+_SPREAD = [sum(((i >> bit) & 1) << (2 * bit) for bit in range(8)) for i in range(256)]
+
+
+def _spread(value):
+    return _SPREAD[value & 0xff] | (_SPREAD[value >> 8] << 16)
+
+
+def geohash_code(lat, lon, precision):
+    """Geohash of (lat, lon) as an int of 5 * precision bits (precision <= MAX_PRECISION)"""
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    x = min(max(int((lon + 180.0) / 360.0 * (1 << lon_bits)), 0), (1 << lon_bits) - 1)
+    y = min(max(int((lat + 90.0) / 180.0 * (1 << lat_bits)), 0), (1 << lat_bits) - 1)
+    # bits alternate lon, lat, lon, ... from the most significant end
+    if bits % 2:
+        return _spread(x) | (_spread(y) << 1)
+    return (_spread(x) << 1) | _spread(y)
+
+
+def geohash_string(code, precision):
+    return ''.join(_BASE32[(code >> (5 * i)) & 31] for i in range(precision - 1, -1, -1))
+
+
+def geohash(lat, lon, precision):
+    """Base-32 geohash of (lat, lon) with precision characters"""
+    return geohash_string(geohash_code(lat, lon, precision), precision)
+
+
+class Cell:
+    """Summed weight, point count and weighted centroid of one geohash cell"""
+    __slots__ = ('lat_sum', 'lon_sum', 'weight', 'points', 'labels')
+
+    def __init__(self):
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.weight = 0
+        self.points = 0
+        self.labels = None
+
+    def add(self, lat, lon, weight, label):
+        self.lat_sum += lat * weight
+        self.lon_sum += lon * weight
+        self.weight += weight
+        self.points += 1
+        if label:
+            if self.labels is None:
+                self.labels = Counter()
+            self.labels[label] += weight
+
+    @property
+    def centre(self):
+        return self.lat_sum / self.weight, self.lon_sum / self.weight
+
+    def top_labels(self, limit=TOP_LABELS):
+        return self.labels.most_common(limit) if self.labels else []
+
+
+class GridAggregator:
+    """Points binned into geohash cells at each precision in LEVELS"""
+
+    def __init__(self, levels=LEVELS, marker_precision=MARKER_PRECISION):
+        self.levels = levels
+        self.precisions = [precision for precision, _, _ in levels]
+        if marker_precision not in self.precisions:
+            raise ValueError(f"marker_precision {marker_precision} is not one of the levels {self.precisions}")
+        self.finest = max(self.precisions)
+        if self.finest > MAX_PRECISION:
+            raise ValueError(f"Geohash precision is limited to {MAX_PRECISION}")
+        self.marker_precision = marker_precision
+        self.cells = {precision: {} for precision in self.precisions}
+        self.points = 0
+
+    def add(self, lat, lon, weight=1, label=None):
+        """Add one located point (an attacker IP weighted by its event count)"""
+        if lat is None or lon is None or weight <= 0:
+            return
+        code = geohash_code(lat, lon, self.finest)
+        for precision in self.precisions:
+            cells = self.cells[precision]
+            key = code >> (5 * (self.finest - precision))  # geohash prefix
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = Cell()
+            # labels are only shown in the marker popups
+            cell.add(lat, lon, weight, label if precision == self.marker_precision else None)
+        self.points += 1
+
+    def __len__(self):
+        return len(self.cells[self.marker_precision])
+
+    def heat_data(self, precision):
+        """[lat, lon, intensity] per cell; log-scaled so one heavy scanner doesn't wash out the rest"""
+        cells = self.cells[precision].values()
+        peak = math.log1p(max((cell.weight for cell in cells), default=1))
+        rows = []
+        for cell in cells:
+            lat, lon = cell.centre
+            rows.append([round(lat, 4), round(lon, 4), round(math.log1p(cell.weight) / peak, 3)])
+        return rows
+
+    def marker_data(self):
+        """[lat, lon, events, attackers, geohash, [[label, events], ...]] per marker cell"""
+        precision = self.marker_precision
+        rows = []
+        for key, cell in self.cells[precision].items():
+            lat, lon = cell.centre
+            labels = [[html.escape(str(label)), weight] for label, weight in cell.top_labels()]
+            rows.append([round(lat, 3), round(lon, 3), cell.weight, cell.points,
+                         geohash_string(key, precision), labels])
+        return rows
+
+
+# Marker per cell, carrying its event count for the cluster icons; the popup
+# is built on click so the page carries only the compact rows
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {events: row[2]});
+    marker.bindPopup(function () {
+        var text = '<b>' + row[3].toLocaleString() + (row[3] == 1 ? ' attacker' : ' attackers') + '</b>'
+            + '<br>' + row[2].toLocaleString() + ' events<br>cell ' + row[4];
+        row[5].forEach(function (label) { text += '<br>' + label[0] + ': ' + label[1].toLocaleString(); });
+        return text;
+    });
+    return marker;
+}
+"""
+
+# Cluster bubbles show the events under them rather than the number of cells
+_CLUSTER_ICON = """
+function (cluster) {
+    var events = 0;
+    cluster.getAllChildMarkers().forEach(function (m) { events += m.options.events; });
+    var size = events < 1000 ? 'small' : events < 100000 ? 'medium' : 'large';
+    return L.divIcon({html: '<div><span>' + events.toLocaleString() + '</span></div>',
+                      className: 'marker-cluster marker-cluster-' + size, iconSize: L.point(40, 40)});
+}
+"""
+
+
+def _zoom_switch(bands):
+    """Map element that shows each (layer, min zoom, max zoom) only inside its zoom band"""
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    switch = MacroElement()
+    switch._name = 'ZoomSwitch'
+    switch.bands = bands
+    switch._template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var bands = [{% for layer, lo, hi in this.bands %}[{{ layer.get_name() }}, {{ lo }}, {{ hi }}],{% endfor %}];
+            function update() {
+                var zoom = map.getZoom();
+                bands.forEach(function (band) {
+                    var show = zoom >= band[1] && zoom <= band[2];
+                    if (show && !map.hasLayer(band[0])) { map.addLayer(band[0]); }
+                    if (!show && map.hasLayer(band[0])) { map.removeLayer(band[0]); }
+                });
+            }
+            map.on('zoomend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+    return switch
+
+
+def add_to_map(grid, m, heat=True, markers=True, name='Attackers'):
+    """Draw grid on the folium map m: zoom-switched heat layers and/or clustered cell markers"""
+    from folium.plugins import FastMarkerCluster, HeatMap
+
+    if heat:
+        bands = []
+        for precision, lo, hi in grid.levels:
+            layer = HeatMap(grid.heat_data(precision), radius=15, blur=20,
+                            min_opacity=0.3, max_zoom=hi, control=False)
+            layer.add_to(m)
+            bands.append((layer, lo, hi))
+        _zoom_switch(bands).add_to(m)
+    if markers:
+        FastMarkerCluster(grid.marker_data(), callback=_MARKER_CALLBACK, name=name,
+                          icon_create_function=_CLUSTER_ICON).add_to(m)
+    return m
@@ -18,18 +18,19 @@ scp -i ~/.ssh/gmu-honeypot-key.pem ec2-user@44.218.220.47:/tmp/cowrie_traffic.pc
 
 # Generate recent attacks PCAP (last 7 days)
 echo "📅 Generating recent attacks PCAP..."
-ssh -i ~/.ssh/gmu-honeypot-key.pem ec2-user@44.218.220.47 "grep '$(date -d '7 days ago' +%Y-%m-)' /opt/cowrie/var/log/cowrie/cowrie.json > /tmp/recent_logs.json && sudo python3 /home/ec2-user/AWSHoneypot/02-Deployment-Scripts/logs2pcap.py /tmp/recent_logs.json /tmp/recent_traffic.pcap"
+ssh -i ~/.ssh/gmu-honeypot-key.pem ec2-user@44.218.220.47 "sudo python3 /home/ec2-user/AWSHoneypot/02-Deployment-Scripts/log_time_index.py query /opt/cowrie/var/log/cowrie --since 7d > /tmp/recent_logs.json && sudo python3 /home/ec2-user/AWSHoneypot/02-Deployment-Scripts/logs2pcap.py /tmp/recent_logs.json /tmp/recent_traffic.pcap"
 
 # Download recent PCAP
 scp -i ~/.ssh/gmu-honeypot-key.pem ec2-user@44.218.220.47:/tmp/recent_traffic.pcap ./presentation-data/patriotpot_recent_attacks.pcap
 
 # Generate top attacker PCAP
 echo "🎯 Generating top attacker PCAP..."
+# Top IP and its events come from the log_event_index sidecar instead of grepping the whole log
 ssh -i ~/.ssh/gmu-honeypot-key.pem ec2-user@44.218.220.47 '
-TOP_IP=$(grep -o "\"src_ip\":\"[^\"]*\"" /opt/cowrie/var/log/cowrie/cowrie.json | sed "s/\"src_ip\":\"//" | sed "s/\"//" | sort | uniq -c | sort -nr | head -1 | awk "{print \$2}")
+EVENT_INDEX=/home/ec2-user/AWSHoneypot/02-Deployment-Scripts/log_event_index.py
+TOP_IP=$(sudo python3 $EVENT_INDEX top src_ip /opt/cowrie/var/log/cowrie/cowrie.json -n 1 | cut -f2)
 echo "Top attacker IP: $TOP_IP"
-grep "\"src_ip\":\"$TOP_IP\"" /opt/cowrie/var/log/cowrie/cowrie.json > /tmp/top_attacker.json
-sudo python3 /home/ec2-user/AWSHoneypot/02-Deployment-Scripts/logs2pcap.py /tmp/top_attacker.json /tmp/top_attacker.pcap
+sudo python3 $EVENT_INDEX query /opt/cowrie/var/log/cowrie/cowrie.json --src-ip "$TOP_IP" --pcap /tmp/top_attacker.pcap
 '
 
 # Download top attacker PCAP
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Heatmap Image - Headless PNG attacker heatmaps for Discord
+Bins attacker coordinates into a 2D histogram on an equirectangular grid,
+blurs and log-scales it with numpy, and draws it over world_land.png, a land
+mask bundled next to this script (Natural Earth 1:110m, public domain), so
+no browser, tile server or network access is needed. Only numpy is
+required; the PNG is encoded here with zlib.
+
+    render([(39.9, 116.4, 120), (55.7, 37.6, 45)], '/tmp/heatmap.png')
+
+Rebuild the basemap from a Natural Earth land or countries shapefile:
+
+    python3 heatmap_image.py --build-basemap ne_110m_admin_0_countries.shp
+"""
+
+import os
+import sys
+import zlib
+import struct
+import argparse
+
+import numpy as np
+
+BASEMAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'world_land.png')
+BASEMAP_SIZE = (1440, 720)  # 0.25 degrees per pixel
+LAT_RANGE = (-58.0, 84.0)   # rows kept in the output image (drops Antarctica)
+BLUR_PX = 5.0
+
+OCEAN = (13, 17, 23)
+LAND = (38, 45, 56)
+COAST = (70, 80, 96)
+# Heat colour ramp: (position, rgb)
+RAMP = ((0.0, (60, 10, 90)), (0.35, (180, 20, 80)), (0.65, (240, 90, 30)),
+        (0.85, (250, 190, 40)), (1.0, (255, 255, 200)))
+
+
+# -- PNG ---------------------------------------------------------------------
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_png(path, pixels):
+    """Write an (h, w) greyscale or (h, w, 3) RGB uint8 array as PNG"""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    colour_type = 2 if pixels.ndim == 3 else 0
+    rows = pixels.reshape(height, -1)
+    raw = np.hstack([np.zeros((height, 1), np.uint8), rows]).tobytes()  # filter 0 on every row
+    header = struct.pack('>IIBBBBB', width, height, 8, colour_type, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header)
+                + _chunk(b'IDAT', zlib.compress(raw, 9)) + _chunk(b'IEND', b''))
+
+
+def read_png(path):
+    """Read a PNG written by write_png (8-bit, unfiltered rows) back into an array"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError(f"{path} is not a PNG file")
+    pos, idat = 8, []
+    while pos < len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b'IHDR':
+            width, height, depth, colour_type = struct.unpack('>IIBB', body[:10])
+        elif kind == b'IDAT':
+            idat.append(body)
+        pos += 12 + length
+    channels = 3 if colour_type == 2 else 1
+    if depth != 8 or colour_type not in (0, 2):
+        raise ValueError(f"{path}: only 8-bit greyscale/RGB PNGs are supported")
+    rows = np.frombuffer(zlib.decompress(b''.join(idat)), np.uint8).reshape(height, 1 + width * channels)
+    if rows[:, 0].any():
+        raise ValueError(f"{path}: filtered rows are not supported")
+    pixels = rows[:, 1:].reshape(height, width, channels) if channels == 3 else rows[:, 1:]
+    return pixels.copy()
+
+
+# -- basemap -----------------------------------------------------------------
+
+def _shapefile_rings(path):
+    """Polygon rings [(lon, lat), ...] from an ESRI shapefile"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 100
+    while pos < len(data):
+        _, words = struct.unpack('>ii', data[pos:pos + 8])
+        content = data[pos + 8:pos + 8 + words * 2]
+        pos += 8 + words * 2
+        if struct.unpack('<i', content[:4])[0] != 5:  # polygons only
+            continue
+        num_parts, num_points = struct.unpack('<ii', content[36:44])
+        parts = list(struct.unpack(f'<{num_parts}i', content[44:44 + 4 * num_parts])) + [num_points]
+        points = np.frombuffer(content, '<f8', num_points * 2, 44 + 4 * num_parts).reshape(-1, 2)
+        for start, end in zip(parts, parts[1:]):
+            yield points[start:end]
+
+
+def build_basemap(shapefile, out=BASEMAP, size=BASEMAP_SIZE):
+    """Rasterise a land/countries shapefile into the greyscale land mask (even-odd fill)"""
+    width, height = size
+    toggles = np.zeros((height, width + 1), np.int32)
+    for ring in _shapefile_rings(shapefile):
+        x = (ring[:, 0] + 180.0) / 360.0 * width
+        y = (90.0 - ring[:, 1]) / 180.0 * height
+        for x0, y0, x1, y1 in zip(x[:-1], y[:-1], x[1:], y[1:]):
+            if y0 == y1:
+                continue
+            # pixel-centre rows this edge crosses, and where
+            rows = np.arange(np.ceil(min(y0, y1) - 0.5), np.ceil(max(y0, y1) - 0.5)).astype(int)
+            rows = rows[(rows >= 0) & (rows < height)]
+            cross = x0 + (rows + 0.5 - y0) * (x1 - x0) / (y1 - y0)
+            cols = np.clip(np.ceil(cross - 0.5), 0, width).astype(int)
+            np.add.at(toggles, (rows, cols), 1)
+    land = (np.cumsum(toggles, axis=1)[:, :width] % 2).astype(np.uint8) * 255
+    write_png(out, land)
+    return out
+
+
+# -- rendering ---------------------------------------------------------------
+
+def _blur(grid, sigma):
+    """Separable Gaussian blur; wraps around in longitude"""
+    radius = int(3 * sigma)
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    height, width = grid.shape
+    padded = np.concatenate([grid[:, -radius:], grid, grid[:, :radius]], axis=1)
+    out = sum(k * padded[:, i:i + width] for i, k in enumerate(kernel))
+    padded = np.pad(out, ((radius, radius), (0, 0)))
+    return sum(k * padded[i:i + height] for i, k in enumerate(kernel))
+
+
+def _ramp():
+    positions = np.linspace(0.0, 1.0, 256)
+    stops = np.array([p for p, _ in RAMP])
+    colours = np.array([c for _, c in RAMP], float)
+    return np.stack([np.interp(positions, stops, colours[:, i]) for i in range(3)], axis=1)
+
+
+def render(points, out_path, basemap=BASEMAP, blur_px=BLUR_PX, lat_range=LAT_RANGE):
+    """
+    Draw (lat, lon) or (lat, lon, weight) points as a heatmap PNG at out_path.
+    Returns the number of points drawn.
+    """
+    data = np.array([p if len(p) == 3 else (p[0], p[1], 1) for p in points
+                     if p[0] is not None and p[1] is not None], float).reshape(-1, 3)
+    land = read_png(basemap) > 127
+    height, width = land.shape
+
+    heat, _, _ = np.histogram2d(90.0 - data[:, 0], data[:, 1] + 180.0, bins=(height, width),
+                                range=((0.0, 180.0), (0.0, 360.0)), weights=data[:, 2])
+    heat = np.log1p(_blur(heat, blur_px) * blur_px ** 2)
+    if heat.max() > 0:
+        heat /= heat.max()
+
+    image = np.empty((height, width, 3), np.float32)
+    image[:] = OCEAN
+    image[land] = LAND
+    coast = land & ~(np.roll(land, 1, 0) & np.roll(land, -1, 0) & np.roll(land, 1, 1) & np.roll(land, -1, 1))
+    image[coast] = COAST
+
+    # faint heat fades into the map; strong cells are fully opaque
+    alpha = np.clip((heat - 0.05) * 2.0, 0.0, 1.0)[..., None]
+    colour = _ramp()[(heat * 255).astype(np.uint8)]
+    image = image * (1 - alpha) + colour * alpha
+
+    top = int((90.0 - lat_range[1]) / 180.0 * height)
+    bottom = int((90.0 - lat_range[0]) / 180.0 * height)
+    write_png(out_path, image[top:bottom].round().astype(np.uint8))
+    return len(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render attacker heatmap PNGs without a browser')
+    parser.add_argument('--build-basemap', metavar='SHP',
+                        help=f'Rebuild {os.path.basename(BASEMAP)} from a Natural Earth land/countries shapefile')
+    parser.add_argument('--points', metavar='JSON',
+                        help='Render a JSON list of [lat, lon] or [lat, lon, weight] ("-" for stdin)')
+    parser.add_argument('-o', '--output', default='attacker_heatmap.png', help='PNG to write (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.build_basemap:
+        print(f"Basemap written to {build_basemap(args.build_basemap)}")
+    elif args.points:
+        import json
+        with (sys.stdin if args.points == '-' else open(args.points)) as f:
+            drawn = render(json.load(f), args.output)
+        print(f"Heatmap of {drawn} points written to {args.output}")
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
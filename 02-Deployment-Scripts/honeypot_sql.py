@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Honeypot SQL - Embedded SQLite analytics over Cowrie events
+Loads cowrie.json (and rotations) incrementally into normalized tables
+(events, sessions, logins, commands, downloads) and answers the existing
+reports as named queries with cached results. Runs fully offline.
+
+Usage:
+    python3 honeypot_sql.py load /opt/cowrie/var/log/cowrie/
+    python3 honeypot_sql.py list
+    python3 honeypot_sql.py query top_passwords --param limit=20
+    python3 honeypot_sql.py query period_comparison --param split=2025-10-15
+    python3 honeypot_sql.py sql "SELECT username, count(*) FROM logins WHERE success GROUP BY 1 ORDER BY 2 DESC LIMIT 5"
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+
+from log_time_index import log_files, ts_to_epoch, parse_time
+import pipeline_profile
+
+DEFAULT_LOG_DIR = '/opt/cowrie/var/log/cowrie'
+SCHEMA_VERSION = 1
+COMMIT_EVERY = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+
+-- One row per log stream, keyed by its first line so a rotated (or gzipped)
+-- cowrie.json is recognised and only its unread tail is loaded
+CREATE TABLE IF NOT EXISTS sources (
+    first_line TEXT PRIMARY KEY, path TEXT, offset INTEGER, loaded_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY, ts INTEGER, eventid TEXT, session TEXT, src_ip TEXT, country TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_eventid ON events (eventid, ts);
+CREATE INDEX IF NOT EXISTS events_src_ip ON events (src_ip);
+CREATE INDEX IF NOT EXISTS events_session ON events (session);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY, src_ip TEXT, src_port INTEGER, dst_port INTEGER,
+    start_ts INTEGER, end_ts INTEGER, duration REAL, client_version TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_src_ip ON sessions (src_ip);
+CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start_ts);
+
+CREATE TABLE IF NOT EXISTS logins (
+    ts INTEGER, session TEXT, src_ip TEXT, username TEXT, password TEXT, success INTEGER
+);
+CREATE INDEX IF NOT EXISTS logins_ts ON logins (ts);
+CREATE INDEX IF NOT EXISTS logins_src_ip ON logins (src_ip);
+CREATE INDEX IF NOT EXISTS logins_username ON logins (username);
+CREATE INDEX IF NOT EXISTS logins_password ON logins (password);
+
+CREATE TABLE IF NOT EXISTS commands (ts INTEGER, session TEXT, src_ip TEXT, input TEXT);
+CREATE INDEX IF NOT EXISTS commands_ts ON commands (ts);
+CREATE INDEX IF NOT EXISTS commands_input ON commands (input);
+CREATE INDEX IF NOT EXISTS commands_session ON commands (session);
+
+CREATE TABLE IF NOT EXISTS downloads (
+    ts INTEGER, session TEXT, src_ip TEXT, url TEXT, outfile TEXT, shasum TEXT
+);
+CREATE INDEX IF NOT EXISTS downloads_ts ON downloads (ts);
+CREATE INDEX IF NOT EXISTS downloads_shasum ON downloads (shasum);
+
+CREATE TABLE IF NOT EXISTS query_cache (
+    name TEXT, params TEXT, data_version INTEGER, columns TEXT, rows TEXT,
+    PRIMARY KEY (name, params)
+);
+"""
+
+# Named reports. Params with a default of None are required; TIME_PARAMS
+# accept anything log_time_index.parse_time does ('7d', ISO date, epoch).
+QUERIES = {
+    'summary': {
+        'description': 'Headline totals (get_stats.py / final_project_stats.py overall block)',
+        'sql': """
+            SELECT (SELECT count(*) FROM events) AS total_events,
+                   (SELECT count(DISTINCT src_ip) FROM events) AS unique_ips,
+                   (SELECT count(*) FROM sessions) AS sessions,
+                   (SELECT count(*) FROM logins) AS login_attempts,
+                   (SELECT count(*) FROM logins WHERE success) AS successful_logins,
+                   (SELECT count(*) FROM logins WHERE NOT success) AS failed_logins,
+                   (SELECT count(*) FROM commands) AS commands_executed,
+                   (SELECT count(*) FROM downloads) AS file_downloads,
+                   (SELECT strftime('%Y-%m-%dT%H:%M:%SZ', min(ts), 'unixepoch') FROM events) AS first_event,
+                   (SELECT strftime('%Y-%m-%dT%H:%M:%SZ', max(ts), 'unixepoch') FROM events) AS last_event
+        """,
+        'params': {},
+    },
+    'top_ips': {
+        'description': 'Most active source IPs by event count',
+        'sql': "SELECT src_ip, count(*) AS events FROM events WHERE src_ip IS NOT NULL "
+               "GROUP BY src_ip ORDER BY events DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_usernames': {
+        'description': 'Most tried usernames (successful and failed logins)',
+        'sql': "SELECT username, count(*) AS attempts FROM logins GROUP BY username "
+               "ORDER BY attempts DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_passwords': {
+        'description': 'Most tried passwords (successful and failed logins)',
+        'sql': "SELECT password, count(*) AS attempts FROM logins GROUP BY password "
+               "ORDER BY attempts DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_combos': {
+        'description': 'Most common successful username:password pairs',
+        'sql': "SELECT username || ':' || password AS combo, count(*) AS logins FROM logins "
+               "WHERE success GROUP BY username, password ORDER BY logins DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_commands': {
+        'description': 'Most executed commands',
+        'sql': "SELECT input AS command, count(*) AS times FROM commands GROUP BY input "
+               "ORDER BY times DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_ssh_versions': {
+        'description': 'Most common SSH client versions',
+        'sql': "SELECT client_version, count(*) AS sessions FROM sessions WHERE client_version IS NOT NULL "
+               "GROUP BY client_version ORDER BY sessions DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'top_countries': {
+        'description': 'Event counts by country (when the log carries GeoIP data)',
+        'sql': "SELECT country, count(*) AS events FROM events WHERE country IS NOT NULL "
+               "GROUP BY country ORDER BY events DESC LIMIT :limit",
+        'params': {'limit': 10},
+    },
+    'daily': {
+        'description': 'Events, unique IPs and sessions per day',
+        'sql': "SELECT date(ts, 'unixepoch') AS day, count(*) AS events, count(DISTINCT src_ip) AS unique_ips, "
+               "count(DISTINCT session) AS sessions FROM events WHERE ts >= :start "
+               "GROUP BY day ORDER BY day",
+        'params': {'start': '0'},
+    },
+    'period_comparison': {
+        'description': 'Before/after a config change (cowrie_analysis_fixed.py)',
+        'sql': """
+            WITH periods AS (
+                SELECT 'Default Config' AS label, 0 AS lo, :split AS hi
+                UNION ALL SELECT 'Custom Config', :split, 1 << 62
+            )
+            SELECT label,
+                   (SELECT count(*) FROM events WHERE ts >= lo AND ts < hi) AS total_events,
+                   (SELECT count(DISTINCT src_ip) FROM events WHERE ts >= lo AND ts < hi) AS unique_ips,
+                   round(coalesce(100.0 * (SELECT count(*) FROM logins WHERE success AND ts >= lo AND ts < hi)
+                         / nullif((SELECT count(*) FROM logins WHERE ts >= lo AND ts < hi), 0), 0), 2) AS success_rate,
+                   round(coalesce(1.0 * (SELECT count(*) FROM commands WHERE ts >= lo AND ts < hi)
+                         / nullif((SELECT count(DISTINCT session) FROM events WHERE ts >= lo AND ts < hi), 0), 0), 2)
+                       AS avg_commands_per_session
+            FROM periods
+        """,
+        'params': {'split': '2025-10-15'},
+    },
+    'ip_activity': {
+        'description': 'Everything one IP did: sessions, logins, commands, downloads',
+        'sql': """
+            SELECT (SELECT count(*) FROM sessions WHERE src_ip = :ip) AS sessions,
+                   (SELECT strftime('%Y-%m-%dT%H:%M:%SZ', min(ts), 'unixepoch') FROM events WHERE src_ip = :ip) AS first_seen,
+                   (SELECT strftime('%Y-%m-%dT%H:%M:%SZ', max(ts), 'unixepoch') FROM events WHERE src_ip = :ip) AS last_seen,
+                   (SELECT count(*) FROM logins WHERE src_ip = :ip) AS login_attempts,
+                   (SELECT count(*) FROM logins WHERE src_ip = :ip AND success) AS successful_logins,
+                   (SELECT count(*) FROM commands WHERE src_ip = :ip) AS commands,
+                   (SELECT count(*) FROM downloads WHERE src_ip = :ip) AS downloads
+        """,
+        'params': {'ip': None},
+    },
+}
+
+TIME_PARAMS = {'split', 'start'}
+
+
+def default_db_path():
+    return os.getenv("HONEYPOT_DB", os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "events.sqlite"))
+
+
+def connect(path=None):
+    """Open (and create if needed) the analytics database"""
+    path = path or default_db_path()
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+    conn.execute("INSERT OR IGNORE INTO meta VALUES ('data_version', '0')")
+    conn.commit()
+    return conn
+
+
+def data_version(conn):
+    return int(conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0])
+
+
+def _epoch(timestamp):
+    try:
+        return ts_to_epoch(timestamp)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+SESSION_UPSERT = """
+    INSERT INTO sessions (session, src_ip, src_port, dst_port, start_ts, end_ts, duration, client_version)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (session) DO UPDATE SET
+        src_ip = coalesce(sessions.src_ip, excluded.src_ip),
+        src_port = coalesce(sessions.src_port, excluded.src_port),
+        dst_port = coalesce(sessions.dst_port, excluded.dst_port),
+        start_ts = coalesce(sessions.start_ts, excluded.start_ts),
+        end_ts = coalesce(excluded.end_ts, sessions.end_ts),
+        duration = coalesce(excluded.duration, sessions.duration),
+        client_version = coalesce(excluded.client_version, sessions.client_version)
+"""
+
+
+class Batch:
+    """Rows for one commit, split by table"""
+
+    def __init__(self):
+        self.events, self.sessions, self.logins = [], [], []
+        self.commands, self.downloads = [], []
+
+    def add(self, event):
+        ts = _epoch(event.get('timestamp'))
+        eventid = event.get('eventid')
+        session = event.get('session')
+        src_ip = event.get('src_ip')
+        geoip = event.get('geoip')
+        country = event.get('country') or (geoip.get('country_name') if isinstance(geoip, dict) else None)
+        self.events.append((ts, eventid, session, src_ip, country))
+
+        if eventid in ('cowrie.login.success', 'cowrie.login.failed'):
+            self.logins.append((ts, session, src_ip, event.get('username'), event.get('password'),
+                                int(eventid == 'cowrie.login.success')))
+        elif eventid == 'cowrie.command.input':
+            self.commands.append((ts, session, src_ip, event.get('input')))
+        elif eventid == 'cowrie.session.file_download':
+            self.downloads.append((ts, session, src_ip, event.get('url'), event.get('outfile'),
+                                   event.get('shasum')))
+
+        if session:
+            if eventid == 'cowrie.session.connect':
+                self.sessions.append((session, src_ip, event.get('src_port'), event.get('dst_port'),
+                                      ts, None, None, None))
+            elif eventid == 'cowrie.session.closed':
+                self.sessions.append((session, src_ip, None, None, None, ts, event.get('duration'), None))
+            elif eventid == 'cowrie.client.version':
+                self.sessions.append((session, src_ip, None, None, None, None, None, event.get('version')))
+
+    def __len__(self):
+        return len(self.events)
+
+    def write(self, conn):
+        conn.executemany("INSERT INTO events (ts, eventid, session, src_ip, country) VALUES (?, ?, ?, ?, ?)",
+                         self.events)
+        conn.executemany(SESSION_UPSERT, self.sessions)
+        conn.executemany("INSERT INTO logins VALUES (?, ?, ?, ?, ?, ?)", self.logins)
+        conn.executemany("INSERT INTO commands VALUES (?, ?, ?, ?)", self.commands)
+        conn.executemany("INSERT INTO downloads VALUES (?, ?, ?, ?, ?, ?)", self.downloads)
+        self.__init__()
+
+
+def _open_log(path):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def load_file(conn, path):
+    """Load the unread part of one log; returns the number of new events"""
+    with _open_log(path) as f:
+        first = f.readline()
+        if not first.endswith(b'\n'):
+            return 0  # empty, or first event still being written
+        first_line = hashlib.sha1(first).hexdigest()
+        row = conn.execute("SELECT offset FROM sources WHERE first_line = ?", (first_line,)).fetchone()
+        offset = start = row[0] if row else 0
+        f.seek(offset)
+
+        batch = Batch()
+        loaded = 0
+        # Stage hooks for --profile (the plain callables when not profiling)
+        loads = pipeline_profile.wrap("decode", json.loads)
+        add = pipeline_profile.wrap("aggregate", batch.add)
+        commit = pipeline_profile.wrap("write", _commit)
+        for line in pipeline_profile.wrap_iter("read", f):
+            if not line.endswith(b'\n'):
+                break  # partial line still being written
+            try:
+                event = loads(line)
+            except ValueError:
+                event = None
+            offset += len(line)
+            if not isinstance(event, dict):
+                continue
+            add(event)
+            if len(batch) >= COMMIT_EVERY:
+                loaded += len(batch)
+                commit(conn, batch, first_line, path, offset)
+        loaded += len(batch)
+        commit(conn, batch, first_line, path, offset)
+    pipeline_profile.count(events=loaded, bytes=offset - start)
+    return loaded
+
+
+def _commit(conn, batch, first_line, path, offset):
+    # Rows and the new offset land in one transaction, so an interrupted
+    # load resumes exactly where it stopped
+    with conn:
+        if len(batch):
+            batch.write(conn)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+        conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (first_line, path, offset, time.time()))
+
+
+def load(conn, paths=None, verbose=False):
+    """Incrementally load Cowrie logs (files or log directories); returns new event count"""
+    total = 0
+    for path in log_files(paths or [DEFAULT_LOG_DIR]):
+        started = time.time()
+        try:
+            count = load_file(conn, path)
+        except OSError as e:
+            print(f"Warning: could not read {path}: {e}", file=sys.stderr)
+            continue
+        total += count
+        if verbose:
+            print(f"{path}: {count:,} new events ({time.time() - started:.1f}s)")
+    if total:
+        conn.execute("ANALYZE")
+    return total
+
+
+def run_query(conn, name, use_cache=True, **params):
+    """
+    Run a named query; returns (columns, rows).
+
+    Results are cached in the database and reused until new events are loaded.
+    """
+    if name not in QUERIES:
+        raise KeyError(f"Unknown query '{name}' (see 'honeypot_sql.py list')")
+    spec = QUERIES[name]
+    bound = dict(spec['params'])
+    bound.update({k: v for k, v in params.items() if v is not None})
+    missing = [k for k, v in bound.items() if v is None]
+    if missing:
+        raise ValueError(f"Query '{name}' needs: {', '.join(missing)}")
+    for key in TIME_PARAMS & set(bound):
+        bound[key] = parse_time(str(bound[key]))
+
+    key = json.dumps(bound, sort_keys=True)
+    version = data_version(conn)
+    if use_cache:
+        row = conn.execute("SELECT columns, rows FROM query_cache WHERE name = ? AND params = ? AND data_version = ?",
+                           (name, key, version)).fetchone()
+        if row:
+            return json.loads(row[0]), [tuple(r) for r in json.loads(row[1])]
+
+    cursor = conn.execute(spec['sql'], bound)
+    columns = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?)",
+                     (name, key, version, json.dumps(columns), json.dumps(rows)))
+    return columns, rows
+
+
+def format_table(columns, rows):
+    """Plain-text table for the terminal"""
+    cells = [[str(c) for c in columns]] + [["" if v is None else str(v) for v in row] for row in rows]
+    widths = [min(max(len(r[i]) for r in cells), 60) for i in range(len(columns))]
+    lines = []
+    for n, row in enumerate(cells):
+        lines.append("  ".join(v[:60].ljust(w) for v, w in zip(row, widths)).rstrip())
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def _parse_params(pairs):
+    params = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise SystemExit(f"--param expects key=value, got '{pair}'")
+        params[key] = int(value) if value.isdigit() and key == 'limit' else value
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Embedded SQL analytics over Cowrie logs')
+    parser.add_argument('--db', default=None, help=f'Database path (default: $HONEYPOT_DB or {default_db_path()})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ld = sub.add_parser('load', help='Load new events from Cowrie logs')
+    ld.add_argument('paths', nargs='*', help=f'Log files or directories (default: {DEFAULT_LOG_DIR})')
+
+    sub.add_parser('list', help='List the named queries')
+
+    q = sub.add_parser('query', help='Run a named query')
+    q.add_argument('name', choices=sorted(QUERIES))
+    q.add_argument('--param', action='append', metavar='KEY=VALUE', help='Query parameter (repeatable)')
+    q.add_argument('--load', nargs='*', metavar='PATH', help='Load new events first (default log dir if no paths)')
+    q.add_argument('--no-cache', action='store_true', help='Ignore cached results')
+    q.add_argument('--json', action='store_true', help='Print rows as JSON objects')
+
+    s = sub.add_parser('sql', help='Run an ad-hoc SQL statement')
+    s.add_argument('statement')
+    s.add_argument('--json', action='store_true', help='Print rows as JSON objects')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "honeypot_sql"):
+        if args.command == 'list':
+            for name in sorted(QUERIES):
+                spec = QUERIES[name]
+                params = ", ".join(f"{k}={v}" if v is not None else k for k, v in spec['params'].items())
+                print(f"{name:20s} {spec['description']}" + (f"  [{params}]" if params else ""))
+            return
+
+        conn = connect(args.db)
+        started = time.time()
+        if args.command == 'load':
+            count = load(conn, args.paths, verbose=True)
+            print(f"Loaded {count:,} new events in {time.time() - started:.1f}s")
+            return
+
+        if args.command == 'query':
+            if args.load is not None:
+                load(conn, args.load)
+                started = time.time()
+            try:
+                columns, rows = run_query(conn, args.name, use_cache=not args.no_cache, **_parse_params(args.param))
+            except (KeyError, ValueError) as e:
+                raise SystemExit(str(e))
+        else:
+            try:
+                cursor = conn.execute(args.statement)
+            except sqlite3.Error as e:
+                raise SystemExit(f"SQL error: {e}")
+            columns = [d[0] for d in cursor.description or []]
+            rows = cursor.fetchall()
+            conn.commit()
+
+        if args.json:
+            for row in rows:
+                print(json.dumps(dict(zip(columns, row))))
+        elif columns:
+            print(format_table(columns, rows))
+        print(f"{len(rows)} rows in {(time.time() - started) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
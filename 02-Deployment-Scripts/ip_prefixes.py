@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+IP Prefixes - Roll attacker IPs up into the networks and ASNs behind them
+Scanning farms rotate through whole /24s, so per-IP top tables split one
+operation into hundreds of small rows. PrefixAggregator counts events per
+network at a few prefix lengths (/24 and /16 for IPv4, /48 for IPv6) and, with
+an offline prefix-to-ASN table loaded into a Patricia trie, per ASN, in the
+same pass as the per-IP counts. Each distinct IP is resolved once and then
+served from a cache, so add() costs a dict lookup per event.
+
+ASN tables are read from any of (plain or .gz):
+
+    1.0.0.0/24  13335  [name]            pyasn / routeviews prefix dumps
+    1.0.0.0  24  13335                   CAIDA pfx2as
+    1.0.0.0  1.0.0.255  13335  US  NAME  iptoasn.com ip2asn-*.tsv ranges
+
+    python3 ip_prefixes.py --log /opt/cowrie/var/log/cowrie/ --asn-table ip2asn-combined.tsv.gz
+    python3 ip_prefixes.py --asn-table ip2asn-combined.tsv.gz --lookup 203.0.113.9
+"""
+
+import os
+import sys
+import socket
+import argparse
+from collections import Counter
+
+import pipeline_profile
+
+DEFAULT_LENGTHS = (24, 16)
+DEFAULT_LENGTHS6 = (48,)
+CACHE_SIZE = 1 << 18   # distinct IPs remembered before the cache starts over
+ASN_ROLLUP = 'ASN'
+
+
+def parse_ip(text):
+    """(4 or 6, address as int) for an IP string, or None; IPv4-mapped IPv6 counts as IPv4"""
+    try:
+        if ':' not in text:
+            if text.count('.') != 3:
+                return None  # inet_aton would take '10.1' too
+            return 4, int.from_bytes(socket.inet_aton(text), 'big')
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, text.split('%', 1)[0]), 'big')
+    except (OSError, TypeError, ValueError):
+        return None
+    if value >> 32 == 0xffff:
+        return 4, value & 0xffffffff
+    return 6, value
+
+
+def network_label(version, network, length):
+    """'203.0.113.0/24' / '2001:db8::/48' for a network int"""
+    if version == 4:
+        return f"{socket.inet_ntoa(network.to_bytes(4, 'big'))}/{length}"
+    return f"{socket.inet_ntop(socket.AF_INET6, network.to_bytes(16, 'big'))}/{length}"
+
+
+def network_of(ip, length=DEFAULT_LENGTHS[0], length6=DEFAULT_LENGTHS6[0]):
+    """Label of the /length (IPv4) or /length6 (IPv6) network containing ip, or None"""
+    parsed = parse_ip(ip)
+    if parsed is None:
+        return None
+    version, value = parsed
+    bits, length = (32, length) if version == 4 else (128, length6)
+    return network_label(version, value >> (bits - length) << (bits - length), length)
+
+
+def parse_cidr(text):
+    """(version, network int, length) for '198.51.100.0/24' (or a bare address)"""
+    address, _, length = text.strip().partition('/')
+    parsed = parse_ip(address)
+    if parsed is None:
+        raise ValueError(f"Not an IP network: {text!r}")
+    version, value = parsed
+    bits = 32 if version == 4 else 128
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError(f"Bad prefix length in {text!r}")
+    return version, value >> (bits - length) << (bits - length), length
+
+
+class _Node:
+    __slots__ = ('key', 'length', 'value', 'zero', 'one')
+
+    def __init__(self, key, length, value=None):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.zero = self.one = None
+
+
+class PrefixTrie:
+    """
+    Path-compressed binary (Patricia) trie of prefixes of a bits-wide address
+    space. Nodes exist only where stored prefixes branch, so a longest-prefix
+    lookup visits at most one node per distinct branching point on the path
+    (about 20 for a full IPv4 routing table), not one per bit.
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = _Node(0, 0)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _bit(self, key, position):
+        return (key >> (self.bits - 1 - position)) & 1
+
+    def _attach(self, parent, child):
+        if self._bit(child.key, parent.length):
+            parent.one = child
+        else:
+            parent.zero = child
+
+    def insert(self, network, length, value):
+        """Store value for network/length (network int with the host bits zero)"""
+        bits = self.bits
+        node = self.root
+        while True:
+            if length == node.length:
+                self._len += node.value is None
+                node.value = value
+                return
+            child = node.one if self._bit(network, node.length) else node.zero
+            if child is None:
+                self._attach(node, _Node(network, length, value))
+                self._len += 1
+                return
+            # bits shared by the new prefix and the child's, up to the shorter of the two
+            shortest = min(length, child.length)
+            diff = network ^ child.key
+            common = min(bits - diff.bit_length(), shortest) if diff else shortest
+            if common == child.length:
+                node = child
+                continue
+            if common == length:
+                new = _Node(network, length, value)
+            else:
+                new = _Node(network >> (bits - common) << (bits - common), common)
+                self._attach(new, _Node(network, length, value))
+            self._attach(new, child)
+            self._attach(node, new)
+            self._len += 1
+            return
+
+    def lookup(self, address):
+        """(network, length, value) of the longest stored prefix containing address, or None"""
+        bits = self.bits
+        node, best = self.root, None
+        while node is not None:
+            length = node.length
+            if length and (address ^ node.key) >> (bits - length):
+                break
+            if node.value is not None:
+                best = node
+            if length == bits:
+                break
+            node = node.one if (address >> (bits - 1 - length)) & 1 else node.zero
+        return (best.key, best.length, best.value) if best is not None else None
+
+
+class PrefixTable:
+    """IPv4 and IPv6 prefix tries behind one longest-prefix lookup by IP string"""
+
+    def __init__(self):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+
+    def __len__(self):
+        return len(self.tries[4]) + len(self.tries[6])
+
+    def insert(self, cidr, value):
+        version, network, length = parse_cidr(cidr)
+        self.tries[version].insert(network, length, value)
+
+    def insert_range(self, first, last, value):
+        """Store value for the smallest set of prefixes covering first..last (IP strings)"""
+        start, end = parse_ip(first), parse_ip(last)
+        if start is None or end is None or start[0] != end[0]:
+            raise ValueError(f"Bad range {first} - {last}")
+        version, start, end = start[0], start[1], end[1]
+        bits = 32 if version == 4 else 128
+        trie = self.tries[version]
+        while start <= end:
+            # largest aligned block starting here that fits in the range
+            size = min((start & -start).bit_length() - 1 if start else bits, (end - start + 1).bit_length() - 1)
+            trie.insert(start, bits - size, value)
+            start += 1 << size
+
+    def lookup(self, ip):
+        """(network label, value) of the longest prefix containing ip, or None"""
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return None
+        version, address = parsed
+        found = self.tries[version].lookup(address)
+        if found is None:
+            return None
+        network, length, value = found
+        return network_label(version, network, length), value
+
+
+def _asn_label(asn, name=''):
+    asn = asn.split('_')[0].split(',')[0].upper().removeprefix('AS')  # MOAS "13335_209242" -> first
+    if not asn.isdigit() or asn == '0':
+        return None  # "Not routed" and the like
+    return f"AS{asn} {name}".strip()
+
+
+def load_asn_table(path):
+    """PrefixTable of 'AS<n> [name]' labels from a pyasn, CAIDA pfx2as or iptoasn.com file"""
+    from log_scan import open_log
+
+    table = PrefixTable()
+    with open_log(path) as f:
+        for line_num, raw in enumerate(f, 1):
+            line = raw.decode('utf-8', 'replace').strip()
+            if not line or line.startswith(('#', ';')):
+                continue
+            fields = line.split('\t') if '\t' in line else line.split()
+            try:
+                if '/' in fields[0]:                       # prefix/len asn [name]
+                    label = _asn_label(fields[1], ' '.join(fields[2:]))
+                    if label:
+                        table.insert(fields[0], label)
+                elif fields[1].isdigit():                  # address len asn
+                    label = _asn_label(fields[2])
+                    if label:
+                        table.insert(f"{fields[0]}/{fields[1]}", label)
+                else:                                      # first last asn country name
+                    label = _asn_label(fields[2], fields[4] if len(fields) > 4 else '')
+                    if label:
+                        table.insert_range(fields[0], fields[1], label)
+            except (IndexError, ValueError):
+                print(f"Warning: {path}:{line_num}: unrecognised line skipped", file=sys.stderr)
+    return table
+
+
+class PrefixAggregator:
+    """
+    Events (and, with track_ips, distinct IPs) per network and per ASN.
+    table is the counting container per rollup: Counter, or a
+    stream_sketches.SpaceSaving factory for fixed memory.
+    """
+
+    def __init__(self, lengths=DEFAULT_LENGTHS, lengths6=DEFAULT_LENGTHS6, asn_table=None,
+                 table=Counter, track_ips=True, cache_size=CACHE_SIZE):
+        self.lengths = tuple(sorted(lengths, reverse=True))
+        self.lengths6 = tuple(sorted(lengths6, reverse=True))
+        self.asn_table = asn_table
+        self.rollups = ([f"/{n}" for n in self.lengths] + [f"IPv6 /{n}" for n in self.lengths6]
+                        + ([ASN_ROLLUP] if asn_table is not None else []))
+        self.events = {rollup: table() for rollup in self.rollups}
+        self.ips = {rollup: Counter() for rollup in self.rollups} if track_ips else None
+        self.cache_size = cache_size
+        self._cache = {}
+        self._seen = set() if track_ips else None
+
+    def networks(self, ip):
+        """((rollup, label), ...) for ip; empty for anything that is not an IP"""
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return ()
+        version, address = parsed
+        bits, lengths, prefix = (32, self.lengths, '/') if version == 4 else (128, self.lengths6, 'IPv6 /')
+        keys = [(f"{prefix}{n}", network_label(version, address >> (bits - n) << (bits - n), n)) for n in lengths]
+        if self.asn_table is not None:
+            found = self.asn_table.tries[version].lookup(address)
+            if found is not None:
+                keys.append((ASN_ROLLUP, found[2]))
+        return tuple(keys)
+
+    def add(self, ip, weight=1):
+        """Count weight events from ip"""
+        keys = self._cache.get(ip)
+        if keys is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            keys = self._cache[ip] = self.networks(ip)
+            if self._seen is not None and ip not in self._seen:
+                self._seen.add(ip)
+                for rollup, label in keys:
+                    self.ips[rollup][label] += 1
+        events = self.events
+        for rollup, label in keys:
+            events[rollup][label] += weight
+
+    def update(self, ip_counts):
+        """Add a whole {ip: events} table (e.g. from the SQL store)"""
+        for ip, count in ip_counts.items():
+            self.add(ip, count)
+
+    @classmethod
+    def from_tables(cls, events):
+        """Aggregator over already-counted {rollup: table} (e.g. from a saved sketch); counts only, no lookups"""
+        aggregator = cls((), (), None, track_ips=False)
+        aggregator.rollups = list(events)
+        aggregator.events = dict(events)
+        return aggregator
+
+    def merge(self, other):
+        """Combine another file's or sensor's rollups (in place); distinct IPs can't be merged and are dropped"""
+        for rollup in other.rollups:
+            theirs = other.events[rollup]
+            if rollup not in self.events:
+                self.rollups.append(rollup)
+                self.events[rollup] = theirs
+            elif isinstance(self.events[rollup], Counter):
+                self.events[rollup].update(theirs)
+            else:
+                self.events[rollup].merge(theirs)
+        self.ips = None
+        self._seen = None
+        return self
+
+    def most_common(self, rollup, n=10):
+        """[(network or ASN, events, distinct IPs or None), ...] for one rollup"""
+        ips = self.ips[rollup] if self.ips is not None else None
+        return [(label, count, ips[label] if ips is not None else None)
+                for label, count in self.events[rollup].most_common(n)]
+
+    def __bool__(self):
+        return any(self.events.values())
+
+
+def parse_lengths(text):
+    """'24,16' -> (24, 16)"""
+    return tuple(int(n) for n in text.split(',') if n.strip()) if text else ()
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('network rollups')
+    group.add_argument('--prefix-lengths', default=','.join(map(str, DEFAULT_LENGTHS)), metavar='N,N',
+                       help='IPv4 prefix lengths to aggregate attackers by (default: %(default)s; empty for none)')
+    group.add_argument('--prefix6-lengths', default=','.join(map(str, DEFAULT_LENGTHS6)), metavar='N,N',
+                       help='IPv6 prefix lengths (default: %(default)s)')
+    group.add_argument('--asn-table', default=os.getenv('PATRIOTPOT_ASN_TABLE'), metavar='PATH',
+                       help='Offline prefix-to-ASN table for per-ASN rollups (default: $PATRIOTPOT_ASN_TABLE)')
+
+
+def asn_table_from_args(args):
+    if not args.asn_table:
+        return None
+    with pipeline_profile.stage("load"):
+        return load_asn_table(args.asn_table)
+
+
+def from_args(args, **kwargs):
+    """PrefixAggregator for the parsed arguments, or None if no rollup is asked for"""
+    lengths, lengths6 = parse_lengths(args.prefix_lengths), parse_lengths(args.prefix6_lengths)
+    asn_table = asn_table_from_args(args)
+    if not lengths and not lengths6 and asn_table is None:
+        return None
+    return PrefixAggregator(lengths, lengths6, asn_table, **kwargs)
+
+
+def format_rollup(aggregator, rollup, n=10):
+    """Plain-text top-n table for one rollup"""
+    lines = []
+    for i, (label, events, ips) in enumerate(aggregator.most_common(rollup, n), 1):
+        from_ips = f" from {ips:,} IP{'s' if ips != 1 else ''}" if ips is not None else ""
+        lines.append(f"{i:2d}. {label[:40]:40s} - {events:,} events{from_ips}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Aggregate attacker IPs by network prefix and ASN')
+    parser.add_argument('--log', nargs='+', help="Cowrie JSON logs, log directories, spools or '-' to aggregate")
+    parser.add_argument('--lookup', nargs='+', metavar='IP', help='Longest-prefix ASN lookup for these IPs')
+    parser.add_argument('-n', '--top', type=int, default=10, help='Rows per rollup (default: %(default)s)')
+    add_arguments(parser)
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.log and not args.lookup:
+        parser.error('give --log and/or --lookup')
+
+    with pipeline_profile.profiled(args, "ip_prefixes"):
+        aggregator = from_args(args)
+        if args.lookup:
+            if aggregator is None or aggregator.asn_table is None:
+                parser.error('--lookup needs --asn-table')
+            for ip in args.lookup:
+                found = aggregator.asn_table.lookup(ip)
+                print(f"{ip}\t{found[0]}\t{found[1]}" if found else f"{ip}\t-\tnot routed")
+        if args.log and aggregator is not None:
+            from event_records import iter_events
+            add = pipeline_profile.wrap("aggregate", aggregator.add)
+            events = 0
+            for event in pipeline_profile.wrap_iter("read", iter_events(args.log)):
+                if event.get('src_ip'):
+                    add(event['src_ip'])
+                events += 1
+            pipeline_profile.count(events=events)
+            for rollup in aggregator.rollups:
+                if aggregator.events[rollup]:
+                    print(f"\nTop {args.top} by {rollup}:")
+                    print(format_rollup(aggregator, rollup, args.top))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Log Archive - Streaming, parallel, resumable archives of the Cowrie logs
+Files are streamed straight from the log directories into a tar stream (no
+staging copy). The stream is cut into fixed-size frames that are
+compressed in parallel threads, each frame a separate gzip member
+(pigz-style), so the output is an ordinary .tar.gz that `tar -xzf`
+reads. SHA-256 of each file is taken while tar reads it, in the same pass.
+
+The JSON manifest next to the archive lists every file (size, mtime,
+sha256, offset in the tar stream) and every frame, so `extract` pulls out
+one file or one day by decompressing only the frames that hold it. The
+manifest is also the checkpoint: an interrupted `create` with the same
+archive and manifest truncates back to the last checkpoint and continues.
+
+Usage:
+    python3 log_archive.py create /tmp/cowrie_logs.tar.gz cowrie_logs=/opt/cowrie/var/log/cowrie
+    python3 log_archive.py list /tmp/cowrie_logs.tar.gz
+    python3 log_archive.py extract /tmp/cowrie_logs.tar.gz --day 2025-10-23 -C /tmp/restore
+"""
+
+import io
+import os
+import sys
+import json
+import zlib
+import bisect
+import fnmatch
+import hashlib
+import tarfile
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import pipeline_profile
+
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+DEFAULT_FRAME_BYTES = 4 * 1024 * 1024
+DEFAULT_CHECKPOINT_BYTES = 64 * 1024 * 1024
+DEFAULT_LEVEL = 6
+READ_BYTES = 1024 * 1024
+
+
+def _gzip_frame(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    return compressor.compress(data) + compressor.flush()
+
+
+class FrameWriter:
+    """
+    Write-only file object: buffers the tar stream and emits one gzip member
+    per frame_bytes, compressed on a thread pool and written in order
+    """
+
+    def __init__(self, f, frames, digest, offset=0, archive_bytes=0,
+                 frame_bytes=DEFAULT_FRAME_BYTES, level=DEFAULT_LEVEL, workers=None):
+        self.f = f
+        self.frames = frames          # [[tar offset, archive offset], ...]
+        self.digest = digest          # sha256 of the compressed archive so far
+        self.offset = offset          # tar stream bytes accepted
+        self.archive_bytes = archive_bytes
+        self.frame_bytes = frame_bytes
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='log-archive')
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.buffer_offset = offset   # tar offset of buffer[0]
+
+    def write(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        while len(self.buffer) >= self.frame_bytes:
+            self._submit(bytes(self.buffer[:self.frame_bytes]))
+            del self.buffer[:self.frame_bytes]
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def _submit(self, block):
+        self.pending.append((self.buffer_offset, self.pool.submit(_gzip_frame, block, self.level)))
+        self.buffer_offset += len(block)
+        while len(self.pending) > 2 * self.workers:
+            self._drain_one()
+
+    def _drain_one(self):
+        start, future = self.pending.popleft()
+        data = future.result()
+        self.frames.append([start, self.archive_bytes])
+        self.f.write(data)
+        self.digest.update(data)
+        self.archive_bytes += len(data)
+
+    def flush(self):
+        """Compress what is buffered as a (short) frame and write everything out"""
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.pending:
+            self._drain_one()
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+        self.pool.shutdown()
+
+
+class _HashingReader:
+    """File wrapper that hashes what tarfile reads from it"""
+
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def default_manifest(archive):
+    return archive + MANIFEST_SUFFIX
+
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(path, manifest):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+def iter_sources(specs):
+    """(arcname, path) for every file under [ARCNAME=]PATH specs, in a stable order"""
+    for spec in specs:
+        name, sep, path = spec.partition('=')
+        if not sep or not name or os.path.exists(spec):
+            name, path = os.path.basename(os.path.normpath(spec)), spec
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    full = os.path.join(root, filename)
+                    yield os.path.join(name, os.path.relpath(full, path)).replace(os.sep, '/'), full
+        else:
+            yield name, path
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BYTES)
+            if not block:
+                return digest
+            digest.update(block)
+
+
+def create(archive, sources, manifest_path=None, frame_bytes=DEFAULT_FRAME_BYTES, level=DEFAULT_LEVEL,
+           workers=None, checkpoint_bytes=DEFAULT_CHECKPOINT_BYTES, fresh=False, log=print):
+    """Archive sources, resuming an interrupted run of the same archive unless fresh; returns the manifest"""
+    manifest_path = manifest_path or default_manifest(archive)
+    manifest = None
+    if not fresh and os.path.exists(manifest_path) and os.path.exists(archive):
+        manifest = load_manifest(manifest_path)
+        if manifest.get('complete'):
+            log(f"{archive} is already complete (use --fresh to rebuild)")
+            return manifest
+        log(f"Resuming {archive}: {len(manifest['files'])} files, "
+            f"{manifest['archive_bytes']:,} bytes already archived")
+    if manifest is None:
+        manifest = {'version': MANIFEST_VERSION, 'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'complete': False, 'frame_bytes': frame_bytes, 'tar_offset': 0, 'archive_bytes': 0,
+                    'frames': [], 'files': []}
+
+    f = open(archive, 'r+b' if manifest['archive_bytes'] else 'wb')
+    f.truncate(manifest['archive_bytes'])  # drop whatever was written after the last checkpoint
+    digest = _sha256_file(archive) if manifest['archive_bytes'] else hashlib.sha256()
+    f.seek(manifest['archive_bytes'])
+
+    done = {entry['path'] for entry in manifest['files']}
+    frames = manifest['frames']
+    writer = FrameWriter(f, frames, digest, manifest['tar_offset'], manifest['archive_bytes'],
+                         manifest['frame_bytes'], level, workers)
+    tar = tarfile.TarFile(fileobj=writer, mode='w', format=tarfile.PAX_FORMAT)
+    unsaved = []
+    last_checkpoint = writer.offset
+
+    def checkpoint():
+        writer.flush()
+        manifest['files'].extend(unsaved)
+        unsaved.clear()
+        manifest['tar_offset'] = writer.offset
+        manifest['archive_bytes'] = writer.archive_bytes
+        _save_manifest(manifest_path, manifest)
+
+    try:
+        for arcname, path in iter_sources(sources):
+            if arcname in done:
+                continue
+            try:
+                source = open(path, 'rb')
+            except OSError as e:
+                log(f"Skipping {path}: {e}")
+                continue
+            with source:
+                # size taken now: a live log keeps growing, the archive keeps this snapshot
+                info = tar.gettarinfo(arcname=arcname, fileobj=source)
+                file_digest = hashlib.sha256()
+                with pipeline_profile.stage("read"):
+                    tar.addfile(info, _HashingReader(source, file_digest))
+            unsaved.append({'path': arcname, 'size': info.size, 'mtime': int(info.mtime),
+                            'sha256': file_digest.hexdigest(),
+                            'offset': tar.offset - tarfile.BLOCKSIZE * -(-info.size // tarfile.BLOCKSIZE)})
+            pipeline_profile.count(events=1, bytes=info.size)
+            if writer.offset - last_checkpoint >= checkpoint_bytes:
+                checkpoint()
+                last_checkpoint = writer.offset
+        tar.close()  # end-of-archive blocks
+        writer.close()
+        manifest['complete'] = True
+        manifest['sha256'] = digest.hexdigest()
+        checkpoint()
+    except BaseException:
+        # whatever reached the last checkpoint is kept for the next run
+        writer.pool.shutdown(cancel_futures=True)
+        raise
+    finally:
+        f.close()
+    return manifest
+
+
+def _select(manifest, patterns=None, day=None):
+    for entry in manifest['files']:
+        if patterns and not any(fnmatch.fnmatch(entry['path'], p) or fnmatch.fnmatch(os.path.basename(entry['path']), p)
+                                for p in patterns):
+            continue
+        if day and day not in os.path.basename(entry['path']):
+            if datetime.fromtimestamp(entry['mtime'], timezone.utc).strftime('%Y-%m-%d') != day:
+                continue
+        yield entry
+
+
+def read_member(archive, manifest, entry):
+    """One archived file's bytes, decompressing only the frames that hold it (sha256-checked)"""
+    frames = manifest['frames']
+    starts = [start for start, _ in frames]
+    begin, end = entry['offset'], entry['offset'] + entry['size']
+    i = max(bisect.bisect_right(starts, begin) - 1, 0)
+    out = io.BytesIO()
+    with open(archive, 'rb') as f:
+        while i < len(frames) and frames[i][0] < end:
+            start, position = frames[i]
+            stop = frames[i + 1][1] if i + 1 < len(frames) else manifest['archive_bytes']
+            f.seek(position)
+            data = zlib.decompress(f.read(stop - position), 31)
+            out.write(data[max(begin - start, 0):max(end - start, 0)])
+            i += 1
+    data = out.getvalue()
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise ValueError(f"{entry['path']}: checksum mismatch")
+    return data
+
+
+def extract(archive, dest, manifest_path=None, patterns=None, day=None, log=print):
+    manifest = load_manifest(manifest_path or default_manifest(archive))
+    count = 0
+    for entry in _select(manifest, patterns, day):
+        parts = [p for p in entry['path'].split('/') if p not in ('', '.', '..')]
+        target = os.path.join(dest, *parts)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(read_member(archive, manifest, entry))
+        os.utime(target, (entry['mtime'], entry['mtime']))
+        log(f"{target} ({entry['size']:,} bytes, sha256 ok)")
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streaming, parallel, resumable Cowrie log archives')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('create', help='Archive files and directories')
+    p.add_argument('archive', help='Output .tar.gz')
+    p.add_argument('sources', nargs='+', metavar='[ARCNAME=]PATH', help='Files or directories to include')
+    p.add_argument('--manifest', help=f'Manifest/checkpoint path (default: ARCHIVE{MANIFEST_SUFFIX})')
+    p.add_argument('--frame-mb', type=float, default=DEFAULT_FRAME_BYTES / 1024 / 1024,
+                   help='Uncompressed bytes per independently compressed frame (default: %(default)g)')
+    p.add_argument('--level', type=int, default=DEFAULT_LEVEL, help='gzip level 1-9 (default: %(default)s)')
+    p.add_argument('--workers', type=int, help='Compression threads (default: CPU count)')
+    p.add_argument('--fresh', action='store_true', help='Start over instead of resuming an interrupted run')
+
+    p = sub.add_parser('list', help='List archived files')
+    p.add_argument('archive')
+    p.add_argument('--manifest')
+
+    p = sub.add_parser('extract', help='Extract files without decompressing the whole archive')
+    p.add_argument('archive')
+    p.add_argument('patterns', nargs='*', help='Archive paths or file name globs (default: all)')
+    p.add_argument('--day', help='Only files for this day (YYYY-MM-DD in the name, or modified that day, UTC)')
+    p.add_argument('-C', '--directory', default='.', help='Extract into this directory')
+    p.add_argument('--manifest')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "log_archive"):
+        if args.command == 'create':
+            manifest = create(args.archive, args.sources, args.manifest, int(args.frame_mb * 1024 * 1024),
+                              args.level, args.workers, fresh=args.fresh)
+            files = manifest['files']
+            total = sum(entry['size'] for entry in files)
+            print(f"Archive: {args.archive} ({manifest['archive_bytes']:,} bytes from {total:,} in {len(files)} files, "
+                  f"{len(manifest['frames'])} frames)")
+            if files:
+                first = min(entry['mtime'] for entry in files)
+                last = max(entry['mtime'] for entry in files)
+                print(f"Logs date range: {datetime.fromtimestamp(first, timezone.utc).isoformat()} -> "
+                      f"{datetime.fromtimestamp(last, timezone.utc).isoformat()}")
+            print(f"Manifest: {args.manifest or default_manifest(args.archive)}")
+            print(f"Archive SHA256: {manifest['sha256']}")
+        elif args.command == 'list':
+            manifest = load_manifest(args.manifest or default_manifest(args.archive))
+            for entry in manifest['files']:
+                modified = datetime.fromtimestamp(entry['mtime'], timezone.utc).strftime('%Y-%m-%d %H:%M')
+                print(f"{entry['size']:>14,}  {modified}  {entry['sha256'][:12]}  {entry['path']}")
+            if not manifest.get('complete'):
+                print("(incomplete: create was interrupted; re-run it to resume)", file=sys.stderr)
+        else:
+            count = extract(args.archive, args.directory, args.manifest, args.patterns, args.day)
+            if not count:
+                print("No matching files", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Log Event Index - Inverted index over cowrie.json for "what did this IP do?" lookups
+Keeps a <log>.eidx/ sidecar per log file mapping src_ip, session, username,
+password, eventid and command to the byte offsets of matching events, so a
+lookup reads only those lines instead of scanning the whole log.
+
+Usage:
+    python3 log_event_index.py build /opt/cowrie/var/log/cowrie/
+    python3 log_event_index.py query /opt/cowrie/var/log/cowrie/ --src-ip 1.2.3.4 > attacker.json
+    python3 log_event_index.py query /opt/cowrie/var/log/cowrie/ --username root --eventid cowrie.login.success --count
+    python3 log_event_index.py query /opt/cowrie/var/log/cowrie/ --session 4f2a9c1e --pcap session.pcap
+    python3 log_event_index.py top src_ip /opt/cowrie/var/log/cowrie/ -n 10
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import struct
+import bisect
+import argparse
+from array import array
+from collections import Counter, defaultdict
+
+from log_time_index import log_files, head_digest
+import pipeline_profile
+
+INDEX_SUFFIX = '.eidx'
+INDEX_VERSION = 1
+SEGMENT_MAGIC = b'PPX1'
+TRAILER = struct.Struct('<Q4s')
+
+# Index field -> Cowrie JSON key
+FIELDS = {
+    'src_ip': 'src_ip',
+    'session': 'session',
+    'username': 'username',
+    'password': 'password',
+    'eventid': 'eventid',
+    'command': 'input',
+}
+
+# Longer values (pasted scripts as commands) are indexed by their prefix;
+# query results are re-checked against the full value after decoding
+MAX_TERM_CHARS = 512
+BLOCK_TERMS = 128
+DEFAULT_FLUSH_EVENTS = 250000
+MAX_SEGMENTS = 8
+
+
+def term_key(field, value):
+    # '\0' sorts before any value character, so a field's terms are contiguous
+    return f"{field}\0{value[:MAX_TERM_CHARS]}"
+
+
+def encode_varint(n, out):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(buf, pos):
+    value = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_postings(offsets):
+    """Sorted event offsets as delta-encoded varints"""
+    out = bytearray()
+    prev = 0
+    for offset in offsets:
+        encode_varint(offset - prev, out)
+        prev = offset
+    return bytes(out)
+
+
+def decode_postings(buf):
+    out = []
+    value = shift = prev = 0
+    for b in buf:
+        value |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            prev += value
+            out.append(prev)
+            value = shift = 0
+    return out
+
+
+def write_segment(path, terms):
+    """
+    Write (key, sorted offsets) pairs, in key order, as one immutable segment.
+
+    Layout: posting lists, then the term dictionary in blocks of BLOCK_TERMS
+    entries (key, postings offset, length, count), then a JSON footer with
+    the first key and position of each block, then the trailer.
+    """
+    tmp = path + '.tmp'
+    entries = []
+    pos = 0
+    with open(tmp, 'wb') as f:
+        for key, offsets in terms:
+            data = encode_postings(offsets)
+            f.write(data)
+            entries.append((key, pos, len(data), len(offsets)))
+            pos += len(data)
+
+        first_keys, block_offsets = [], []
+        for i in range(0, len(entries), BLOCK_TERMS):
+            chunk = entries[i:i + BLOCK_TERMS]
+            buf = bytearray()
+            for key, offset, length, count in chunk:
+                raw = key.encode('utf-8', 'surrogatepass')
+                encode_varint(len(raw), buf)
+                buf += raw
+                encode_varint(offset, buf)
+                encode_varint(length, buf)
+                encode_varint(count, buf)
+            first_keys.append(chunk[0][0])
+            block_offsets.append(pos)
+            f.write(buf)
+            pos += len(buf)
+        block_offsets.append(pos)
+
+        f.write(json.dumps({'keys': first_keys, 'blocks': block_offsets, 'terms': len(entries)}).encode('utf-8'))
+        f.write(TRAILER.pack(pos, SEGMENT_MAGIC))
+    os.replace(tmp, path)
+
+
+class Segment:
+    """Read side of one segment file; only the block directory is held in memory"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            f.seek(-TRAILER.size, os.SEEK_END)
+            footer_at, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"{path}: not an index segment")
+            f.seek(footer_at)
+            footer = json.loads(f.read()[:-TRAILER.size])
+        self.keys = footer['keys']
+        self.blocks = footer['blocks']
+
+    def _read(self, f, begin, end):
+        f.seek(begin)
+        return f.read(end - begin)
+
+    def _block(self, f, i):
+        buf = self._read(f, self.blocks[i], self.blocks[i + 1])
+        pos = 0
+        while pos < len(buf):
+            n, pos = read_varint(buf, pos)
+            key = buf[pos:pos + n].decode('utf-8', 'surrogatepass')
+            pos += n
+            offset, pos = read_varint(buf, pos)
+            length, pos = read_varint(buf, pos)
+            count, pos = read_varint(buf, pos)
+            yield key, offset, length, count
+
+    def postings(self, key):
+        """Event offsets for one term ([] if absent)"""
+        i = bisect.bisect_right(self.keys, key) - 1
+        if i < 0:
+            return []
+        with open(self.path, 'rb') as f:
+            for k, offset, length, _ in self._block(f, i):
+                if k == key:
+                    return decode_postings(self._read(f, offset, offset + length))
+        return []
+
+    def terms(self, prefix=''):
+        """(key, count) for every term starting with prefix, in key order"""
+        with open(self.path, 'rb') as f:
+            for i in range(max(bisect.bisect_right(self.keys, prefix) - 1, 0), len(self.keys)):
+                for key, _, _, count in self._block(f, i):
+                    if key.startswith(prefix):
+                        yield key, count
+                    elif key > prefix:
+                        return
+
+    def entries(self):
+        """(key, offsets) for every term, in key order (used by compaction)"""
+        with open(self.path, 'rb') as f:
+            for i in range(len(self.keys)):
+                for key, offset, length, _ in list(self._block(f, i)):
+                    yield key, decode_postings(self._read(f, offset, offset + length))
+
+
+class LogEventIndex:
+    """
+    Inverted index for one log file.
+
+    New lines are indexed into a fresh segment on each update (in memory
+    chunks of flush_events), and segments are merged once there are more than
+    MAX_SEGMENTS, so following a growing log stays cheap. Offsets in later
+    segments are always larger, so posting lists concatenate in order.
+
+    Gzipped rotations are indexed by offset into the decompressed stream and
+    read back with forward seeks.
+    """
+
+    def __init__(self, path, flush_events=DEFAULT_FLUSH_EVENTS):
+        self.path = path
+        self.index_dir = path + INDEX_SUFFIX
+        self.meta_path = os.path.join(self.index_dir, 'meta.json')
+        self.flush_events = flush_events
+        self.compressed = path.endswith('.gz')
+        self.size = 0
+        self.head = ''
+        self.events = 0
+        self.segment_names = []
+        self.next_segment = 1
+        self._segments = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        self.size = data['size']
+        self.head = data['head']
+        self.events = data['events']
+        self.segment_names = data['segments']
+        self.next_segment = data['next_segment']
+
+    def _save(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'size': self.size, 'head': self.head,
+                       'events': self.events, 'segments': self.segment_names,
+                       'next_segment': self.next_segment}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _reset(self):
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+        self.size, self.head, self.events = 0, '', 0
+        self.segment_names, self.next_segment, self._segments = [], 1, {}
+
+    def segments(self):
+        out = []
+        for name in self.segment_names:
+            if name not in self._segments:
+                self._segments[name] = Segment(os.path.join(self.index_dir, name))
+            out.append(self._segments[name])
+        return out
+
+    def _write(self, terms):
+        name = f"seg-{self.next_segment:06d}.bin"
+        write_segment(os.path.join(self.index_dir, name), terms)
+        self.next_segment += 1
+        return name
+
+    def _flush(self, pending):
+        if pending:
+            self.segment_names.append(self._write((key, pending[key]) for key in sorted(pending)))
+            pending.clear()
+
+    def update(self):
+        """Index lines appended since the last update (rebuilds after rotation/truncation)"""
+        try:
+            if self.compressed:
+                import gzip
+                stat = os.stat(self.path)
+                signature = f"{stat.st_size}:{int(stat.st_mtime)}"
+                if self.head != signature:
+                    self._reset()
+                    os.makedirs(self.index_dir, exist_ok=True)
+                    with gzip.open(self.path, 'rb') as f:
+                        self._index_from(f)
+                    self.head = signature
+                    self._save()
+                return self
+
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self.size or head_digest(f, self.size) != self.head:
+                    self._reset()
+                if size == self.size and self.segment_names:
+                    return self
+                os.makedirs(self.index_dir, exist_ok=True)
+                f.seek(self.size)
+                self._index_from(f)
+                self.head = head_digest(f, self.size)
+            if len(self.segment_names) > MAX_SEGMENTS:
+                self.compact()
+            self._save()
+        except OSError as e:
+            # Read-only log dir: whatever index already exists still serves this run
+            print(f"Warning: could not update {self.index_dir}: {e}", file=sys.stderr)
+        return self
+
+    def _index_from(self, f):
+        pending = defaultdict(lambda: array('Q'))
+        offset = self.size
+        buffered = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # partial line still being written
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if isinstance(event, dict):
+                for field, json_key in FIELDS.items():
+                    value = event.get(json_key)
+                    if isinstance(value, str) and value:
+                        pending[term_key(field, value)].append(offset)
+                self.events += 1
+                buffered += 1
+                if buffered >= self.flush_events:
+                    self._flush(pending)
+                    buffered = 0
+            offset += len(line)
+        self._flush(pending)
+        self.size = offset
+
+    def compact(self):
+        """Merge all segments into one"""
+        segments = self.segments()
+        if len(segments) < 2:
+            return self
+        # heapq.merge keeps input order for equal keys, i.e. ascending offsets
+        merged = heapq.merge(*(s.entries() for s in segments), key=lambda entry: entry[0])
+
+        def grouped():
+            key, offsets = None, []
+            for k, postings in merged:
+                if k != key:
+                    if key is not None:
+                        yield key, offsets
+                    key, offsets = k, []
+                offsets.extend(postings)
+            if key is not None:
+                yield key, offsets
+
+        old = self.segment_names
+        self.segment_names = [self._write(grouped())]
+        self._segments = {}
+        for name in old:
+            os.remove(os.path.join(self.index_dir, name))
+        return self
+
+    def offsets(self, criteria):
+        """
+        Sorted offsets of events matching every field in criteria
+        ({field: [values]}, any value of a field may match).
+        """
+        result = None
+        segments = self.segments()
+        for field, values in criteria.items():
+            matches = set()
+            for value in values:
+                key = term_key(field, value)
+                for segment in segments:
+                    matches.update(segment.postings(key))
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        return sorted(result) if result is not None else []
+
+    def lines(self, offsets):
+        """Raw lines at the given ascending offsets"""
+        if self.compressed:
+            import gzip
+            opener = gzip.open
+        else:
+            opener = open
+        with opener(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                line = f.readline()
+                if line:
+                    yield line
+
+    def term_counts(self, field):
+        """Counter of value -> number of events for one field"""
+        counts = Counter()
+        prefix = term_key(field, '')
+        for segment in self.segments():
+            for key, count in segment.terms(prefix):
+                counts[key[len(prefix):]] += count
+        return counts
+
+
+def _chronological(path):
+    # Dated rotations sort by name; the live cowrie.json is the newest
+    return (os.path.basename(path) == 'cowrie.json', path)
+
+
+def open_indexes(paths, update=True):
+    """LogEventIndex for each log, oldest file first"""
+    indexes = [LogEventIndex(p) for p in sorted(log_files(paths), key=_chronological)]
+    if update:
+        for idx in indexes:
+            idx.update()
+    return indexes
+
+
+def _normalize(criteria):
+    return {field: [values] if isinstance(values, str) else list(values)
+            for field, values in criteria.items() if values}
+
+
+def _matches(event, criteria):
+    return all(isinstance(event.get(FIELDS[field]), str) and event[FIELDS[field]] in values
+               for field, values in criteria.items())
+
+
+def _search(paths, criteria, update):
+    criteria = _normalize(criteria)
+    unknown = set(criteria) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown index fields: {', '.join(sorted(unknown))}")
+    if not criteria:
+        raise ValueError("At least one field is required")
+    for idx in open_indexes(paths, update):
+        for line in idx.lines(idx.offsets(criteria)):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if _matches(event, criteria):
+                yield line, event
+
+
+def query(paths, criteria, update=True):
+    """
+    Decoded events matching criteria, e.g. {'src_ip': '1.2.3.4', 'eventid': [...]}.
+
+    Fields are ANDed, several values for one field are ORed. Each candidate
+    is re-checked after decoding, so truncated terms and a stale index never
+    return a wrong event.
+    """
+    for _, event in _search(paths, criteria, update):
+        yield event
+
+
+def query_lines(paths, criteria, update=True):
+    """Raw log lines matching criteria (see query)"""
+    for line, _ in _search(paths, criteria, update):
+        yield line
+
+
+def top_values(paths, field, n=10, update=True):
+    """[(value, events), ...] for the n most frequent values of a field, from the index alone"""
+    if field not in FIELDS:
+        raise ValueError(f"Unknown index field: {field}")
+    counts = Counter()
+    for idx in open_indexes(paths, update):
+        counts.update(idx.term_counts(field))
+    return counts.most_common(n)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inverted index for Cowrie JSON logs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Create or update .eidx sidecars')
+    build.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    build.add_argument('--compact', action='store_true', help='Merge each index into a single segment')
+    build.add_argument('--follow', type=float, nargs='?', const=30.0, metavar='SECONDS',
+                       help='Keep updating as the log grows (default interval: 30s)')
+
+    q = sub.add_parser('query', help='Print the raw events matching all given fields')
+    q.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    for field in FIELDS:
+        q.add_argument(f"--{field.replace('_', '-')}", dest=field, action='append', metavar='VALUE',
+                       help=f"Match {field} (repeat to match any of several values)")
+    q.add_argument('--count', action='store_true', help='Only print the number of matching events')
+    q.add_argument('--pcap', metavar='FILE', help='Write the matching events to a PCAP via logs2pcap')
+    q.add_argument('--no-update', action='store_true', help='Use the sidecars as-is')
+
+    top = sub.add_parser('top', help='Most frequent values of a field (tab-separated count and value)')
+    top.add_argument('field', choices=list(FIELDS))
+    top.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    top.add_argument('-n', type=int, default=10, help='Number of values (default: 10)')
+    top.add_argument('--no-update', action='store_true', help='Use the sidecars as-is')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "log_event_index"):
+        if args.command == 'build':
+            while True:
+                started = time.time()
+                for path in log_files(args.paths):
+                    idx = LogEventIndex(path).update()
+                    if args.compact:
+                        idx.compact()._save()
+                    if not args.follow:
+                        print(f"{path}: {idx.events:,} events, {len(idx.segment_names)} segments, "
+                              f"{idx.size:,} bytes indexed")
+                if not args.follow:
+                    break
+                time.sleep(max(0.0, args.follow - (time.time() - started)))
+            return
+
+        if args.command == 'top':
+            for value, count in top_values(args.paths, args.field, args.n, update=not args.no_update):
+                print(f"{count}\t{value}")
+            return
+
+        criteria = {field: getattr(args, field) for field in FIELDS if getattr(args, field)}
+        if not criteria:
+            parser.error('query needs at least one of ' + ', '.join(f"--{f.replace('_', '-')}" for f in FIELDS))
+
+        started = time.time()
+        update = not args.no_update
+        if args.pcap:
+            # scapy is slow to import; only pay for it when writing a PCAP
+            import logs2pcap
+            count = logs2pcap.events_to_pcap(query(args.paths, criteria, update), args.pcap)
+        elif args.count:
+            count = sum(1 for _ in query_lines(args.paths, criteria, update))
+            print(count)
+        else:
+            out = sys.stdout.buffer
+            count = 0
+            for line in query_lines(args.paths, criteria, update):
+                out.write(line)
+                count += 1
+        print(f"{count:,} matching events in {(time.time() - started) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Log Merge - One time-ordered event stream from several honeypot sensors
+Each sensor's logs (current and rotated cowrie.json, plain or .gz, or any
+JSON-lines export) are read in order as one stream. A small per-sensor
+reorder buffer absorbs out-of-order skew, and a heap-based k-way merge
+interleaves the sensors by timestamp. Lines are tagged with their sensor
+("sensor": name) and passed through as raw bytes, without JSON decoding,
+so a fleet-wide pass costs about as much as reading the files.
+
+Tools read the merged stream from stdin ('-') or from a file or spool:
+
+    python3 log_merge.py east=/data/east/ west=/data/west/ | python3 final_project_stats.py --log - --no-post
+    python3 log_merge.py east=/data/east/ west=/data/west/ --dedup window --spool fleet.ppspool
+
+A sensor given as NAME=PATH overrides Cowrie's own "sensor" field; a bare
+PATH is named after its directory and only tags lines without one.
+"""
+
+import os
+import re
+import sys
+import json
+import heapq
+import argparse
+from collections import defaultdict
+
+from log_scan import open_log, is_live_log
+from log_time_index import log_files, ts_to_epoch
+import event_dedup
+import pipeline_profile
+
+DEFAULT_SKEW = 5.0        # seconds an event may trail newer events of the same sensor
+DEFAULT_BUFFER = 100_000  # most events held per sensor while reordering
+
+_TS_RE = re.compile(rb'"timestamp":\s*"([^"]*)"')
+_SENSOR_RE = re.compile(rb'"sensor":\s*"(?:[^"\\]|\\.)*"')
+_CURRENT_LOG = 'cowrie.json'
+
+
+class MergeStats:
+    """Per-sensor line counts and how much reordering the buffers did"""
+
+    def __init__(self):
+        self.lines = defaultdict(int)
+        self.reordered = 0   # lines that arrived behind a newer one and were put back in order
+        self.late = 0        # lines that trailed by more than the skew and were emitted out of order
+
+    def __str__(self):
+        per_sensor = ", ".join(f"{name} {count:,}" for name, count in sorted(self.lines.items()))
+        return (f"merged {sum(self.lines.values()):,} lines ({per_sensor}); "
+                f"{self.reordered:,} reordered, {self.late:,} late")
+
+
+def parse_sensor(spec):
+    """'name=path' or 'path' -> (name, path, explicit)"""
+    name, sep, path = spec.partition('=')
+    if sep and name and not os.path.exists(spec):
+        return name, path, True
+    path = os.path.abspath(spec)
+    if not os.path.isdir(path) and os.path.basename(path).startswith(_CURRENT_LOG):
+        path = os.path.dirname(path)  # .../east/cowrie.json -> east
+    return os.path.basename(path).split('.')[0], spec, False
+
+
+def sensor_files(paths):
+    """A sensor's logs oldest first: dated rotations, then the live cowrie.json"""
+    return sorted(log_files(paths), key=lambda p: (os.path.basename(p) == _CURRENT_LOG, p))
+
+
+def _tagger(name, explicit):
+    field = b'"sensor": ' + json.dumps(name).encode('utf-8')
+
+    def tag(line):
+        if b'"sensor"' in line:
+            return _SENSOR_RE.sub(field, line, count=1) if explicit else line
+        body = line.rstrip()
+        if not body.endswith(b'}'):
+            return line
+        if body == b'{}':
+            return b'{' + field + b'}\n'
+        return body[:-1] + b', ' + field + b'}\n'
+    return tag
+
+
+def sensor_lines(index, name, paths, explicit=False, skew=DEFAULT_SKEW, max_buffer=DEFAULT_BUFFER, stats=None):
+    """
+    (timestamp, index, seq, line) for one sensor in timestamp order, as long
+    as no line trails the newest one by more than skew seconds
+    """
+    stats = stats if stats is not None else MergeStats()
+    tag = _tagger(name, explicit)
+    heap = []
+    seq = 0
+    newest_key = b''
+    newest = None
+    last_out = b''
+    day_epoch = {}  # b'YYYY-MM-DD' -> epoch of midnight
+    for path in sensor_files(paths):
+        live = is_live_log(path)
+        with open_log(path) as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    if live:
+                        continue  # partial line still being written
+                    line += b'\n'  # finished log without a final newline
+                match = _TS_RE.search(line)
+                key = match.group(1) if match else newest_key
+                epoch = None
+                if match:
+                    day = day_epoch.get(key[:10])
+                    if day is None:
+                        try:
+                            day = day_epoch[key[:10]] = ts_to_epoch(key[:10].decode('ascii') + 'T00:00:00')
+                        except (UnicodeDecodeError, ValueError):
+                            day = None
+                    try:
+                        epoch = day + int(key[11:13]) * 3600 + int(key[14:16]) * 60 + int(key[17:19])
+                    except (TypeError, ValueError):
+                        epoch = None
+                if key < newest_key:
+                    stats.reordered += 1
+                else:
+                    newest_key = key
+                    if epoch is not None:
+                        newest = epoch
+                heapq.heappush(heap, (key, seq, epoch, tag(line)))
+                seq += 1
+                stats.lines[name] += 1
+                # release what can no longer be overtaken
+                while heap and (len(heap) > max_buffer or newest is None or heap[0][2] is None
+                                or heap[0][2] <= newest - skew):
+                    key_out, n, _, out = heapq.heappop(heap)
+                    if key_out < last_out:
+                        stats.late += 1
+                    else:
+                        last_out = key_out
+                    yield key_out, index, n, out
+    while heap:
+        key_out, n, _, out = heapq.heappop(heap)
+        if key_out < last_out:
+            stats.late += 1
+        yield key_out, index, n, out
+
+
+def group_sensors(specs):
+    """Sensor specs -> [(name, [paths], explicit)], same-named specs combined"""
+    sensors = {}
+    for spec in specs:
+        name, path, explicit = parse_sensor(spec)
+        entry = sensors.setdefault(name, [name, [], False])
+        entry[1].append(path)
+        entry[2] = entry[2] or explicit
+    return [tuple(entry) for entry in sensors.values()]
+
+
+def merge_lines(specs, skew=DEFAULT_SKEW, max_buffer=DEFAULT_BUFFER, stats=None):
+    """Raw, sensor-tagged log lines from every sensor in global timestamp order"""
+    streams = [sensor_lines(i, name, paths, explicit, skew, max_buffer, stats)
+               for i, (name, paths, explicit) in enumerate(group_sensors(specs))]
+    for _, _, _, line in heapq.merge(*streams):
+        yield line
+
+
+def merge(specs, skew=DEFAULT_SKEW, max_buffer=DEFAULT_BUFFER, stats=None):
+    """Decoded events from every sensor in global timestamp order"""
+    loads = pipeline_profile.wrap("decode", json.loads)
+    for line in merge_lines(specs, skew, max_buffer, stats):
+        try:
+            event = loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+def is_duplicate(dedup, line):
+    """Raw lines that aren't JSON events pass through untouched, as without --dedup"""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(event, dict) and dedup.seen(event)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge Cowrie logs from several sensors into one time-ordered stream')
+    parser.add_argument('sensors', nargs='+', metavar='[NAME=]PATH',
+                        help='Log file or Cowrie log directory per sensor (repeat NAME for more paths)')
+    parser.add_argument('-o', '--output', help='Write JSON lines here instead of stdout')
+    parser.add_argument('--spool', metavar='PATH', help='Write a binary event spool (event_spool) instead; sensor tags are not kept')
+    parser.add_argument('--skew', type=float, default=DEFAULT_SKEW,
+                        help='Out-of-order tolerance per sensor in seconds (default: %(default)g)')
+    parser.add_argument('--buffer', type=int, default=DEFAULT_BUFFER,
+                        help='Most events buffered per sensor (default: %(default)s)')
+    parser.add_argument('--stats', action='store_true', help='Report per-sensor counts and reordering on stderr')
+    event_dedup.add_arguments(parser, default='off')
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stats = MergeStats()
+    dedup = event_dedup.from_args(args)
+    with pipeline_profile.profiled(args, "log_merge"):
+        if args.spool:
+            from event_spool import SpoolWriter
+            events = merge(args.sensors, args.skew, args.buffer, stats)
+            with SpoolWriter(args.spool) as writer:
+                for event in dedup.filter(events) if dedup else events:
+                    writer.write(event)
+        else:
+            out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+            write = pipeline_profile.wrap("write", out.write)
+            lines = pipeline_profile.wrap_iter("read", merge_lines(args.sensors, args.skew, args.buffer, stats))
+            try:
+                for line in lines:
+                    if dedup is not None and is_duplicate(dedup, line):
+                        continue
+                    write(line)
+            except BrokenPipeError:
+                pass  # reader (head, a tool) stopped early
+            finally:
+                if args.output:
+                    out.close()
+        pipeline_profile.count(events=sum(stats.lines.values()))
+    if args.stats:
+        print(stats, file=sys.stderr)
+        if dedup is not None:
+            print(f"dropped {dedup.duplicates:,} duplicate events", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Log Scan - Selective reads of cowrie.json with raw-byte predicate pushdown
+Memory-maps each log and searches for the predicate's byte patterns (eventid
+allowlist, IP, session, field values, date prefix) before any JSON decoding.
+Only lines that pass are decoded, and every decoded event is re-checked
+against the full predicate, so results are exact.
+
+Usage:
+    python3 log_scan.py /opt/cowrie/var/log/cowrie/ --eventid cowrie.session.file_download
+    python3 log_scan.py cowrie.json --src-ip 1.2.3.4 --eventid cowrie.login.success --eventid cowrie.login.failed
+    python3 log_scan.py cowrie.json --field username=root --since 7d --count --stats
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import heapq
+import argparse
+import contextlib
+
+from log_time_index import log_files, line_epoch, parse_time
+import pipeline_profile
+
+# Control characters can be escaped several ways (\u001b, \u001B, \e...);
+# values containing them are only checked after decoding
+_CONTROL = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def _needles(value):
+    """
+    Every way a JSON writer may encode a string value (quoted raw bytes), or
+    None when the value can't be prefiltered. Covers ASCII-escaped vs UTF-8
+    output and optional escaping of '/'.
+    """
+    if not isinstance(value, str) or _CONTROL.search(value):
+        return None
+    variants = set()
+    for ensure_ascii in (True, False):
+        encoded = json.dumps(value, ensure_ascii=ensure_ascii)
+        variants.add(encoded.encode('utf-8', 'surrogatepass'))
+        if '/' in encoded:
+            variants.add(encoded.replace('/', '\\/').encode('utf-8', 'surrogatepass'))
+    return sorted(variants)
+
+
+def _scalar_text(value):
+    """A decoded JSON scalar as --field text: strings as-is, numbers / booleans / null as JSON"""
+    if isinstance(value, str):
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None  # objects and lists never match
+
+
+def _field_needles(key, value):
+    """Needles for key=value matching either a JSON string or the bare scalar (dst_port=22)"""
+    needles = _needles(value)
+    if needles is None:
+        return None
+    try:
+        bare = json.loads(value)
+    except ValueError:
+        return needles
+    if isinstance(bare, str) or _scalar_text(bare) != value:
+        return needles
+    name = json.dumps(key).encode('utf-8')
+    return needles + [name + b': ' + value.encode('ascii'), name + b':' + value.encode('ascii')]
+
+
+class ScanStats:
+    """Counters showing how much work the prefilters saved"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.candidates = 0
+        self.decoded = 0
+        self.matched = 0
+
+    def __str__(self):
+        skipped = 1 - self.decoded / self.candidates if self.candidates else 0.0
+        return (f"{self.bytes:,} bytes scanned, {self.candidates:,} candidate lines, "
+                f"{self.decoded:,} decoded ({skipped:.0%} of candidates skipped), {self.matched:,} matched")
+
+
+class Predicate:
+    """
+    Conjunction of event conditions, each with an optional byte prefilter.
+
+    eventids / src_ips / sessions: any listed value may match
+    start / end: epoch seconds (start <= ts < end)
+    date_prefix: leading part of the timestamp, e.g. '2025-10-23' or '2025-10'
+    fields: {json_key: value} exact matches on other keys (username, password, input, ...);
+        numbers, booleans and null match by their JSON text (dst_port='22', 'null')
+    """
+
+    def __init__(self, eventids=None, src_ips=None, sessions=None, start=None, end=None,
+                 date_prefix=None, fields=None):
+        self.eventids = set(eventids) if eventids else None
+        self.src_ips = set(src_ips) if src_ips else None
+        self.sessions = set(sessions) if sessions else None
+        self.start = start
+        self.end = end
+        self.date_prefix = date_prefix
+        self.fields = {key: _scalar_text(value) for key, value in (fields or {}).items()}
+
+    def byte_groups(self):
+        """
+        Prefilters as groups of needles: a line passes if, for every group, it
+        contains at least one needle. Most selective groups come first; the
+        first group drives the mmap search.
+        """
+        groups = []
+        for values in (self.src_ips, self.sessions):
+            if values:
+                group = self._group(values)
+                if group:
+                    groups.append(group)
+        for key, value in self.fields.items():
+            group = _field_needles(key, value)
+            if group:
+                groups.append(group)
+        if self.eventids:
+            group = self._group(self.eventids)
+            if group:
+                groups.append(group)
+        if self.date_prefix:
+            groups.append([b'"' + self.date_prefix.encode('ascii')])
+        return groups
+
+    @staticmethod
+    def _group(values):
+        group = []
+        for value in values:
+            needles = _needles(value)
+            if needles is None:
+                return None  # one unsearchable value means no prefilter for this condition
+            group.extend(needles)
+        return group
+
+    def in_range(self, ts):
+        """Time bounds check on epoch seconds (None fails any bound)"""
+        if self.start is None and self.end is None:
+            return True
+        return ts is not None and (self.start is None or ts >= self.start) and (self.end is None or ts < self.end)
+
+    def check_line(self, line):
+        """Cheap checks on raw bytes that don't need a JSON decode"""
+        if self.start is not None or self.end is not None:
+            return self.in_range(line_epoch(line))
+        return True
+
+    def matches(self, event):
+        """Exact check on a decoded event"""
+        if self.eventids is not None and event.get('eventid') not in self.eventids:
+            return False
+        if self.src_ips is not None and event.get('src_ip') not in self.src_ips:
+            return False
+        if self.sessions is not None and event.get('session') not in self.sessions:
+            return False
+        if self.date_prefix and not str(event.get('timestamp', '')).startswith(self.date_prefix):
+            return False
+        for key, value in self.fields.items():
+            if _scalar_text(event.get(key, ...)) != value:
+                return False
+        return True
+
+
+def _anchored_lines(mm, needles, live=True):
+    """Lines containing any needle, found with mmap.find, in file order (see _file_lines for live)"""
+    heap = []
+    for needle in needles:
+        pos = mm.find(needle)
+        if pos >= 0:
+            heap.append((pos, needle))
+    heapq.heapify(heap)
+    last_end = 0
+    while heap:
+        pos, needle = heapq.heappop(heap)
+        end = mm.find(b'\n', pos)
+        if end < 0:
+            if live:
+                continue  # partial last line still being written
+            end = len(mm)
+        else:
+            end += 1
+        if end > last_end:
+            start = mm.rfind(b'\n', 0, pos) + 1
+            yield _terminated(mm[start:end])
+            last_end = end
+        nxt = mm.find(needle, end)
+        if nxt >= 0:
+            heapq.heappush(heap, (nxt, needle))
+
+
+def open_log(path):
+    """Binary file object for a log: '-' is stdin (left open), *.gz is decompressed"""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin.buffer)
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def is_live_log(path):
+    """Only the live, uncompressed cowrie.json can end in a line still being written"""
+    return os.path.basename(path) == 'cowrie.json'
+
+
+def _terminated(line):
+    """An unterminated last line of a finished log, given its newline so raw output stays line-based"""
+    return line if line.endswith(b'\n') else line + b'\n'
+
+
+def _file_lines(path, anchor, stats):
+    live = is_live_log(path)
+    if anchor is None or path.endswith('.gz') or path == '-':
+        # Nothing to search for (or a compressed rotation or a pipe, which
+        # can't be mapped): plain line iteration is the fastest way through
+        with open_log(path) as f:
+            for line in f:
+                stats.bytes += len(line)
+                if not line.endswith(b'\n'):
+                    if live:
+                        continue  # partial line still being written
+                    line = _terminated(line)
+                if anchor is None or any(n in line for n in anchor):
+                    yield line
+        return
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file
+        with mm:
+            stats.bytes += len(mm)
+            yield from _anchored_lines(mm, anchor, live)
+
+
+def scan_lines(paths, predicate=None, stats=None):
+    """Raw lines of events matching predicate (decoded once for the exact re-check)"""
+    for line, _ in _scan(paths, predicate, stats):
+        yield line
+
+
+def scan(paths, predicate=None, stats=None):
+    """Decoded events matching predicate from log files or Cowrie log directories"""
+    for _, event in _scan(paths, predicate, stats):
+        yield event
+
+
+def _scan(paths, predicate, stats):
+    predicate = predicate or Predicate()
+    stats = stats if stats is not None else ScanStats()
+    groups = predicate.byte_groups()
+    anchor, rest = (groups[0], groups[1:]) if groups else (None, [])
+    loads = pipeline_profile.wrap("decode", json.loads)
+    for path in log_files(paths):
+        try:
+            lines = pipeline_profile.wrap_iter("read", _file_lines(path, anchor, stats))
+            for line in lines:
+                stats.candidates += 1
+                if not all(any(n in line for n in group) for group in rest):
+                    continue
+                if not predicate.check_line(line):
+                    continue
+                stats.decoded += 1
+                try:
+                    event = loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict) and predicate.matches(event):
+                    stats.matched += 1
+                    yield line, event
+        except FileNotFoundError:
+            print(f"Warning: log file not found: {path}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Selective Cowrie log scan with raw-byte prefilters')
+    parser.add_argument('paths', nargs='+', help="Log files or Cowrie log directories ('-' for stdin, e.g. from log_merge)")
+    parser.add_argument('--eventid', action='append', help='Event type to keep (repeatable)')
+    parser.add_argument('--src-ip', action='append', help='Source IP to keep (repeatable)')
+    parser.add_argument('--session', action='append', help='Session ID to keep (repeatable)')
+    parser.add_argument('--field', action='append', metavar='KEY=VALUE', help='Exact match on another key (numbers too, e.g. dst_port=22)')
+    parser.add_argument('--date', help="Timestamp prefix, e.g. 2025-10-23 or 2025-10")
+    parser.add_argument('--since', help="Relative start, e.g. 7d, 12h")
+    parser.add_argument('--start', help='Start time (ISO or epoch), inclusive')
+    parser.add_argument('--end', help='End time (ISO or epoch), exclusive')
+    parser.add_argument('--count', action='store_true', help='Only print the number of matching events')
+    parser.add_argument('--stats', action='store_true', help='Report prefilter effectiveness on stderr')
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fields = {}
+    for pair in args.field or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            parser.error(f"--field expects KEY=VALUE, got '{pair}'")
+        fields[key] = value
+
+    predicate = Predicate(eventids=args.eventid, src_ips=args.src_ip, sessions=args.session,
+                          start=parse_time(args.since or args.start), end=parse_time(args.end),
+                          date_prefix=args.date, fields=fields)
+    stats = ScanStats()
+    with pipeline_profile.profiled(args, "log_scan"):
+        if args.count:
+            print(sum(1 for _ in scan_lines(args.paths, predicate, stats)))
+        else:
+            out = pipeline_profile.wrap("write", sys.stdout.buffer.write)
+            for line in scan_lines(args.paths, predicate, stats):
+                out(line)
+        pipeline_profile.count(events=stats.matched, bytes=stats.bytes)
+    if args.stats:
+        print(stats, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
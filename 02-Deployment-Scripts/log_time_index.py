@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Log Time Index - Sparse timestamp index for fast time-range queries over cowrie.json
+Keeps a <log>.tidx sidecar per log file mapping byte blocks to their min/max
+event time, so "last N days" or "between T1 and T2" only reads matching blocks.
+
+Usage:
+    python3 log_time_index.py build /opt/cowrie/var/log/cowrie/
+    python3 log_time_index.py query /opt/cowrie/var/log/cowrie/ --since 7d > recent.json
+    python3 log_time_index.py query cowrie.json --start 2025-10-15 --end 2025-10-20
+    python3 log_time_index.py build /opt/cowrie/var/log/cowrie/ --follow
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import bisect
+import hashlib
+import calendar
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import pipeline_profile
+
+INDEX_SUFFIX = '.tidx'
+INDEX_VERSION = 1
+DEFAULT_BLOCK_BYTES = 256 * 1024
+HEAD_BYTES = 4096
+
+# cowrie.json and its rotations (cowrie.json.2025-10-23, optionally .gz), not sidecars
+_LOG_NAME_RE = re.compile(r'cowrie\.json(\.\d{4}-\d\d-\d\d)?(\.gz)?')
+_TS_RE = re.compile(rb'"timestamp":\s*"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)')
+
+
+def ts_to_epoch(ts):
+    """Epoch seconds from a Cowrie ISO timestamp ('2025-10-23T12:34:56.123456Z', UTC)"""
+    return calendar.timegm((int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                            int(ts[11:13]), int(ts[14:16]), int(ts[17:19]), 0, 0, 0))
+
+
+def line_epoch(line):
+    """Event time of a raw JSON line without decoding it, or None"""
+    match = _TS_RE.search(line)
+    return ts_to_epoch(match.group(1).decode('ascii')) if match else None
+
+
+def head_digest(f, length):
+    """Fingerprint of the first bytes of a log, to notice a rotated or replaced file"""
+    f.seek(0)
+    return hashlib.sha1(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def parse_time(value):
+    """Accept '7d' / '12h' (relative to now), an ISO date/time, or epoch seconds"""
+    if value is None:
+        return None
+    match = re.fullmatch(r'(\d+)([dhm])', value)
+    if match:
+        unit = {'d': 'days', 'h': 'hours', 'm': 'minutes'}[match.group(2)]
+        return int((datetime.now(timezone.utc) - timedelta(**{unit: int(match.group(1))})).timestamp())
+    if value.isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+class LogTimeIndex:
+    """
+    Block index for one log file.
+
+    The file is cut into ~block_bytes blocks on line boundaries; each block
+    records [offset, min_ts, max_ts]. Because Cowrie logs are only roughly in
+    time order, lookups use the running max of max_ts (to find the first
+    block that can contain T1) and the suffix min of min_ts (to know when no
+    later block can contain anything before T2), so results stay exact.
+
+    Gzipped rotations cannot be seeked; they get a single whole-file block.
+    """
+
+    def __init__(self, path, block_bytes=DEFAULT_BLOCK_BYTES):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.block_bytes = block_bytes
+        self.compressed = path.endswith('.gz')
+        self.size = 0
+        self.head = ''
+        self.blocks = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        self.size = data['size']
+        self.head = data['head']
+        self.block_bytes = data.get('block_bytes', self.block_bytes)
+        self.blocks = data['blocks']
+
+    def _save(self):
+        tmp = self.index_path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'size': self.size, 'head': self.head,
+                           'block_bytes': self.block_bytes, 'blocks': self.blocks}, f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            # Read-only log dir: the in-memory index still serves this run
+            print(f"Warning: could not write {self.index_path}: {e}", file=sys.stderr)
+
+    def update(self):
+        """Index data appended since the last update (rebuilds after rotation/truncation)"""
+        if self.compressed:
+            return self._update_compressed()
+
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.size or head_digest(f, self.size) != self.head:
+                self.size, self.blocks = 0, []
+            if size == self.size and self.blocks:
+                return self
+
+            f.seek(self.size)
+            offset = self.size
+            block = None
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partial line still being written
+                if block is None:
+                    block = [offset, None, None]
+                ts = line_epoch(line)
+                if ts is not None:
+                    if block[1] is None or ts < block[1]:
+                        block[1] = ts
+                    if block[2] is None or ts > block[2]:
+                        block[2] = ts
+                offset += len(line)
+                if offset - block[0] >= self.block_bytes:
+                    self._append(block)
+                    block = None
+            if block is not None:
+                self._append(block)
+            self.size = offset
+            self.head = head_digest(f, offset)
+        self._save()
+        return self
+
+    def _append(self, block):
+        if block[1] is not None:
+            self.blocks.append(block)
+
+    def _update_compressed(self):
+        import gzip
+        stat = os.stat(self.path)
+        signature = f"{stat.st_size}:{int(stat.st_mtime)}"
+        if self.head == signature:
+            return self
+        lo = hi = None
+        with gzip.open(self.path, 'rb') as f:
+            for line in f:
+                ts = line_epoch(line)
+                if ts is not None:
+                    lo = ts if lo is None or ts < lo else lo
+                    hi = ts if hi is None or ts > hi else hi
+        self.blocks = [[0, lo, hi]] if lo is not None else []
+        self.size = stat.st_size
+        self.head = signature
+        self._save()
+        return self
+
+    @property
+    def min_ts(self):
+        return min((b[1] for b in self.blocks), default=None)
+
+    @property
+    def max_ts(self):
+        return max((b[2] for b in self.blocks), default=None)
+
+    def ranges(self, start=None, end=None):
+        """Byte ranges [(begin, stop), ...] that may hold events with start <= ts < end"""
+        if not self.blocks:
+            return []
+        if self.compressed:
+            b = self.blocks[0]
+            overlaps = (start is None or b[2] >= start) and (end is None or b[1] < end)
+            return [(0, None)] if overlaps else []
+
+        n = len(self.blocks)
+        first = 0
+        if start is not None:
+            running_max, acc = [], None
+            for b in self.blocks:
+                acc = b[2] if acc is None or b[2] > acc else acc
+                running_max.append(acc)
+            first = bisect.bisect_left(running_max, start)
+        suffix_min = [0] * n
+        acc = None
+        for i in range(n - 1, -1, -1):
+            acc = self.blocks[i][1] if acc is None or self.blocks[i][1] < acc else acc
+            suffix_min[i] = acc
+
+        out = []
+        for i in range(first, n):
+            if end is not None and suffix_min[i] >= end:
+                break
+            b = self.blocks[i]
+            if (start is not None and b[2] < start) or (end is not None and b[1] >= end):
+                continue
+            stop = self.blocks[i + 1][0] if i + 1 < n else self.size
+            if out and out[-1][1] == b[0]:
+                out[-1] = (out[-1][0], stop)
+            else:
+                out.append((b[0], stop))
+        return out
+
+    def iter_lines(self, start=None, end=None):
+        """Raw lines from candidate blocks (callers still check each timestamp)"""
+        if self.compressed:
+            import gzip
+            if self.ranges(start, end):
+                with gzip.open(self.path, 'rb') as f:
+                    yield from f
+            return
+        with open(self.path, 'rb') as f:
+            for begin, stop in self.ranges(start, end):
+                f.seek(begin)
+                remaining = stop - begin
+                while remaining > 0:
+                    line = f.readline()
+                    if not line:
+                        break
+                    remaining -= len(line)
+                    yield line
+
+
+def log_files(paths):
+    """Expand directories into Cowrie JSON logs (current + rotated, plain or .gz)"""
+    out = []
+    for path in paths:
+        if os.path.isdir(path):
+            out.extend(p for p in glob.glob(os.path.join(path, 'cowrie.json*'))
+                       if _LOG_NAME_RE.fullmatch(os.path.basename(p)))
+        else:
+            out.append(path)
+    return sorted(set(out))
+
+
+def open_indexes(paths, update=True):
+    """LogTimeIndex for each log, sorted by earliest event (rotations in time order)"""
+    indexes = [LogTimeIndex(p) for p in log_files(paths)]
+    if update:
+        for idx in indexes:
+            idx.update()
+    indexes = [idx for idx in indexes if idx.blocks]
+    indexes.sort(key=lambda idx: idx.min_ts)
+    return indexes
+
+
+def query_lines(paths, start=None, end=None, update=True):
+    """
+    Yield raw log lines with start <= timestamp < end (epoch seconds, either may be None).
+
+    Files are chosen by binary search over their time spans, and only the
+    matching blocks of each file are read.
+    """
+    indexes = open_indexes(paths, update)
+    if start is not None:
+        # Running max of file end times lets us bisect past files that end before start
+        running_max, acc = [], None
+        for idx in indexes:
+            acc = idx.max_ts if acc is None or idx.max_ts > acc else acc
+            running_max.append(acc)
+        indexes = indexes[bisect.bisect_left(running_max, start):]
+    for idx in indexes:
+        if end is not None and idx.min_ts >= end:
+            break
+        for line in idx.iter_lines(start, end):
+            ts = line_epoch(line)
+            if ts is None or (start is not None and ts < start) or (end is not None and ts >= end):
+                continue
+            yield line
+
+
+def query(paths, start=None, end=None, update=True):
+    """Decoded events with start <= timestamp < end (see query_lines)"""
+    for line in query_lines(paths, start, end, update):
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def last_days(paths, days):
+    """Events from the last N days"""
+    return query(paths, start=parse_time(f"{days}d"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sparse timestamp index for Cowrie JSON logs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Create or update .tidx sidecars')
+    build.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    build.add_argument('--block-kb', type=int, default=DEFAULT_BLOCK_BYTES // 1024,
+                       help='Target block size in KB for new indexes (default: 256)')
+    build.add_argument('--follow', type=float, nargs='?', const=30.0, metavar='SECONDS',
+                       help='Keep updating as the log grows (default interval: 30s)')
+
+    q = sub.add_parser('query', help='Print the raw log lines in a time range')
+    q.add_argument('paths', nargs='+', help='Log files or Cowrie log directories')
+    q.add_argument('--since', help="Relative start, e.g. 7d, 12h")
+    q.add_argument('--start', help='Start time (ISO or epoch), inclusive')
+    q.add_argument('--end', help='End time (ISO or epoch), exclusive')
+    q.add_argument('--no-update', action='store_true', help='Use the sidecars as-is')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "log_time_index"):
+        if args.command == 'build':
+            while True:
+                started = time.time()
+                for path in log_files(args.paths):
+                    idx = LogTimeIndex(path, block_bytes=args.block_kb * 1024).update()
+                    if not args.follow:
+                        print(f"{path}: {len(idx.blocks)} blocks, {idx.size:,} bytes indexed")
+                if not args.follow:
+                    break
+                time.sleep(max(0.0, args.follow - (time.time() - started)))
+            return
+
+        start = parse_time(args.since or args.start)
+        end = parse_time(args.end)
+        out = sys.stdout.buffer
+        for line in query_lines(args.paths, start, end, update=not args.no_update):
+            out.write(line)
+
+
+if __name__ == "__main__":
+    main()
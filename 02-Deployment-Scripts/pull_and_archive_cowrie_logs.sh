@@ -6,8 +6,9 @@
 # What it does:
 #  - Collects all files under /opt/cowrie/var/log/cowrie/ (json, text, rotations, downloads)
 #  - Determines earliest log timestamp (file mtime) and reports date range
-#  - Copies files into a staging dir, creates a tar.gz archive
-#  - Generates a manifest (JSON) listing files, sizes, checksums
+#  - Streams them into a tar.gz with parallel compression (log_archive.py), no staging copy
+#  - Generates a manifest (JSON) listing files, sizes, checksums and frame offsets
+#  - Resumes an interrupted run when re-run with the same --archive and --out
 #  - Optionally converts the main JSON log into a PCAP using logs2pcap.py
 #  - Optionally uploads archive and manifest to S3 (requires awscli configured)
 
@@ -17,18 +18,18 @@ set -euo pipefail
 COWRIE_LOG_DIR="/opt/cowrie/var/log/cowrie"
 OUT_DIR="/tmp/cowrie_logs_archive_$(date +%Y%m%d_%H%M%S)"
 ARCHIVE_NAME="cowrie_logs_$(date +%Y%m%d_%H%M%S).tar.gz"
-MANIFEST_NAME="cowrie_logs_manifest_$(date +%Y%m%d_%H%M%S).json"
 TO_S3=""
 CONVERT_PCAP=0
 PCAP_OUT="/tmp/cowrie_traffic.pcap"
 LOGS2PCAP_SCRIPT="$(dirname "$0")/logs2pcap.py"
+ARCHIVER_SCRIPT="$(dirname "$0")/log_archive.py"
 
 show_help(){
   cat <<'EOF'
 Usage: sudo ./pull_and_archive_cowrie_logs.sh [--out DIR] [--archive NAME] [--to-s3 s3://bucket/path] [--convert-pcap] [--pcap-file /tmp/out.pcap]
 
 Options:
-  --out DIR            Staging output directory (default /tmp/cowrie_logs_archive_TIMESTAMP)
+  --out DIR            Output directory for the manifest (default /tmp/cowrie_logs_archive_TIMESTAMP)
   --archive NAME       Archive filename (default cowrie_logs_TIMESTAMP.tar.gz)
   --to-s3 S3PATH       If provided, upload archive and manifest to this S3 path (requires awscli)
   --convert-pcap       Convert JSON logs to PCAP using logs2pcap.py and include in archive
@@ -60,87 +61,49 @@ while [[ ${#} -gt 0 ]]; do
   esac
 done
 
+ARCHIVE_PATH="/tmp/$ARCHIVE_NAME"
+MANIFEST_PATH="$OUT_DIR/${ARCHIVE_NAME%.tar.gz}_manifest.json"
+
 echo "[INFO] Cowrie log dir: $COWRIE_LOG_DIR"
 if [ ! -d "$COWRIE_LOG_DIR" ]; then
   echo "[ERROR] Cowrie log dir not found: $COWRIE_LOG_DIR" >&2
   exit 2
 fi
 
-echo "[INFO] Creating staging dir: $OUT_DIR"
+echo "[INFO] Output dir: $OUT_DIR"
 mkdir -p "$OUT_DIR"
 chmod 700 "$OUT_DIR"
 
-# Copy logs
-echo "[INFO] Copying logs to staging dir..."
-# Use rsync if available for reliable copy
-if command -v rsync >/dev/null 2>&1; then
-  rsync -a --info=progress2 "$COWRIE_LOG_DIR"/ "$OUT_DIR"/cowrie_logs/
-else
-  cp -a "$COWRIE_LOG_DIR" "$OUT_DIR"/cowrie_logs
-fi
-
-# Also include downloads and other potentially useful dirs
+# Files are streamed into the archive from where they are: no staging copy
+SOURCES=("cowrie_logs=$COWRIE_LOG_DIR")
 if [ -d "/opt/cowrie/var/lib/cowrie/downloads" ]; then
-  mkdir -p "$OUT_DIR"/downloads
-  rsync -a "/opt/cowrie/var/lib/cowrie/downloads/" "$OUT_DIR"/downloads/ || true
-fi
-
-# Determine earliest and latest file mtimes
-earliest=$(find "$OUT_DIR" -type f -printf '%T@ %p\n' | sort -n | head -1 | awk '{print $1}') || true
-latest=$(find "$OUT_DIR" -type f -printf '%T@ %p\n' | sort -n | tail -1 | awk '{print $1}') || true
-if [ -n "$earliest" ] && [ -n "$latest" ]; then
-  echo "[INFO] Logs date range: $(date -d "@$earliest" --iso-8601=seconds) -> $(date -d "@$latest" --iso-8601=seconds)"
-else
-  echo "[WARN] Could not determine date range (no files?)"
+  SOURCES+=("downloads=/opt/cowrie/var/lib/cowrie/downloads")
 fi
 
 # Optionally convert JSON to PCAP using logs2pcap.py
 if [ "$CONVERT_PCAP" -eq 1 ]; then
   echo "[INFO] Converting JSON to PCAP using logs2pcap.py"
-  JSON_FILE="$OUT_DIR/cowrie_logs/cowrie.json"
+  JSON_FILE="$COWRIE_LOG_DIR/cowrie.json"
   if [ -f "$LOGS2PCAP_SCRIPT" ]; then
     if [ -f "$JSON_FILE" ]; then
-      python3 "$LOGS2PCAP_SCRIPT" "$JSON_FILE" "$PCAP_OUT" || {
+      if python3 "$LOGS2PCAP_SCRIPT" "$JSON_FILE" "$PCAP_OUT"; then
+        SOURCES+=("$(basename "$PCAP_OUT")=$PCAP_OUT")
+      else
         echo "[ERROR] logs2pcap.py failed" >&2
-      }
-      # copy pcap to staging dir
-      cp "$PCAP_OUT" "$OUT_DIR/"
+      fi
     else
-      echo "[WARN] JSON file not found in staging path: $JSON_FILE"
+      echo "[WARN] JSON file not found: $JSON_FILE"
     fi
   else
     echo "[WARN] logs2pcap.py not found at: $LOGS2PCAP_SCRIPT"
   fi
 fi
 
-# Create manifest: list files, size, sha256
-echo "[INFO] Generating manifest and checksums..."
-MANIFEST_PATH="$OUT_DIR/$MANIFEST_NAME"
-jq -n --arg created "$(date -u +%Y-%m-%dT%H:%M:%SZ)" '{created: $created, files: []}' > "$MANIFEST_PATH"
-
-# Iterate and append file entries
-while IFS= read -r -d '' file; do
-  relpath="${file#$OUT_DIR/}"
-  size=$(stat -c%s "$file")
-  sha256=$(sha256sum "$file" | awk '{print $1}')
-  # Append entry to manifest
-  jq --arg path "$relpath" --arg size "$size" --arg sha256 "$sha256" '.files += [{path: $path, size: ($size|tonumber), sha256: $sha256}]' "$MANIFEST_PATH" > "$MANIFEST_PATH.tmp" && mv "$MANIFEST_PATH.tmp" "$MANIFEST_PATH"
-done < <(find "$OUT_DIR" -type f -print0)
-
-# Create tar.gz archive
-echo "[INFO] Creating archive: $ARCHIVE_NAME"
-pushd "$OUT_DIR" >/dev/null
-# archive contents at top level
-tar -czf "/tmp/$ARCHIVE_NAME" .
-ARCHIVE_PATH="/tmp/$ARCHIVE_NAME"
-popd >/dev/null
-
-echo "[INFO] Archive created: $ARCHIVE_PATH"
-echo "[INFO] Manifest: $MANIFEST_PATH"
-
-# Compute checksum of archive
-ARCHIVE_SHA256=$(sha256sum "$ARCHIVE_PATH" | awk '{print $1}')
-echo "[INFO] Archive SHA256: $ARCHIVE_SHA256"
+# Archive: parallel gzip frames, per-file sha256 in the same read, manifest
+# with frame offsets (log_archive.py extract pulls single days back out).
+# Re-running with the same --archive and --out resumes an interrupted run.
+echo "[INFO] Creating archive: $ARCHIVE_PATH"
+python3 "$ARCHIVER_SCRIPT" create "$ARCHIVE_PATH" "${SOURCES[@]}" --manifest "$MANIFEST_PATH"
 
 # Optional upload to S3
 if [ -n "$TO_S3" ]; then
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Sample Store - Content-addressed store and index for attacker payloads
+Files fetched or uploaded in Cowrie sessions (cowrie.session.file_download /
+file_upload) are kept once per SHA-256 under objects/ab/cd/<sha256>,
+hard-linked from Cowrie's downloads directory (copied only across
+filesystems), so disk use grows with the number of unique samples, not
+downloads. A SQLite index next to the objects records, per sample, its size,
+first/last seen, download count and the source IPs, URLs and sessions that
+fetched it. Logs are read incrementally, as in honeypot_sql.
+
+Usage:
+    python3 sample_store.py ingest /opt/cowrie/var/log/cowrie/
+    python3 sample_store.py add ./loot/*.bin
+    python3 sample_store.py show 3f2a9c
+    python3 sample_store.py list --ip 203.0.113.9
+    python3 sample_store.py export /tmp/samples --since 7d
+    python3 sample_store.py stats
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import hashlib
+import sqlite3
+import argparse
+
+from log_scan import open_log
+from log_time_index import log_files, parse_time
+from honeypot_sql import DEFAULT_LOG_DIR, _epoch, format_table
+import pipeline_profile
+
+DEFAULT_COWRIE_DIR = '/opt/cowrie'
+DEFAULT_DOWNLOADS = os.path.join(DEFAULT_COWRIE_DIR, 'var/lib/cowrie/downloads')
+SAMPLE_EVENTS = ('cowrie.session.file_download', 'cowrie.session.file_upload')
+COMMIT_EVERY = 50000
+HASH_CHUNK = 1 << 20
+MIN_PREFIX = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    first_line TEXT PRIMARY KEY, path TEXT, offset INTEGER, loaded_at REAL
+);
+
+-- stored_at is NULL until the payload itself is in objects/
+CREATE TABLE IF NOT EXISTS samples (
+    sha256 TEXT PRIMARY KEY, size INTEGER, first_seen INTEGER, last_seen INTEGER,
+    downloads INTEGER, stored_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_last_seen ON samples (last_seen);
+
+CREATE TABLE IF NOT EXISTS sample_ips (
+    sha256 TEXT, src_ip TEXT, first_seen INTEGER, last_seen INTEGER, downloads INTEGER,
+    PRIMARY KEY (sha256, src_ip)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sample_ips_src_ip ON sample_ips (src_ip);
+
+CREATE TABLE IF NOT EXISTS sample_urls (
+    sha256 TEXT, url TEXT, first_seen INTEGER, last_seen INTEGER, downloads INTEGER,
+    PRIMARY KEY (sha256, url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sample_urls_url ON sample_urls (url);
+
+CREATE TABLE IF NOT EXISTS sample_sessions (
+    sha256 TEXT, session TEXT, ts INTEGER, PRIMARY KEY (sha256, session)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sample_sessions_session ON sample_sessions (session);
+"""
+
+# first/last seen widen, counts add up
+_UPSERT = """
+    INSERT INTO {table} VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT ({key}) DO UPDATE SET
+        first_seen = min(coalesce({table}.first_seen, excluded.first_seen), coalesce(excluded.first_seen, {table}.first_seen)),
+        last_seen = max(coalesce({table}.last_seen, excluded.last_seen), coalesce(excluded.last_seen, {table}.last_seen)),
+        downloads = {table}.downloads + excluded.downloads
+"""
+SAMPLE_UPSERT = """
+    INSERT INTO samples VALUES (?, NULL, ?, ?, ?, NULL)
+    ON CONFLICT (sha256) DO UPDATE SET
+        first_seen = min(coalesce(samples.first_seen, excluded.first_seen), coalesce(excluded.first_seen, samples.first_seen)),
+        last_seen = max(coalesce(samples.last_seen, excluded.last_seen), coalesce(excluded.last_seen, samples.last_seen)),
+        downloads = samples.downloads + excluded.downloads
+"""
+IP_UPSERT = _UPSERT.format(table='sample_ips', key='sha256, src_ip')
+URL_UPSERT = _UPSERT.format(table='sample_urls', key='sha256, url')
+
+
+def default_store_path():
+    return os.getenv("PATRIOTPOT_SAMPLES", os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "samples"))
+
+
+def _is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+
+def file_sha256(path):
+    """(hex SHA-256, size) of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class _Seen:
+    """first/last seen and count for one (sample, ip|url) pair within a batch"""
+    __slots__ = ('first', 'last', 'count')
+
+    def __init__(self, ts):
+        self.first = self.last = ts
+        self.count = 0
+
+    def add(self, ts):
+        if ts is not None:
+            if self.first is None or ts < self.first:
+                self.first = ts
+            if self.last is None or ts > self.last:
+                self.last = ts
+        self.count += 1
+
+
+class Batch:
+    """
+    Sample sightings for one commit, folded per sample, so a binary fetched
+    thousands of times costs one row update rather than thousands
+    """
+
+    def __init__(self):
+        self.samples, self.ips, self.urls = {}, {}, {}
+        self.sessions = []
+        self.events = 0
+
+    @staticmethod
+    def _see(table, key, ts):
+        seen = table.get(key)
+        if seen is None:
+            seen = table[key] = _Seen(ts)
+        seen.add(ts)
+
+    def add(self, event):
+        """Record one download/upload event; returns its shasum (or None)"""
+        shasum = event.get('shasum')
+        if not _is_sha256(shasum):
+            return None
+        ts = _epoch(event.get('timestamp'))
+        self._see(self.samples, shasum, ts)
+        if event.get('src_ip'):
+            self._see(self.ips, (shasum, event['src_ip']), ts)
+        if event.get('url'):
+            self._see(self.urls, (shasum, event['url']), ts)
+        if event.get('session'):
+            self.sessions.append((shasum, event['session'], ts))
+        self.events += 1
+        return shasum
+
+    def __len__(self):
+        return self.events
+
+    def write(self, conn):
+        conn.executemany(SAMPLE_UPSERT, [(k, s.first, s.last, s.count) for k, s in self.samples.items()])
+        conn.executemany(IP_UPSERT, [(k[0], k[1], s.first, s.last, s.count) for k, s in self.ips.items()])
+        conn.executemany(URL_UPSERT, [(k[0], k[1], s.first, s.last, s.count) for k, s in self.urls.items()])
+        conn.executemany("INSERT OR IGNORE INTO sample_sessions VALUES (?, ?, ?)", self.sessions)
+        self.__init__()
+
+
+class SampleStore:
+    """Objects sharded by hash prefix under root/objects, indexed in root/index.sqlite"""
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or default_store_path())
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.root, 'index.sqlite'))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256[2:4], sha256)
+
+    def has(self, sha256):
+        return os.path.exists(self.object_path(sha256))
+
+    # -- objects ------------------------------------------------------------
+
+    def put(self, path, expected=None):
+        """
+        Store the file at path under its SHA-256; returns (sha256, added).
+        With expected (the shasum Cowrie logged) and the object already
+        present, the file is not read at all. A file whose content does not
+        match expected is not stored.
+        """
+        if expected and self.has(expected):
+            return expected, False
+        sha256, size = file_sha256(path)
+        if expected and sha256 != expected:
+            raise ValueError(f"{path}: content hash {sha256[:12]} does not match logged shasum {expected[:12]}")
+        dest = self.object_path(sha256)
+        if os.path.exists(dest):
+            return sha256, False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(path, dest)
+        except FileExistsError:
+            return sha256, False
+        except OSError as e:
+            # other filesystem, or fs.protected_hardlinks on a file we don't own
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK):
+                raise
+            tmp = f"{dest}.{os.getpid()}.tmp"
+            shutil.copyfile(path, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, dest)
+        with self.conn:
+            self.conn.execute("INSERT INTO samples (sha256, size, downloads, stored_at) VALUES (?, ?, 0, ?) "
+                              "ON CONFLICT (sha256) DO UPDATE SET size = excluded.size, stored_at = excluded.stored_at",
+                              (sha256, size, time.time()))
+        return sha256, True
+
+    def export(self, sha256s, directory):
+        """Hard-link (or copy) stored samples into directory as <sha256>; returns the number written"""
+        os.makedirs(directory, exist_ok=True)
+        written = 0
+        for sha256 in sha256s:
+            src, dest = self.object_path(sha256), os.path.join(directory, sha256)
+            if not os.path.exists(src) or os.path.exists(dest):
+                continue
+            try:
+                os.link(src, dest)
+            except OSError:
+                shutil.copyfile(src, dest)
+            written += 1
+        return written
+
+    # -- index --------------------------------------------------------------
+
+    def _payload_paths(self, event, cowrie_dir, downloads):
+        outfile = event.get('outfile')
+        if outfile:
+            yield outfile if os.path.isabs(outfile) else os.path.join(cowrie_dir, outfile)
+        yield os.path.join(downloads, event['shasum'])
+
+    def _store_payload(self, event, cowrie_dir, downloads, stats):
+        for path in self._payload_paths(event, cowrie_dir, downloads):
+            if not os.path.isfile(path):
+                continue
+            try:
+                _, added = self.put(path, expected=event['shasum'])
+            except (OSError, ValueError) as e:
+                print(f"Warning: {e}", file=sys.stderr)
+                stats['failed'] += 1
+                return
+            stats['stored' if added else 'present'] += 1
+            return
+        stats['missing'] += 1
+
+    def ingest_file(self, path, cowrie_dir=DEFAULT_COWRIE_DIR, downloads=DEFAULT_DOWNLOADS, stats=None):
+        """Index the unread part of one log and store the payloads it names; returns new sightings"""
+        stats = stats if stats is not None else {'stored': 0, 'present': 0, 'missing': 0, 'failed': 0}
+        with open_log(path) as f:
+            first = f.readline()
+            if not first.endswith(b'\n'):
+                return 0
+            first_line = hashlib.sha1(first).hexdigest()
+            row = self.conn.execute("SELECT offset FROM sources WHERE first_line = ?", (first_line,)).fetchone()
+            offset = start = row[0] if row else 0
+            f.seek(offset)
+
+            batch = Batch()
+            checked = set()  # payloads already looked at in this run
+            loaded = 0
+            loads = pipeline_profile.wrap("decode", json.loads)
+            commit = pipeline_profile.wrap("write", self._commit)
+            for line in pipeline_profile.wrap_iter("read", f):
+                if not line.endswith(b'\n'):
+                    break  # partial line still being written
+                offset += len(line)
+                if b'cowrie.session.file_' not in line:
+                    continue  # skip the JSON decode for everything else
+                try:
+                    event = loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(event, dict) or event.get('eventid') not in SAMPLE_EVENTS:
+                    continue
+                shasum = batch.add(event)
+                if shasum and shasum not in checked:
+                    checked.add(shasum)
+                    self._store_payload(event, cowrie_dir, downloads, stats)
+                if len(batch) >= COMMIT_EVERY:
+                    loaded += len(batch)
+                    commit(batch, first_line, path, offset)
+            loaded += len(batch)
+            commit(batch, first_line, path, offset)
+        pipeline_profile.count(events=loaded, bytes=offset - start)
+        return loaded
+
+    def _commit(self, batch, first_line, path, offset):
+        # sightings and the new offset land together, so an interrupted run resumes cleanly
+        with self.conn:
+            if len(batch):
+                batch.write(self.conn)
+            self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                              (first_line, path, offset, time.time()))
+
+    def ingest(self, paths=None, cowrie_dir=DEFAULT_COWRIE_DIR, downloads=DEFAULT_DOWNLOADS, verbose=False):
+        """Incrementally index Cowrie logs (files or log directories); returns (sightings, stats)"""
+        stats = {'stored': 0, 'present': 0, 'missing': 0, 'failed': 0}
+        total = 0
+        for path in log_files(paths or [DEFAULT_LOG_DIR]):
+            try:
+                count = self.ingest_file(path, cowrie_dir, downloads, stats)
+            except OSError as e:
+                print(f"Warning: could not read {path}: {e}", file=sys.stderr)
+                continue
+            total += count
+            if verbose and count:
+                print(f"{path}: {count:,} new downloads/uploads")
+        return total, stats
+
+    def resolve(self, prefix):
+        """Full SHA-256 for a unique hex prefix (at least MIN_PREFIX characters)"""
+        prefix = prefix.lower()
+        if len(prefix) < MIN_PREFIX:
+            raise ValueError(f"Hash prefix needs at least {MIN_PREFIX} characters")
+        rows = self.conn.execute("SELECT sha256 FROM samples WHERE sha256 >= ? AND sha256 < ? LIMIT 2",
+                                 (prefix, prefix + 'g')).fetchall()
+        if not rows:
+            raise KeyError(f"No sample matches {prefix}")
+        if len(rows) > 1:
+            raise KeyError(f"{prefix} is ambiguous")
+        return rows[0][0]
+
+    def lookup(self, sha256):
+        """Everything the index knows about one sample, as a dict"""
+        row = self.conn.execute("SELECT size, first_seen, last_seen, downloads, stored_at FROM samples "
+                                "WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        size, first_seen, last_seen, downloads, stored_at = row
+        ips = self.conn.execute("SELECT src_ip, first_seen, last_seen, downloads FROM sample_ips "
+                                "WHERE sha256 = ? ORDER BY downloads DESC", (sha256,)).fetchall()
+        urls = self.conn.execute("SELECT url, first_seen, last_seen, downloads FROM sample_urls "
+                                 "WHERE sha256 = ? ORDER BY downloads DESC", (sha256,)).fetchall()
+        sessions = self.conn.execute("SELECT session FROM sample_sessions WHERE sha256 = ? ORDER BY ts",
+                                     (sha256,)).fetchall()
+        return {
+            'sha256': sha256, 'size': size, 'first_seen': first_seen, 'last_seen': last_seen,
+            'downloads': downloads, 'path': self.object_path(sha256) if stored_at else None,
+            'src_ips': [dict(zip(('src_ip', 'first_seen', 'last_seen', 'downloads'), r)) for r in ips],
+            'urls': [dict(zip(('url', 'first_seen', 'last_seen', 'downloads'), r)) for r in urls],
+            'sessions': [r[0] for r in sessions],
+        }
+
+    def select(self, src_ip=None, url=None, since=None, stored=False, limit=None):
+        """(sha256, size, first_seen, last_seen, downloads, ips, urls) rows, most downloaded first"""
+        where, params = [], []
+        if src_ip:
+            where.append("sha256 IN (SELECT sha256 FROM sample_ips WHERE src_ip = ?)")
+            params.append(src_ip)
+        if url:
+            where.append("sha256 IN (SELECT sha256 FROM sample_urls WHERE url LIKE ?)")
+            params.append(f"%{url}%")
+        if since is not None:
+            where.append("last_seen >= ?")
+            params.append(since)
+        if stored:
+            where.append("stored_at IS NOT NULL")
+        sql = ("SELECT sha256, size, first_seen, last_seen, downloads, "
+               "(SELECT count(*) FROM sample_ips i WHERE i.sha256 = s.sha256), "
+               "(SELECT count(*) FROM sample_urls u WHERE u.sha256 = s.sha256) FROM samples s"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY downloads DESC, last_seen DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, params).fetchall()
+
+    def summary(self):
+        samples, stored, stored_bytes, downloads, downloaded_bytes = self.conn.execute(
+            "SELECT count(*), count(stored_at), coalesce(sum(CASE WHEN stored_at IS NOT NULL THEN size END), 0), "
+            "coalesce(sum(downloads), 0), coalesce(sum(size * downloads), 0) FROM samples").fetchone()
+        return {'samples': samples, 'stored': stored, 'stored_bytes': stored_bytes,
+                'downloads': downloads, 'downloaded_bytes': downloaded_bytes}
+
+
+def _iso(ts):
+    return time.strftime('%Y-%m-%d %H:%M', time.gmtime(ts)) if ts is not None else ''
+
+
+def _add_paths(store, paths):
+    added = present = 0
+    for path in paths:
+        files = [os.path.join(d, name) for d, _, names in os.walk(path) for name in names] \
+            if os.path.isdir(path) else [path]
+        for file in files:
+            try:
+                _, new = store.put(file)
+            except OSError as e:
+                print(f"Warning: {e}", file=sys.stderr)
+                continue
+            added += new
+            present += not new
+    return added, present
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Content-addressed store and index for attacker payloads')
+    parser.add_argument('--store', default=None, help=f'Store directory (default: $PATRIOTPOT_SAMPLES or {default_store_path()})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help='Index downloads/uploads from Cowrie logs and store their payloads')
+    p.add_argument('paths', nargs='*', help=f'Log files or directories (default: {DEFAULT_LOG_DIR})')
+    p.add_argument('--cowrie-dir', default=DEFAULT_COWRIE_DIR, help='Cowrie root that "outfile" paths are relative to')
+    p.add_argument('--downloads', default=os.getenv('COWRIE_DOWNLOADS', DEFAULT_DOWNLOADS),
+                   help='Cowrie downloads directory (default: $COWRIE_DOWNLOADS or %(default)s)')
+
+    p = sub.add_parser('add', help='Store files or directories of samples directly')
+    p.add_argument('paths', nargs='+')
+
+    p = sub.add_parser('show', help='Everything known about one sample (JSON)')
+    p.add_argument('hash', help='SHA-256 or a unique prefix of it')
+
+    p = sub.add_parser('path', help='Print the stored file for a sample')
+    p.add_argument('hash', help='SHA-256 or a unique prefix of it')
+
+    for name, help_text in (('list', 'List samples, most downloaded first'),
+                            ('export', 'Hard-link samples into a directory')):
+        p = sub.add_parser(name, help=help_text)
+        if name == 'export':
+            p.add_argument('directory')
+        p.add_argument('--ip', help='Only samples fetched by this source IP')
+        p.add_argument('--url', help='Only samples fetched from URLs containing this')
+        p.add_argument('--since', help="Only samples seen since (e.g. '7d', '2025-10-01')")
+        p.add_argument('--limit', type=int, default=50 if name == 'list' else None)
+
+    sub.add_parser('stats', help='Samples, downloads and disk use')
+
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with pipeline_profile.profiled(args, "sample_store"), SampleStore(args.store) as store:
+        started = time.time()
+        if args.command == 'ingest':
+            count, stats = store.ingest(args.paths, args.cowrie_dir, args.downloads, verbose=True)
+            print(f"Indexed {count:,} new downloads/uploads in {time.time() - started:.1f}s: "
+                  f"{stats['stored']:,} samples stored, {stats['present']:,} already present, "
+                  f"{stats['missing']:,} payloads missing, {stats['failed']:,} failed")
+        elif args.command == 'add':
+            added, present = _add_paths(store, args.paths)
+            print(f"Stored {added:,} new samples ({present:,} already present)")
+        elif args.command in ('show', 'path'):
+            try:
+                sha256 = store.resolve(args.hash)
+            except (KeyError, ValueError) as e:
+                raise SystemExit(str(e).strip("'\""))
+            info = store.lookup(sha256)
+            if args.command == 'path':
+                if not info['path']:
+                    raise SystemExit(f"{sha256} is indexed but its payload is not stored")
+                print(info['path'])
+            else:
+                print(json.dumps(info, indent=2))
+        elif args.command in ('list', 'export'):
+            since = parse_time(args.since) if args.since else None
+            rows = store.select(args.ip, args.url, since, stored=args.command == 'export', limit=args.limit)
+            if args.command == 'export':
+                written = store.export([row[0] for row in rows], args.directory)
+                print(f"Exported {written:,} samples to {args.directory}")
+            else:
+                print(format_table(['sha256', 'size', 'first_seen', 'last_seen', 'downloads', 'ips', 'urls'],
+                                   [(r[0][:16], r[1] if r[1] is not None else '', _iso(r[2]), _iso(r[3]),
+                                     r[4], r[5], r[6]) for r in rows]))
+                print(f"{len(rows)} samples in {(time.time() - started) * 1000:.0f} ms", file=sys.stderr)
+        else:
+            s = store.summary()
+            print(f"Samples:   {s['samples']:,} indexed, {s['stored']:,} stored ({s['stored_bytes'] / 1e6:,.1f} MB)")
+            print(f"Downloads: {s['downloads']:,} ({s['downloaded_bytes'] / 1e6:,.1f} MB if each were kept)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
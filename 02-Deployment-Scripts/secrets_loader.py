@@ -11,7 +11,9 @@ Never logs or prints secret values. Only logs presence/absence and latency.
 """
 
 import os
+import sys
 import logging
+import argparse
 import json
 import time
 from typing import Optional, Dict, List
@@ -228,14 +230,18 @@ def is_present(key: str) -> bool:
     return bool(get(key))
 
 
-# Safe summary for testing/debugging
-if __name__ == "__main__":
+def main(argv=None):
+    """Safe summary for testing/debugging: which keys are present, never their values"""
+    parser = argparse.ArgumentParser(description='Report which threat-intel secrets are configured (never their values)')
+    parser.add_argument('--env', default="/opt/cowrie/discord-monitor/.env", help='.env file to load (default: %(default)s)')
+    args = parser.parse_args(argv)
+    
     print("=" * 60)
     print("Secrets Loader - Safe Summary")
     print("=" * 60)
     
     # Load from .env
-    env_loaded = load_env()
+    env_loaded = load_env(args.env)
     print(f"\n.env file loaded: {env_loaded}")
     
     # Check for AWS secret name
@@ -273,3 +279,9 @@ if __name__ == "__main__":
         print("\n✓ All required secrets validated successfully!")
     except SecretMissingError as e:
         print(f"\n✗ Validation failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
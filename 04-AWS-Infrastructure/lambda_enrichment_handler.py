@@ -1,19 +1,148 @@
 #!/usr/bin/env python3
 """
 Lambda Enrichment Handler - Decoupled threat intelligence pipeline
-Cowrie → SNS → Lambda → Discord + S3
+Cowrie → SNS (or SQS) → Lambda → S3 → Discord queue → Discord
 """
 
-import os, json, time, hashlib, requests, boto3
+import os, sys, json, hashlib, threading
+from concurrent.futures import wait
 from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+try:
+    import threat_intel
+    import pipeline_telemetry as telemetry
+except ImportError:
+    # Running from a repo checkout rather than the deployment zip
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02-Deployment-Scripts"))
+    import threat_intel
+    import pipeline_telemetry as telemetry
 
 DISCORD_WEBHOOK = os.environ["DISCORD_WEBHOOK"]
 S3_BUCKET = os.environ["S3_BUCKET"]
 GREYNOISE_KEY = os.getenv("GREYNOISE_KEY", "t6UcPKF1RR1hn6eRuOsqc7X5FU8uM6ldUdcRUWA6uldMgsTysCQnWhmk2SIZN3C1")
 ABUSEIPDB_KEY = os.getenv("ABUSEIPDB_KEY")
 SHODAN_KEY = os.getenv("SHODAN_KEY")
+PROVIDER_KEYS = {"greynoise": GREYNOISE_KEY, "abuseipdb": ABUSEIPDB_KEY, "shodan": SHODAN_KEY}
+
+# Optional SQS queue for the Discord delivery stage (see discord_handler)
+DISCORD_QUEUE_URL = os.getenv("DISCORD_QUEUE_URL")
+
+# Records processed concurrently per invocation, and the safety margin kept
+# before the Lambda timeout so failed records can still be reported
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+DEADLINE_MARGIN_MS = int(os.getenv("DEADLINE_MARGIN_MS", "2000"))
+DEFAULT_DEADLINE_MS = 30000
+
+# Providers queried per event, plus the latency budget, hedge delay for slow
+# providers, hard per-request timeout, circuit breaker and cache tuning
+ENRICH_PROVIDERS = [name.strip() for name in os.getenv("ENRICH_PROVIDERS", "greynoise,abuseipdb").split(",") if name.strip()]
+_unknown = [name for name in ENRICH_PROVIDERS if name not in threat_intel.PROVIDERS]
+if _unknown:
+    raise ValueError(f"ENRICH_PROVIDERS: unknown provider(s) {', '.join(_unknown)}; "
+                     f"valid: {', '.join(sorted(threat_intel.PROVIDERS))}")
+ENRICH_BUDGET_MS = int(os.getenv("ENRICH_BUDGET_MS", "2500"))
+HEDGE_AFTER_MS = int(os.getenv("HEDGE_AFTER_MS", "800"))
+PROVIDER_TIMEOUT_S = 5
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_S = int(os.getenv("BREAKER_COOLDOWN_S", "30"))
+ENRICH_CACHE_TTL_S = int(os.getenv("ENRICH_CACHE_TTL_S", "3600"))
+
+# Requests in flight per provider host: one per record worker, doubled when
+# a slow request is hedged. Sizes both the keep-alive pools and the
+# enrichment executor, so neither queues behind the other.
+PROVIDER_CONCURRENCY = MAX_WORKERS * (2 if HEDGE_AFTER_MS else 1)
+
+# Keep-alive pool size per provider host (<NAME>_POOL_SIZE), one warm
+# connection per concurrent request to avoid pool churn. Provider endpoints
+# honour <NAME>_URL overrides in threat_intel.
+POOL_SIZES = {
+    threat_intel.PROVIDERS[name].base_url: int(os.getenv(f"{name.upper()}_POOL_SIZE", PROVIDER_CONCURRENCY))
+    for name in ENRICH_PROVIDERS
+}
+POOL_SIZES["{0.scheme}://{0.netloc}".format(urlsplit(DISCORD_WEBHOOK))] = int(os.getenv("DISCORD_POOL_SIZE", MAX_WORKERS))
+
+# Clients live at module scope so warm invocations reuse them. They are built
+# on first use: boto3 and requests are only imported when actually needed.
+_http = None
+_s3 = None
+_sqs = None
+_executor = None
+_enrichment = None
+
+def get_http():
+    """Pooled HTTP session held across warm invocations"""
+    global _http
+    if _http is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        for prefix, size in POOL_SIZES.items():
+            session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0))
+        _http = session
+    return _http
+
+def get_s3():
+    """S3 client created on first upload"""
+    global _s3
+    if _s3 is None:
+        import boto3
+        _s3 = boto3.client("s3")
+    return _s3
+
+def get_sqs():
+    """SQS client created on first queued alert"""
+    global _sqs
+    if _sqs is None:
+        import boto3
+        _sqs = boto3.client("sqs")
+    return _sqs
+
+def get_executor():
+    """
+    Worker pool shared by warm invocations. A record still running when its
+    invocation hit the deadline keeps a worker until it reaches its next
+    Batch check-in (bounded by the enrichment budget) or finishes its alert.
+    """
+    global _executor
+    if _executor is None:
+        _executor = telemetry.TrackedExecutor(max_workers=MAX_WORKERS)
+    return _executor
 
-s3 = boto3.client("s3")
+def get_enrichment():
+    """Shared enrichment service; its result cache and breakers persist while warm"""
+    global _enrichment
+    if _enrichment is None:
+        _enrichment = threat_intel.EnrichmentService(
+            providers=ENRICH_PROVIDERS,
+            keys=PROVIDER_KEYS,
+            cache=threat_intel.ResultCache(ttl=ENRICH_CACHE_TTL_S),
+            session_factory=get_http,
+            budget_ms=ENRICH_BUDGET_MS,
+            hedge_after_ms=HEDGE_AFTER_MS,
+            timeout=PROVIDER_TIMEOUT_S,
+            breaker_threshold=BREAKER_THRESHOLD,
+            breaker_cooldown=BREAKER_COOLDOWN_S,
+            # own pool, so record workers never wait on themselves
+            workers=PROVIDER_CONCURRENCY * len(ENRICH_PROVIDERS),
+            concurrency=PROVIDER_CONCURRENCY
+        )
+    return _enrichment
+
+def queue_depths():
+    """Unfinished work in the record and enrichment pools (pipeline.queue.depth)"""
+    depths = []
+    if _executor is not None:
+        depths.append((_executor.outstanding, {"queue": "records"}))
+    if _enrichment is not None:
+        depths.append((_enrichment.executor.outstanding, {"queue": "enrichment"}))
+    return depths
+
+# Spans and metrics are exported only when OTEL_EXPORTER_OTLP_ENDPOINT is set
+# (and the opentelemetry packages are bundled); otherwise these are no-ops
+telemetry.setup("honeypot-enrichment-lambda")
+telemetry.observe("pipeline.queue.depth", queue_depths, "{task}", "Work submitted to executors, not yet finished")
 
 # MITRE ATT&CK Mapping
 ATTACK_PATTERNS = {
@@ -26,46 +155,9 @@ ATTACK_PATTERNS = {
 def sha256(data):
     return hashlib.sha256(data.encode("utf-8")).hexdigest()
 
-def enrich_ip(ip):
-    result = {"ip": ip}
-    
-    # GreyNoise enrichment
-    if GREYNOISE_KEY:
-        try:
-            r = requests.get(
-                f"https://api.greynoise.io/v3/community/{ip}",
-                headers={"key": GREYNOISE_KEY}, timeout=5
-            )
-            if r.status_code == 200:
-                j = r.json()
-                result["greynoise"] = {
-                    "classification": j.get("classification"),
-                    "name": j.get("name"),
-                    "noise": j.get("noise", False),
-                    "riot": j.get("riot", False)
-                }
-        except Exception as e:
-            result["greynoise_err"] = str(e)
-    
-    # AbuseIPDB enrichment
-    if ABUSEIPDB_KEY:
-        try:
-            r = requests.get(
-                "https://api.abuseipdb.com/api/v2/check",
-                params={"ipAddress": ip, "maxAgeInDays": 90},
-                headers={"Key": ABUSEIPDB_KEY, "Accept": "application/json"},
-                timeout=5
-            )
-            if r.status_code == 200:
-                j = r.json()
-                result["abuseipdb"] = {
-                    "score": j["data"]["abuseConfidenceScore"],
-                    "country": j["data"]["countryCode"]
-                }
-        except Exception as e:
-            result["abuseipdb_err"] = str(e)
-    
-    return result
+def enrich_ip(ip, budget_ms=None):
+    """Enrich an IP through the shared threat_intel service (see threat_intel.EnrichmentService.enrich)"""
+    return get_enrichment().enrich(ip, budget_ms)
 
 def classify_command(command):
     """Classify command into MITRE ATT&CK technique"""
@@ -78,12 +170,12 @@ def classify_command(command):
     return {"phase": "unknown", "mitre": "Unknown", "severity": "low"}
 
 def calculate_threat_score(event, enrichment):
-    """Calculate overall threat score"""
+    """Calculate overall threat score (missing providers simply add nothing)"""
     score = 0
     
     # AbuseIPDB score
     if "abuseipdb" in enrichment:
-        score += enrichment["abuseipdb"]["score"]
+        score += enrichment["abuseipdb"].get("score") or 0
     
     # GreyNoise classification
     if "greynoise" in enrichment:
@@ -93,7 +185,7 @@ def calculate_threat_score(event, enrichment):
     # Command severity
     if "command_analysis" in enrichment:
         severity_map = {"critical": 40, "high": 30, "medium": 20, "low": 10}
-        score += severity_map.get(enrichment["command_analysis"]["severity"], 0)
+        score += severity_map.get(enrichment["command_analysis"].get("severity"), 0)
     
     return min(score, 100)
 
@@ -114,6 +206,10 @@ def discord_embed(event, enrichment):
         ca = enrichment["command_analysis"]
         desc += f"**MITRE ATT&CK:** {ca['mitre']}\n"
         desc += f"**Attack Phase:** {ca['phase'].upper()}\n"
+
+    if enrichment.get("partial"):
+        missing = sorted(k[:-4] for k in enrichment if k.endswith("_err"))
+        desc += f"**Enrichment:** partial (no data from {', '.join(missing)})\n"
     
     # Build fields
     fields = [
@@ -150,12 +246,14 @@ def discord_embed(event, enrichment):
     
     return {"embeds": [embed]}
 
-def upload_s3(obj, key_prefix="events/"):
+def archive_key(message, raw, key_prefix="events/"):
+    """S3 key derived from the event itself, so a redelivered record overwrites its own object"""
+    day = str(raw.get("timestamp", ""))[:10].replace("-", "/") or datetime.now(timezone.utc).strftime("%Y/%m/%d")
+    return f"{key_prefix}{day}/{sha256(message)[:32]}.json"
+
+def upload_s3(obj, key):
     """Upload enriched event to S3 with immutable storage"""
-    timestamp = datetime.now(timezone.utc).strftime("%Y/%m/%d")
-    key = f"{key_prefix}{timestamp}/{int(time.time())}-{sha256(obj)[:12]}.json"
-    
-    s3.put_object(
+    get_s3().put_object(
         Bucket=S3_BUCKET,
         Key=key,
         Body=obj,
@@ -164,39 +262,181 @@ def upload_s3(obj, key_prefix="events/"):
     )
     return key
 
-def lambda_handler(event, context):
-    """Main Lambda handler"""
+def record_id(record):
+    """Identifier Lambda expects back in batchItemFailures"""
+    if "messageId" in record:
+        return record["messageId"]
+    return record.get("Sns", {}).get("MessageId", "")
+
+def record_message(record):
+    """Cowrie event JSON from an SNS record or an SQS record (raw or SNS envelope)"""
+    if "Sns" in record:
+        return record["Sns"]["Message"]
+    body = record["body"]
+    envelope = json.loads(body)
+    if isinstance(envelope, dict) and envelope.get("Type") == "Notification":
+        return envelope["Message"]
+    return body
+
+def post_discord(payload):
+    """POST an alert to the webhook, returns the HTTP status"""
+    r = get_http().post(DISCORD_WEBHOOK, json=payload, timeout=6)
+    return r.status_code
+
+def notify(payload):
+    """Hand the alert to the Discord queue stage, or post inline if none is configured"""
+    try:
+        if DISCORD_QUEUE_URL:
+            get_sqs().send_message(QueueUrl=DISCORD_QUEUE_URL, MessageBody=json.dumps(payload))
+            print("Discord alert queued")
+        else:
+            print(f"Discord alert sent: {post_discord(payload)}")
+    except Exception as e:
+        # The event is already archived; failing the record now would only
+        # redeliver it for a duplicate archive and a second alert attempt
+        print(f"Discord error: {e}")
+
+class Batch:
+    """
+    Deadline state for one invocation, shared with its record workers.
+    A running future cannot be cancelled, so workers check in before their
+    alert: once the handler has closed the batch and reported a record as
+    failed, that record stops short of alerting and the redelivery does it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.closed = False
+        self.committed = set()
+
+    def commit(self, record):
+        """Claim the record's alert; False once the handler has given up on it"""
+        with self.lock:
+            if self.closed:
+                return False
+            self.committed.add(id(record))
+            return True
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+
+    def is_committed(self, record):
+        with self.lock:
+            return id(record) in self.committed
+
+def process_record(record, batch=None):
+    """Enrich, archive and alert on a single Cowrie event"""
+    if batch is not None and batch.closed:
+        raise RuntimeError("deadline passed before the record started")
+    with telemetry.span("decode"):
+        message = record_message(record)
+        raw = json.loads(message)
+    telemetry.EVENTS.add(1, {"stage": "lambda"})
     
-    for record in event["Records"]:
-        msg = record["Sns"]["Message"]
-        raw = json.loads(msg)
-        
-        # Extract IP
-        ip = raw.get("src_ip") or raw.get("peerIP") or "0.0.0.0"
-        
-        # Enrich IP
+    # Extract IP
+    ip = raw.get("src_ip") or raw.get("peerIP") or "0.0.0.0"
+    
+    # Enrich IP
+    with telemetry.span("enrich", ip=ip):
         enrichment = enrich_ip(ip)
-        
-        # Classify command if present
-        if raw.get("input"):
+    
+    # Classify command if present
+    if raw.get("input"):
+        with telemetry.span("classify"):
             enrichment["command_analysis"] = classify_command(raw["input"])
-        
-        # Archive enriched event to S3
-        enriched = {
-            "event": raw,
-            "enrichment": enrichment,
-            "processed_at": datetime.now(timezone.utc).isoformat()
-        }
-        
-        s3_key = upload_s3(json.dumps(enriched))
-        print(f"Archived to S3: {s3_key}")
-        
-        # Send Discord alert
-        payload = discord_embed(raw, enrichment)
-        try:
-            r = requests.post(DISCORD_WEBHOOK, json=payload, timeout=6)
-            print(f"Discord alert sent: {r.status_code}")
-        except Exception as e:
-            print(f"Discord error: {e}")
-    
-    return {"statusCode": 200, "body": "Processed successfully"}
+    
+    # Archive enriched event to S3
+    enriched = {
+        "event": raw,
+        "enrichment": enrichment,
+        "processed_at": datetime.now(timezone.utc).isoformat()
+    }
+    
+    # Abandoned records may still archive: the key is stable, so the
+    # redelivery overwrites the same object
+    with telemetry.span("archive"):
+        s3_key = upload_s3(json.dumps(enriched), archive_key(message, raw))
+    print(f"Archived to S3: {s3_key}")
+    
+    if batch is not None and not batch.commit(record):
+        raise RuntimeError("deadline passed before alerting")
+    
+    # Alerting never blocks archival: the event is already safe in S3
+    with telemetry.span("notify"):
+        notify(discord_embed(raw, enrichment))
+    return s3_key
+
+def deadline_seconds(context):
+    """Time left for this batch, keeping a margin to build the response"""
+    if context is None:
+        remaining_ms = DEFAULT_DEADLINE_MS
+    else:
+        remaining_ms = context.get_remaining_time_in_millis()
+    return max(remaining_ms - DEADLINE_MARGIN_MS, 0) / 1000.0
+
+def batch_response(failed, total):
+    """SQS-style partial batch response; only failed records are retried"""
+    return {
+        "statusCode": 200,
+        "body": f"Processed {total - len(failed)}/{total} records",
+        "batchItemFailures": [{"itemIdentifier": record_id(r)} for r in failed]
+    }
+
+def lambda_handler(event, context):
+    """Main Lambda handler"""
+    records = event["Records"]
+    deadline = deadline_seconds(context)
+    
+    batch = Batch()
+    with telemetry.span("invocation", records=len(records)):
+        futures = {get_executor().submit(telemetry.in_current_context(process_record), r, batch): r for r in records}
+        done, not_done = wait(futures, timeout=deadline)
+    batch.close()
+    
+    failed = []
+    for future in not_done:
+        if batch.is_committed(futures[future]):
+            # Archived and alerting: it finishes on the shared pool (or on the
+            # next warm invocation) and must not be redelivered for a second alert
+            print(f"Record {record_id(futures[future])} archived, alert still in flight")
+            continue
+        # Out of time: report as failed so the record is redelivered, not dropped.
+        # Queued records are cancelled; running ones stop at their next check-in.
+        future.cancel()
+        failed.append(futures[future])
+        print(f"Deadline reached before record {record_id(futures[future])} finished")
+    for future in done:
+        if future.exception() is not None:
+            failed.append(futures[future])
+            print(f"Record {record_id(futures[future])} failed: {future.exception()}")
+    
+    # SNS invokes asynchronously and has no partial batch response, so a
+    # failure there must raise to trigger Lambda's retry / DLQ handling.
+    telemetry.flush()
+    if any("Sns" in r for r in failed):
+        raise RuntimeError(f"{len(failed)}/{len(records)} records failed")
+    
+    return batch_response(failed, len(records))
+
+def discord_handler(event, context):
+    """Queue stage: deliver alerts from DISCORD_QUEUE_URL to the webhook"""
+    records = event["Records"]
+    deadline = deadline_seconds(context)
+    
+    with telemetry.span("notify", records=len(records)):
+        futures = {get_executor().submit(post_discord, json.loads(r["body"])): r for r in records}
+        done, not_done = wait(futures, timeout=deadline)
+    
+    failed = [futures[f] for f in not_done]
+    for future in done:
+        if future.exception() is not None:
+            print(f"Discord error: {future.exception()}")
+            failed.append(futures[future])
+        elif future.result() == 429 or future.result() >= 500:
+            # Rate limited or Discord is down: let SQS redeliver after the visibility timeout
+            print(f"Discord returned {future.result()}, will retry")
+            failed.append(futures[future])
+    
+    telemetry.flush()
+    return batch_response(failed, len(records))
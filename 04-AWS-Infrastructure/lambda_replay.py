@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Lambda Replay - Load-test lambda_handler with recorded Cowrie traffic
+Reads cowrie.json (or rotated/.gz logs and event spools) and invokes
+lambda_handler with SQS- or SNS-shaped batches at a fixed rate, as fast as
+possible, or time-compressed from the original timestamps. GreyNoise,
+AbuseIPDB and the Discord webhook are served by the lambda_benchmark
+stand-ins (one process and port each, like separate hosts) with injectable
+latency, 429s and 5xx errors; S3 is in memory.
+
+Each worker process is one warm Lambda container (its own HTTP pool, result
+cache and circuit breakers) handling one invocation at a time, so
+--concurrency plays the role of the function's reserved concurrency.
+
+Reports offered vs achieved throughput, queue wait and per-stage latency
+percentiles (enrich, archive, alert, record, invocation), failed records and
+alert loss (records archived whose Discord alert was not delivered).
+
+Usage:
+    python3 lambda_replay.py cowrie.json --speedup 60 --concurrency 10
+    python3 lambda_replay.py cowrie.json --rate 200 --duration 60 --throttle discord=0.2
+    python3 lambda_replay.py /opt/cowrie/var/log/cowrie/ --max --limit 50000 --latency greynoise=300 --json replay.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+import urllib.request
+from collections import defaultdict
+from http.server import ThreadingHTTPServer
+
+from lambda_benchmark import Fault, LocalS3, StandInHandler, bench_env, percentile
+from lambda_backfill import ordered_logs, read_from
+from log_time_index import ts_to_epoch
+
+ROUTES = ("greynoise", "abuseipdb", "discord")
+STAGES = ("queue_wait", "invocation", "record", "enrich", "archive", "alert")
+DEFAULT_TIMEOUT_MS = 30000
+
+# ---------------------------------------------------------------------------
+# Container side (runs in the worker processes)
+# ---------------------------------------------------------------------------
+
+_handler = None
+_samples = None
+_counts = None
+
+
+class ReplayContext:
+    """Just enough of the Lambda context object for deadline_seconds()"""
+    def __init__(self, timeout_ms):
+        self.deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+def _timed(stage, fn):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        _samples[stage].append((time.perf_counter() - started) * 1000)
+        if stage == "record":
+            _counts["processed"] += 1
+        elif stage == "enrich" and result.get("partial"):
+            _counts["partial_enrichment"] += 1
+        return result
+    return wrapper
+
+
+def _init_container(env):
+    global _handler
+    os.environ.update(env)
+    sys.stdout = open(os.devnull, "w")  # the handler logs every record
+    import lambda_enrichment_handler as handler
+    handler._s3 = LocalS3()
+    # process_record and the stages it calls are looked up as module globals
+    for stage, name in (("record", "process_record"), ("enrich", "enrich_ip"),
+                        ("archive", "upload_s3"), ("alert", "notify")):
+        setattr(handler, name, _timed(stage, getattr(handler, name)))
+    _handler = handler
+
+
+def _invoke(records, scheduled, timeout_ms):
+    """One invocation; returns timings and counts for the parent to aggregate"""
+    global _samples, _counts
+    _samples, _counts = defaultdict(list), defaultdict(int)
+    started = time.time()
+    failed = 0
+    try:
+        response = _handler.lambda_handler({"Records": records}, ReplayContext(timeout_ms))
+        failed = len(response["batchItemFailures"])
+    except Exception:
+        # SNS has no partial batch response: Lambda retries the whole event
+        failed = len(records)
+    finished = time.time()
+    return {
+        "scheduled": scheduled, "started": started, "finished": finished,
+        "records": len(records), "failed": failed,
+        "samples": dict(_samples), "counts": dict(_counts),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Stand-ins
+# ---------------------------------------------------------------------------
+
+def _serve_stand_in(route, fault, connect_delay, response_delay, ports):
+    StandInHandler.faults = {route: fault} if fault else {}
+    StandInHandler.connect_delay = connect_delay
+    StandInHandler.response_delay = response_delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    ports.put((route, server.server_address[1]))
+    server.serve_forever()
+
+
+def start_stand_ins(ctx, faults, connect_ms, response_ms):
+    """One stand-in process per route; returns ({route: port}, processes)"""
+    ports = ctx.Queue()
+    procs = [ctx.Process(target=_serve_stand_in, daemon=True,
+                         args=(route, faults.get(route), connect_ms / 1000.0, response_ms / 1000.0, ports))
+             for route in ROUTES]
+    for proc in procs:
+        proc.start()
+    return dict(ports.get(timeout=10) for _ in procs), procs
+
+
+def stand_in_env(ports):
+    env = bench_env(ports["greynoise"])
+    env["ABUSEIPDB_URL"] = f"http://127.0.0.1:{ports['abuseipdb']}"
+    env["DISCORD_WEBHOOK"] = f"http://127.0.0.1:{ports['discord']}/api/webhooks/replay/token"
+    env.pop("DISCORD_QUEUE_URL", None)  # alerts go to the webhook stand-in
+    return env
+
+
+def stand_in_stats(ports):
+    stats = {}
+    for route, port in ports.items():
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=5) as r:
+            stats[route] = json.load(r).get(route, {})
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Driver side
+# ---------------------------------------------------------------------------
+
+def replay_events(paths, eventids=None, limit=None):
+    """(epoch seconds, JSON message) for each event, oldest log first"""
+    count = 0
+    for path in ordered_logs(paths):
+        try:
+            for _, event in read_from(path, 0):
+                if eventids and event.get("eventid") not in eventids:
+                    continue
+                ts = event.get("timestamp")
+                try:
+                    epoch = ts_to_epoch(ts) + (int(ts[20:26]) / 1e6 if ts[19:20] == "." else 0.0)
+                except (TypeError, ValueError, IndexError):
+                    epoch = None
+                yield epoch, json.dumps(event)
+                count += 1
+                if limit and count >= limit:
+                    return
+        except FileNotFoundError:
+            print(f"Warning: log file not found: {path}", file=sys.stderr)
+
+
+def due_times(events, rate=None, speedup=None):
+    """(seconds after replay start, message); never goes backwards"""
+    first = None
+    due = 0.0
+    for n, (epoch, message) in enumerate(events):
+        if speedup:
+            if epoch is not None:
+                first = epoch if first is None else first
+                due = max(due, (epoch - first) / speedup)
+        elif rate:
+            due = n / rate
+        yield due, message
+
+
+def batches(timed, batch_size, window_s):
+    """
+    (release time, messages) the way an event source mapping batches: a batch
+    goes out when full or when the batching window after its first message ends
+    """
+    batch, first_due = [], 0.0
+    for due, message in timed:
+        if batch and due > first_due + window_s:
+            yield first_due + window_s, batch
+            batch = []
+        if not batch:
+            first_due = due
+        batch.append(message)
+        if len(batch) >= batch_size:
+            yield due, batch
+            batch = []
+    if batch:
+        yield first_due + window_s, batch
+
+
+def shape_records(messages, source, first_id):
+    if source == "sns":
+        return [{"EventSource": "aws:sns", "Sns": {"MessageId": f"replay-{first_id + i}", "Message": m}}
+                for i, m in enumerate(messages)]
+    return [{"eventSource": "aws:sqs", "messageId": f"replay-{first_id + i}", "body": m}
+            for i, m in enumerate(messages)]
+
+
+def stage_summary(samples_ms):
+    return {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p90_ms": round(percentile(samples_ms, 90), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2) if samples_ms else 0.0,
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 2) if samples_ms else 0.0,
+    }
+
+
+def parse_faults(args, parser):
+    """--latency/--jitter/--throttle/--errors ROUTE=VALUE into {route: Fault}"""
+    faults = {}
+    for option, attr in (("latency", "latency_ms"), ("jitter", "jitter_ms"),
+                         ("throttle", "throttle_rate"), ("errors", "error_rate")):
+        for pair in getattr(args, option) or []:
+            route, sep, value = pair.partition("=")
+            routes = ROUTES[:2] if route == "providers" else (route,)
+            if not sep or any(r not in ROUTES for r in routes):
+                parser.error(f"--{option} expects ROUTE=VALUE with ROUTE in {', '.join(ROUTES)} or providers")
+            for r in routes:
+                setattr(faults.setdefault(r, Fault()), attr, float(value))
+    return faults
+
+
+def build_report(results, args, elapsed, offered_span, endpoints):
+    samples = defaultdict(list)
+    counts = defaultdict(int)
+    records = failed = 0
+    for r in results:
+        records += r["records"]
+        failed += r["failed"]
+        samples["queue_wait"].append(max(0.0, r["started"] - r["scheduled"]) * 1000)
+        samples["invocation"].append((r["finished"] - r["started"]) * 1000)
+        for stage, values in r["samples"].items():
+            samples[stage].extend(values)
+        for name, value in r["counts"].items():
+            counts[name] += value
+
+    delivered = endpoints["discord"].get("204", 0)
+    processed = counts["processed"]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "paths"},
+        "invocations": len(results),
+        "records": records,
+        "processed": processed,
+        "failed_records": failed,
+        "partial_enrichment": counts["partial_enrichment"],
+        "throughput": {
+            "offered_per_s": round(records / offered_span, 1) if offered_span else None,
+            "achieved_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+            "elapsed_s": round(elapsed, 2),
+        },
+        "alerts": {
+            "expected": processed,
+            "delivered": delivered,
+            "lost": max(processed - delivered, 0),
+            "loss_ratio": round(1 - delivered / processed, 4) if processed else 0.0,
+        },
+        "stages": {stage: stage_summary(samples[stage]) for stage in STAGES},
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report):
+    t = report["throughput"]
+    offered = f"{t['offered_per_s']:,.1f}/s" if t["offered_per_s"] else "unthrottled"
+    print(f"\n{report['records']:,} records in {report['invocations']:,} invocations over {t['elapsed_s']}s")
+    print(f"Throughput: offered {offered}, achieved {t['achieved_per_s']:,.1f}/s")
+    print(f"Failed records: {report['failed_records']:,}  Partial enrichment: {report['partial_enrichment']:,}")
+    a = report["alerts"]
+    print(f"Alerts: {a['delivered']:,}/{a['expected']:,} delivered, {a['lost']:,} lost ({a['loss_ratio']:.1%})")
+
+    print(f"\n{'Stage':<12} {'count':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("-" * 62)
+    for stage, row in report["stages"].items():
+        print(f"{stage:<12} {row['count']:>9,} {row['p50_ms']:>9} {row['p90_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+
+    print(f"\n{'Endpoint':<12} {'requests':>9} {'2xx':>9} {'429':>9} {'5xx':>9}")
+    print("-" * 52)
+    for route, stats in report["endpoints"].items():
+        ok = sum(v for k, v in stats.items() if k.startswith("2"))
+        errors = sum(v for k, v in stats.items() if k.startswith("5"))
+        print(f"{route:<12} {stats.get('requests', 0):>9,} {ok:>9,} {stats.get('429', 0):>9,} {errors:>9,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Cowrie logs through lambda_handler against local stand-ins')
+    parser.add_argument('paths', nargs='+', help='Log files, Cowrie log directories or event spools')
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help='Events per second')
+    pacing.add_argument('--speedup', type=float, help='Replay at N x the recorded pace (e.g. 60: an hour per minute)')
+    pacing.add_argument('--max', action='store_true', help='As fast as the containers can take it (default)')
+    parser.add_argument('--source', choices=('sqs', 'sns'), default='sqs',
+                        help='Event shape: SQS batches with partial failures, or one SNS record per invocation')
+    parser.add_argument('--batch-size', type=int, default=10, help='SQS records per invocation (default: 10)')
+    parser.add_argument('--batch-window-ms', type=float, default=200.0,
+                        help='SQS batching window (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Warm containers (default: 4)')
+    parser.add_argument('--timeout-ms', type=int, default=DEFAULT_TIMEOUT_MS,
+                        help=f'Function timeout per invocation (default: {DEFAULT_TIMEOUT_MS})')
+    parser.add_argument('--eventid', action='append', help='Only replay this event type (repeatable)')
+    parser.add_argument('--limit', type=int, help='Stop after this many events')
+    parser.add_argument('--duration', type=float, help='Stop scheduling after this many seconds')
+    parser.add_argument('--connect-ms', type=float, default=40.0,
+                        help='Emulated TCP+TLS handshake cost per new connection (default: 40)')
+    parser.add_argument('--response-ms', type=float, default=5.0, help='Base stand-in response time (default: 5)')
+    for option, meta, text in (("latency", "ROUTE=MS", "Extra response latency"),
+                               ("jitter", "ROUTE=MS", "Uniform random extra latency up to MS"),
+                               ("throttle", "ROUTE=RATE", "Share of requests answered 429"),
+                               ("errors", "ROUTE=RATE", "Share of requests answered 500")):
+        parser.add_argument(f'--{option}', action='append', metavar=meta,
+                            help=f'{text}; ROUTE is greynoise, abuseipdb, discord or providers (repeatable)')
+    parser.add_argument('--json', dest='json_out', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    faults = parse_faults(args, parser)
+    ctx = multiprocessing.get_context("fork")
+    ports, stand_ins = start_stand_ins(ctx, faults, args.connect_ms, args.response_ms)
+    pool = ctx.Pool(args.concurrency, _init_container, (stand_in_env(ports),))
+
+    batch_size = 1 if args.source == "sns" else args.batch_size
+    window = 0.0 if args.source == "sns" else args.batch_window_ms / 1000.0
+    timed = due_times(replay_events(args.paths, set(args.eventid or []), args.limit),
+                      rate=args.rate, speedup=args.speedup)
+
+    results = []
+    inflight = threading.BoundedSemaphore(args.concurrency * 2)
+
+    def done(result):
+        results.append(result)
+        inflight.release()
+
+    def failed(error):
+        print(f"Invocation error: {error}", file=sys.stderr)
+        inflight.release()
+
+    print(f"Replaying into {args.concurrency} containers ({args.source}, "
+          f"{'rate ' + str(args.rate) + '/s' if args.rate else 'speedup ' + str(args.speedup) + 'x' if args.speedup else 'max'})",
+          file=sys.stderr)
+    start = time.time() + 0.1
+    sent = 0
+    last_due = 0.0
+    next_progress = start + 5
+    for due, messages in batches(timed, batch_size, window):
+        if args.duration and due > args.duration:
+            break
+        delay = start + due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        # Blocks while every container is busy; the backlog shows up as queue_wait
+        inflight.acquire()
+        pool.apply_async(_invoke, (shape_records(messages, args.source, sent), start + due, args.timeout_ms),
+                         callback=done, error_callback=failed)
+        sent += len(messages)
+        last_due = due
+        if time.time() >= next_progress:
+            print(f"  {sent:,} events scheduled, {len(results):,} invocations done", file=sys.stderr)
+            next_progress += 5
+    pool.close()
+    pool.join()
+    elapsed = max((r["finished"] for r in results), default=start) - start
+    endpoints = stand_in_stats(ports)
+    for proc in stand_ins:
+        proc.terminate()
+
+    report = build_report(results, args, elapsed, last_due if (args.rate or args.speedup) else None, endpoints)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()